@@ -1,6 +1,22 @@
 # ----------------------------------------------------------------------------------------------------------------------
 # The Automate module
 # ----------------------------------------------------------------------------------------------------------------------
+import logging
+import sys
+
+from ablauf.graph import Validation
+from ablauf.guard import Guard
+from ablauf.table import TransitionTable, adaptCallback
+
+logger = logging.getLogger("ablauf")
+
+
+class DefinitionError(Exception):
+    """
+    Raised when states are invalid, e.g. a transition leads to an unknown state, or when a frozen state is changed.
+    """
+
+
 class Automate():
     """
     The functions of the automate are:
@@ -12,6 +28,8 @@ class Automate():
     states = {}
     actualstate = None
     debugmode = False
+    table = None
+    history = None
 
     # ------------------------------------------------------------------------------------------------------------------
     # getter / setter
@@ -63,13 +81,33 @@ class Automate():
     @classmethod
     def setDebugMode(self, mode):
         """
-        Set the debug mode. Either to True or False
+        Set the debug mode. Either to True or False. In debug mode the "ablauf" logger is set to the DEBUG level and
+        its messages are printed to the console.
 
         :param mode: the new mode
         :type: boolean
         """
         self.debugmode = mode
 
+        if mode:
+            logger.setLevel(logging.DEBUG)
+            if _consolehandler not in logger.handlers:
+                logger.addHandler(_consolehandler)
+        else:
+            logger.setLevel(logging.NOTSET)
+            logger.removeHandler(_consolehandler)
+
+
+    @classmethod
+    def getTable(self):
+        """
+        Return the compiled transition table, or None if the automate is not compiled
+
+        :return: the transition table
+        :rtype: ablauf.table.TransitionTable
+        """
+        return self.table
+
 
     # ----------------------------------------------------------------------------------------------------------------------
     # functions
@@ -134,6 +172,7 @@ class Automate():
         """
 
         self.getStates()[state.getName()] = state
+        self.table = None
 
 
     @classmethod
@@ -151,26 +190,104 @@ class Automate():
 
 
     @classmethod
-    def transit(self, transitionname):
+    def validate(self, firststatename=None):
         """
-        Do a transition to given state
+        Check the states for dangling transitions, unreachable states and dead ends. The Start and End states exist
+        after start, so validate after start.
 
-        :param transitionname: the name of the new state
-        :type transitionname: string
+        :param firststatename: the name of the first state, unreachable states are only checked if given
+        :type firststatename: string
+        :return: the result
+        :rtype: ablauf.graph.Validation
+        """
+
+        return Validation(self.getStates(), firststatename)
+
+
+    @classmethod
+    def compile(self):
+        """
+        Compile the states into a transition table. Afterwards transitions are resolved with one indexed load and can
+        also be given by their event id. Adding or changing a state drops the table again, so compile after all states
+        are added and set up.
+
+        *Example:*
+
+        .. code-block:: python
+
+            Automate.start("StartState",None)
+            Automate.compile()
+
+            Automate.transit("FinishFromState")
+
+        :return: the transition table
+        :rtype: ablauf.table.TransitionTable
         """
 
+        self.table = TransitionTable(self.getStates())
+        self.history = self.table.createHistory()
+        return self.table
+
+
+    @classmethod
+    def transit(self, transitionname, payload=None):
+        """
+        Do a transition to given state. The functions are called with the context None and the payload.
+
+        :param transitionname: the name or the event id of the transition
+        :type transitionname: string or int
+        :param payload: the payload of the event
+        """
+
+        table = self.table
+        if table is not None:
+            source = self.actualstate
+            if source is None:
+                raise KeyError(transitionname)
+            slot = source.id * table.eventcount + table.eventids[transitionname]
+            destinationid = table.destinations[slot]
+            if destinationid < 0:
+                if destinationid == table.GUARDED:
+                    candidate = table.choose(slot, None)
+                elif destinationid == table.HISTORY:
+                    candidate = table.resume(slot, self.history)
+                else:
+                    candidate = None
+                if candidate is None:
+                    raise KeyError(transitionname)
+                destinationid, function = candidate
+            else:
+                function = table.functions[slot]
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logTransit(source.name, table.statenames[destinationid], transitionname)
+
+            leave = table.leaves[source.id]
+            if leave is not None:
+                leave(None, payload)
+
+            if function is not None:
+                function(None, payload)
+
+            enter = table.enters[destinationid]
+            if enter is not None:
+                enter(None, payload)
+
+            self.actualstate = table.states[destinationid]
+            if self.history is not None:
+                table.remember(self.history, slot, destinationid)
+            return
+
         source = self.getActualState()
         transition = source.getTransition(transitionname)
         destination = self.getStates()[transition.getDestinationName()]
 
-        if not source.leave is None:
-            source.leave()
-
-        self.log("|------------------Transit to------------------|:" + destination.getName())
-        transition.fire()
+        if logger.isEnabledFor(logging.DEBUG):
+            logTransit(source.name, destination.name, transitionname)
 
-        if not destination.enter is None:
-            destination.enter()
+        source.leave(None, payload)
+        transition.fire(None, payload)
+        destination.enter(None, payload)
 
         # Set new Stage & Controller & View function
         self.setActualState(destination)
@@ -195,6 +312,9 @@ class Automate():
         :param initfuction: the name of the function that is called during the transition from the Start state to the first state
         :type initfuction: function
         """
+        # child states are resolved through the transition table
+        compiled = self.table is not None or any(state.parent is not None for state in self.getStates().values())
+
         _Start = State("Start")
         _GoFirst = Transition("GotoFirstState", firststatename, initfunction)
 
@@ -203,6 +323,9 @@ class Automate():
         _End = State("End")
         _End.setEnterFunction(self.exit)
 
+        if compiled:
+            self.compile()
+
         self.log("-----------------------------")
         self.log("start Ablauf state engine")
         self.log("-----------------------------")
@@ -213,16 +336,23 @@ class Automate():
 
 
     @classmethod
-    def log(self, message):
+    def log(self, message, *args):
         """
-        Print a nessage to the console. If debugmode=true the message will be send to the javascript console.
+        Log a debug message to the "ablauf" logger. The message is formatted with the arguments only if the DEBUG level
+        is enabled, so pass the arguments instead of formatting the message yourself.
 
-        :param message: the message to print
+        *Example:*
+
+        .. code-block:: python
+
+            Automate.log("Entering: %s", statename)
+
+        :param message: the message to log
         :type message: string
+        :param args: the arguments that are merged into the message
         """
 
-        if self.getDebugMode() == True:
-            print(message)
+        logger.debug(message, *args)
 
 
 class State(object):
@@ -240,33 +370,53 @@ class State(object):
 
     :param name: the name of the state
     :type name: string
+    :param definition: the definition the state belongs to. If not set, the state is added to the Automate
+    :type definition: ablauf.Definition
     """
 
     def defaultenterfunction(self):
         """
-        The default enter function. If no enter function is defined, this function will be called. It do nothing, but log it's call
+        The default enter function. If no enter function is defined and debug logging is enabled, this function will be
+        called. It do nothing, but log it's call
         """
-        Automate.log("Entering:" + str(self.name))
+        logger.debug("Entering: %s", self.name)
 
     def defaultleavefunction(self):
         """
-        The default leave function. If no leave function is defined, this function will be called. It do nothing, but log it's call
+        The default leave function. If no leave function is defined and debug logging is enabled, this function will be
+        called. It do nothing, but log it's call
         """
-        Automate.log("Leaving:" + str(self.name))
+        logger.debug("Leaving: %s", self.name)
 
-    def __init__(self, name):
+    def __init__(self, name, definition=None):
         """
         A state inside the state engine.
 
         :param name: the name of the state
         :type name: string
+        :param definition: the definition the state belongs to
+        :type definition: ablauf.Definition
         """
         self.name = name
+        self.definition = definition
+        self.id = None
+        self.frozen = False
         self.transitions = {}
-        self.enterfunction = self.defaultenterfunction
-        self.leavefunction = self.defaultleavefunction
-
-        Automate.addState(self)
+        self.candidates = {}
+        self.enterfunction = None
+        self.leavefunction = None
+        # the functions adapted to the parameters context and payload, once when they are set
+        self.entercallback = None
+        self.leavecallback = None
+        self.timeout = None
+        self.parent = None
+        self.initial = None
+        self.history = None
+
+        if definition is None:
+            Automate.addState(self)
+        else:
+            definition.addState(self)
 
 
     def getName(self):
@@ -280,45 +430,123 @@ class State(object):
         return self.name
 
 
-    def enter(self):
+    def enter(self, context=None, payload=None):
         """
         Call the enter function. This will happen automatically when a transition to the state happens
+
+        :param context: the context of the machine
+        :param payload: the payload of the event
         """
 
-        self.enterfunction()
+        if self.entercallback is not None:
+            self.entercallback(context, payload)
+        elif logger.isEnabledFor(logging.DEBUG):
+            self.defaultenterfunction()
 
-    def leave(self):
+    def leave(self, context=None, payload=None):
         """
         Call the leave function. This will happen automatically when a transition is triggered
+
+        :param context: the context of the machine
+        :param payload: the payload of the event
+        """
+
+        if self.leavecallback is not None:
+            self.leavecallback(context, payload)
+        elif logger.isEnabledFor(logging.DEBUG):
+            self.defaultleavefunction()
+
+    def prepareChange(self):
         """
+        Check that the state can be changed. A state of the Automate drops the compiled table of the Automate, so it
+        is not used with the old state, compile the Automate again after the changes.
 
-        self.leavefunction()
+        :raises DefinitionError: if the state is frozen
+        """
+
+        if self.frozen:
+            raise DefinitionError("State " + str(self.name) + " is frozen")
+        if self.definition is None:
+            Automate.table = None
 
     def addTransition(self, transition):
         """
-        Add a transition to the state.
+        Add a transition to the state. A transition replaces the transition with the same name, unless one of them has
+        a guard. Then both are candidates, evaluated in the order they were added.
 
         :param transition: the ransition to add
         :type transition: ablauf.Transition
         """
 
-        self.transitions[transition.getName()] = transition
+        self.prepareChange()
+
+        transitionname = transition.getName()
+        existing = self.transitions.get(transitionname)
+        if existing is None:
+            self.transitions[transitionname] = transition
+            if transition.guard is not None:
+                self.candidates[transitionname] = [transition]
+        elif transitionname in self.candidates:
+            self.candidates[transitionname].append(transition)
+        elif transition.guard is not None:
+            self.candidates[transitionname] = [existing, transition]
+        else:
+            self.transitions[transitionname] = transition
 
-    def getTransition(self, transitionname):
+    def getTransition(self, transitionname, context=None):
         """
-        Return the transition of the state with the given transition name
+        Return the transition of the state with the given transition name. If the transition is guarded, the first
+        candidate whose guard holds for the context is returned.
 
         :param transitionname: the name of the transition to get
         :type transitionname: string
+        :param context: the context the guards are evaluated for
         :return: the transition
         :rtype: ablauf.Transition
         """
 
-        return self.transitions[transitionname]
+        candidates = self.candidates.get(transitionname)
+        if candidates is None:
+            return self.transitions[transitionname]
+
+        for transition in candidates:
+            if transition.guard is None or transition.guard.test(context):
+                return transition
+        raise KeyError(transitionname)
+
+    def getCandidates(self, transitionname):
+        """
+        Return all transitions of the state with the given transition name, in the order they are evaluated
+
+        :param transitionname: the name of the transitions
+        :type transitionname: string
+        :return: the transitions
+        :rtype: list of ablauf.Transition
+        """
+
+        candidates = self.candidates.get(transitionname)
+        if candidates is None:
+            return [self.transitions[transitionname]]
+        return list(candidates)
+
+    def getAllTransitions(self):
+        """
+        Return all transitions of the state, including every candidate of guarded transitions
+
+        :return: the transitions
+        :rtype: list of ablauf.Transition
+        """
+
+        transitions = []
+        for transitionname, transition in self.transitions.items():
+            transitions.extend(self.candidates.get(transitionname, (transition,)))
+        return transitions
 
     def setEnterFunction(self, enterfunction):
         """
-        Set the enter function. This function will be called automatically when a transition to the state happens
+        Set the enter function. This function will be called automatically when a transition to the state happens.
+        A function with parameters gets the context of the machine and the payload of the event, see
+        ablauf.table.adaptCallback.
 
         *Example:*
 
@@ -329,14 +557,18 @@ class State(object):
 
             StartState.setEnterFunction(StateEnterFunction)
 
-        :param enterfunction: the enterfuncton
+        :param enterfunction: the enterfuncton, without parameters or with the parameters context and payload
         """
 
+        self.prepareChange()
+
         self.enterfunction = enterfunction
+        self.entercallback = adaptCallback(enterfunction)
 
     def setLeaveFunction(self, leavefunction):
         """
-        Set the leave function. This function will be called automaticaly when a transition formthe state happends
+        Set the leave function. This function will be called automaticaly when a transition formthe state happends.
+        A function with parameters gets the context of the machine and the payload of the event.
 
         *Example:*
 
@@ -347,10 +579,152 @@ class State(object):
 
             StartState.setLeaveFunction(StateLeaveFunction)
 
-        :param leavefunction: the leave function
+        :param leavefunction: the leave function, without parameters or with the parameters context and payload
         """
 
+        self.prepareChange()
+
         self.leavefunction = leavefunction
+        self.leavecallback = adaptCallback(leavefunction)
+
+    def getParent(self):
+        """
+        Return the name of the parent state
+
+        :return: the name of the parent state, or None
+        :rtype: string
+        """
+
+        return self.parent
+
+    def setParent(self, parentname):
+        """
+        Make the state a child of another state. The child state inherits the transitions of its parent, unless it has
+        a transition with the same name. A transition from a child state to a state outside its parent leaves the
+        child and then the parent, a transition into a parent enters the parent and then its initial state.
+
+        *Example:*
+
+        .. code-block:: python
+
+            Game = State("Game")
+            Game.setInitialState("Playing")
+            Game.addTransition(Transition("ShowOptions", "Options", None))
+
+            Playing = State("Playing")
+            Playing.setParent("Game")
+            Paused = State("Paused")
+            Paused.setParent("Game")
+
+        :param parentname: the name of the parent state
+        :type parentname: string
+        """
+
+        self.prepareChange()
+
+        self.parent = parentname
+
+    def getInitialState(self):
+        """
+        Return the name of the initial state
+
+        :return: the name of the initial child state, or None
+        :rtype: string
+        """
+
+        return self.initial
+
+    def setInitialState(self, childname):
+        """
+        Set the child state that is entered when a transition leads to this state. A state with child states must
+        have an initial state.
+
+        :param childname: the name of the child state
+        :type childname: string
+        """
+
+        self.prepareChange()
+
+        self.initial = childname
+
+    def getHistory(self):
+        """
+        Return the kind of the history state
+
+        :return: "shallow" or "deep", or None if the state is no history state
+        :rtype: string
+        """
+
+        return self.history
+
+    def setHistory(self, kind):
+        """
+        Make the state the history state of its parent. A machine is never in a history state, a transition to it
+        resumes the parent where it was left the last time: a shallow history enters the child state that was active
+        and then its initial state, a deep history enters the state the machine was in. If the parent was not left
+        yet, its initial state is entered. A parent can have one history state, a history state has no transitions.
+
+        Every machine keeps one state id per parent with a history state, so the memory of a machine does not grow
+        with the transitions it does. The Automate, the regions of parallel machines, instance stores and the workers of
+        the sharded executor keep a history as well. The shared instance store and the simulation do not, transitions
+        to history states fail there.
+
+        *Example:*
+
+        .. code-block:: python
+
+            GameHistory = State("GameHistory", SinglePlayerGame)
+            GameHistory.setParent("Game")
+            GameHistory.setHistory("deep")
+
+            Options.addTransition(Transition("BackToGame", "GameHistory", None))
+
+        :param kind: "shallow" or "deep"
+        :type kind: string
+        """
+
+        self.prepareChange()
+        if kind not in ("shallow", "deep"):
+            raise ValueError("History " + repr(kind) + " is neither shallow nor deep")
+
+        self.history = kind
+
+    def getTimeout(self):
+        """
+        Return the timeout of the state
+
+        :return: the seconds and the name of the transition, or None
+        :rtype: tuple
+        """
+
+        return self.timeout
+
+    def setTimeout(self, seconds, transitionname):
+        """
+        Set a timeout. If a machine stays in the state for the given time, the transition is done. The timeout is armed
+        when the state is entered and cancelled when it is left. Child states without timeout inherit the timeout of
+        their parent, moving between them keeps it running. A machine has one timer: in a child state with a timeout
+        of its own, that timeout replaces the one of the parent, which is armed again when the machine returns to a
+        child that inherits it. Timeouts are only handled by machines whose definition has timers, see
+        ablauf.timers.TimerWheel.
+
+        *Example:*
+
+        .. code-block:: python
+
+            Timeout = Transition("Timeout", "Menu", None)
+            Game.addTransition(Timeout)
+            Game.setTimeout(30, "Timeout")
+
+        :param seconds: the time in seconds
+        :type seconds: float
+        :param transitionname: the name of a transition of the state
+        :type transitionname: string
+        """
+
+        self.prepareChange()
+
+        self.timeout = (seconds, transitionname)
 
 
 class Transition(object):
@@ -373,18 +747,24 @@ class Transition(object):
     :type name: string
     :param destinationname: name of the destination state
     :type destinationname: string
-    :param funct: The function that will be called when the transition is triggered
+    :param funct: The function that will be called when the transition is triggered, without parameters or with the
+        parameters context and payload
     :type funct: function
+    :param guard: the condition of the transition, see ablauf.Guard
+    :type guard: ablauf.Guard, function or string
     """
 
-    def __init__(self, name, destinationname, funct):
+    def __init__(self, name, destinationname, funct, guard=None):
         """
         A transition inside the state engine.
         """
 
         self.name = name
         self.destinationname = destinationname
+        self.destination = None
         self.funct = funct
+        self.callback = adaptCallback(funct)
+        self.guard = guard if guard is None or isinstance(guard, Guard) else Guard(guard)
 
     def getName(self):
         """
@@ -406,12 +786,68 @@ class Transition(object):
 
         return self.destinationname
 
-    def fire(self):
+    def getDestination(self):
+        """
+        Return the destination state of the transition. It is set when the definition is frozen.
+
+        :return: The destination state, or None if not frozen
+        :rtype: ablauf.State
+        """
+
+        return self.destination
+
+    def getGuard(self):
+        """
+        Return the guard of the transition
+
+        :return: the guard, or None if the transition is not guarded
+        :rtype: ablauf.Guard
+        """
+
+        return self.guard
+
+    def fire(self, context=None, payload=None):
         """
         Calls the function of the transition
 
+        :param context: the context of the machine
+        :param payload: the payload of the event
         """
 
-        Automate.log("Firing transition function")
-        if self.funct is not None:
-            self.funct()
\ No newline at end of file
+        if self.callback is not None:
+            self.callback(context, payload)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Logging
+# ----------------------------------------------------------------------------------------------------------------------
+_consolehandler = logging.StreamHandler(sys.stdout)
+_consolehandler.setFormatter(logging.Formatter("%(message)s"))
+
+
+def logTransit(sourcename, destinationname, event):
+    """
+    Log a transit to the "ablauf" logger. The names are passed as extra fields "source", "destination" and "event" of
+    the log record, so handlers can use them without parsing the message. Callers check the DEBUG level before, so
+    nothing is built when debug logging is off.
+
+    :param sourcename: the name of the source state
+    :type sourcename: string
+    :param destinationname: the name of the destination state
+    :type destinationname: string
+    :param event: the name or the id of the event
+    :type event: string or int
+    """
+
+    logger.debug("Transit %s -> %s (%s)", sourcename, destinationname, event,
+                 extra={"source": sourcename, "destination": destinationname, "event": event})
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Per-instance state machines
+# ----------------------------------------------------------------------------------------------------------------------
+from ablauf.machine import Definition, Machine
+from ablauf.aio import AsyncMachine
+from ablauf.store import InstanceStore
+from ablauf.parallel import ParallelDefinition, ParallelMachine
+from ablauf.context import defineContext
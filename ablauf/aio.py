@@ -0,0 +1,256 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# The asyncio module
+# ----------------------------------------------------------------------------------------------------------------------
+import asyncio
+import logging
+from inspect import isawaitable
+
+from ablauf import logger, logTransit
+from ablauf.journal import MACHINES
+from ablauf.machine import Machine
+
+
+class AsyncMachine(Machine):
+    """
+    A machine for the asyncio event loop. The enter, leave and transition functions may be plain functions or
+    coroutine functions, coroutines are awaited. Transits of one machine are done one after the other in the order they
+    are called, transits of different machines run concurrently. Processing the event queue takes the lock of the
+    machine once for the whole batch.
+
+    *Example:*
+
+    .. code-block:: python
+
+        async def GameLeaveFunction():
+            await leaderboard.put(highscore)
+
+        Game.setLeaveFunction(GameLeaveFunction)
+
+        async def play():
+            session = AsyncMachine(SinglePlayerGame)
+            await session.start("Menu", None)
+            await session.transit("StartGame")
+            await session.transit("ShowHighscore")
+
+        asyncio.get_event_loop().run_until_complete(asyncio.gather(*[play() for _ in range(10000)]))
+
+    :param definition: the definition the machine runs on
+    :type definition: ablauf.Definition
+    :param context: the context of the machine, a new context of the context type of the definition if not set
+    """
+
+    __slots__ = ('lock',)
+
+    def __init__(self, definition, context=None, id=None):
+        """
+        An asyncio machine running on a definition.
+        """
+
+        Machine.__init__(self, definition, context, id)
+        self.lock = None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # getter / setter
+    # ------------------------------------------------------------------------------------------------------------------
+    def getLock(self):
+        """
+        Return the lock that orders the transits of the machine. The lock is created on first use.
+
+        :return: the lock
+        :rtype: asyncio.Lock
+        """
+
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        return self.lock
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # functions
+    # ------------------------------------------------------------------------------------------------------------------
+    async def start(self, firststatename, initfunction=None, payload=None):
+        """
+        Start the machine in the first state. The init function is called before the first state is entered.
+
+        :param firststatename: the name of the first state
+        :type firststatename: string
+        :param initfunction: the function or coroutine function that is called before the first state is entered
+        :type initfunction: function
+        :param payload: the payload the enter functions are called with
+        """
+
+        async with self.getLock():
+            table = self.table
+            destinationid, entry = table.getFirstState(firststatename)
+
+            logger.debug("Start machine in state: %s", firststatename)
+            if initfunction is not None:
+                result = initfunction()
+                if result is not None and isawaitable(result):
+                    await result
+            if entry is not None:
+                result = entry(self.context, payload)
+                if result is not None and isawaitable(result):
+                    await result
+
+            instrumentation = self.definition.instrumentation
+            if instrumentation is not None:
+                await instrumentation.startAsync(MACHINES, self.id, destinationid, self.context, payload)
+            else:
+                enter = table.enters[destinationid]
+                if enter is not None:
+                    result = enter(self.context, payload)
+                    if result is not None and isawaitable(result):
+                        await result
+            self.stateid = destinationid
+
+            timers = self.definition.timers
+            if timers is not None:
+                timers.enter(self, table.timeouts[destinationid])
+
+    async def transit(self, transitionname, payload=None):
+        """
+        Do a transition to given state. Waits until all transits called before on this machine are done.
+
+        :param transitionname: the name or the id of the transition
+        :type transitionname: string or int
+        :param payload: the payload of the event
+        """
+
+        async with self.getLock():
+            await self.transitLocked(transitionname, payload)
+
+    async def timeout(self, ownerid, eventid):
+        """
+        Do the timeout transition of a state, if the machine is still in the state or one of its child states that
+        inherit its timeout when it got the lock. Called by the timer wheel, see ablauf.timers.runAsync.
+
+        :param ownerid: the id of the state whose timeout is due
+        :type ownerid: int
+        :param eventid: the id of the timeout transition
+        :type eventid: int
+        :return: True if the transition was done
+        :rtype: boolean
+        """
+
+        async with self.getLock():
+            if not self.table.isTimedBy(self.stateid, ownerid):
+                return False
+            await self.transitLocked(eventid)
+            return True
+
+    async def transitTo(self, statename):
+        """
+        Do the transitions of the shortest path from the actual state to the given state, see
+        ablauf.Machine.transitTo. The lock is taken for every transition.
+
+        :param statename: the name of the target state
+        :type statename: string
+        :return: the names of the done transitions
+        :rtype: list
+        """
+
+        table = self.table
+        index = self.definition.getIndex()
+        targetid = table.getStateId(statename)
+        events = []
+
+        while not index.isInside(self.stateid, targetid):
+            eventid = index.getNextEvent(self.stateid, targetid)
+            if eventid < 0 or len(events) > table.statecount:
+                raise KeyError(statename)
+            await self.transit(eventid)
+            events.append(table.eventnames[eventid])
+        return events
+
+    async def process(self, maxevents=None):
+        """
+        Handle the events of the event queue in the order they were posted, see ablauf.Machine.process. The lock of the
+        machine is taken once for all handled events.
+
+        :param maxevents: the maximum number of events to handle, all events if not set
+        :type maxevents: int
+        :return: the number of handled events
+        :rtype: int
+        """
+
+        queue = self.queue
+        if not queue or self.processing:
+            return 0
+
+        count = 0
+        async with self.getLock():
+            self.processing = True
+            try:
+                while queue and (maxevents is None or count < maxevents):
+                    await self.transitLocked(*queue.popleft())
+                    count += 1
+            finally:
+                self.processing = False
+        return count
+
+    async def transitLocked(self, transitionname, payload=None):
+        """
+        Do a transition to given state. The caller must hold the lock of the machine.
+
+        :param transitionname: the name or the id of the transition
+        :type transitionname: string or int
+        :param payload: the payload of the event
+        """
+
+        table = self.table
+        stateid = self.stateid
+        if stateid < 0:
+            raise KeyError(transitionname)
+        eventid = table.eventids[transitionname]
+        slot = stateid * table.eventcount + eventid
+        destinationid = table.destinations[slot]
+        if destinationid < 0:
+            if destinationid == table.GUARDED:
+                candidate = table.choose(slot, self.context)
+            elif destinationid == table.HISTORY:
+                candidate = table.resume(slot, self.history)
+            else:
+                candidate = None
+            if candidate is None:
+                raise KeyError(transitionname)
+            destinationid, function = candidate
+        else:
+            function = table.functions[slot]
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logTransit(table.statenames[stateid], table.statenames[destinationid], transitionname)
+
+        instrumentation = self.definition.instrumentation
+        if instrumentation is not None:
+            await instrumentation.transitAsync(MACHINES, self.id, stateid, slot, destinationid, function, self.context,
+                                               payload)
+        else:
+            context = self.context
+            leave = table.leaves[stateid]
+            if leave is not None:
+                result = leave(context, payload)
+                if result is not None and isawaitable(result):
+                    await result
+
+            if function is not None:
+                result = function(context, payload)
+                if result is not None and isawaitable(result):
+                    await result
+
+            enter = table.enters[destinationid]
+            if enter is not None:
+                result = enter(context, payload)
+                if result is not None and isawaitable(result):
+                    await result
+
+        self.stateid = destinationid
+        if self.history is not None:
+            table.remember(self.history, slot, destinationid)
+
+        timers = self.definition.timers
+        if timers is not None and not table.keeps[slot]:
+            timers.enter(self, table.timeouts[destinationid])
+
+        journal = self.definition.journal
+        if journal is not None:
+            journal.record(MACHINES, self.id, eventid, stateid, destinationid)
@@ -0,0 +1,303 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# The Analytics module
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+from array import array
+
+from ablauf import journal
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# the records of a journal file, see ablauf.journal.RECORD
+if numpy is not None:
+    RECORD = numpy.dtype([('timestamp', '<f8'), ('recorder', '<u4'), ('instance', '<u4'), ('event', '<u4'),
+                          ('source', '<u4'), ('destination', '<u4')])
+
+
+class TransitionMatrix(object):
+    """
+    The empirical transition matrix of a definition: how often every state was left to every other state, how often
+    every event occurred in every state, and the probabilities derived from the counts. Needs numpy.
+
+    The counts are kept by the state ids and event ids of the transition table. Records are added in chunks of numpy
+    arrays and counted with bincount, there is no Python code per record. A journal is read through a memory map, so
+    its size is not bound by the memory. The transitions between states are kept sparse, as sorted keys
+    ``sourceid * statecount + destinationid`` with their counts, so large definitions do not need a dense matrix.
+
+    *Example:*
+
+    .. code-block:: python
+
+        matrix = TransitionMatrix(Game.getTable())
+        matrix.addJournal("sessions.journal")
+
+        print(matrix.getHotTransitions(10))
+        print(matrix.getHotPath("Menu"))
+        steady = matrix.getSteadyState(restartname="Menu")
+
+    :param table: the transition table of the definition
+    :type table: ablauf.table.TransitionTable
+    """
+
+    def __init__(self, table):
+        """
+        An empty transition matrix of a transition table.
+        """
+
+        if numpy is None:
+            raise ImportError("ablauf.analytics needs numpy")
+
+        self.table = table
+        self.slotcounts = numpy.zeros(table.statecount * table.eventcount, dtype=numpy.int64)
+        self.keys = numpy.zeros(0, dtype=numpy.int64)
+        self.counts = numpy.zeros(0, dtype=numpy.int64)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # counting
+    # ------------------------------------------------------------------------------------------------------------------
+    def add(self, sourceids, eventids, destinationids):
+        """
+        Count transitions. Records with a negative destination id are skipped.
+
+        :param sourceids: the ids of the source states
+        :type sourceids: numpy array of int
+        :param eventids: the ids of the events
+        :type eventids: numpy array of int
+        :param destinationids: the ids of the destination states
+        :type destinationids: numpy array of int
+        """
+
+        table = self.table
+        sourceids = numpy.asarray(sourceids, dtype=numpy.int64)
+        eventids = numpy.asarray(eventids, dtype=numpy.int64)
+        destinationids = numpy.asarray(destinationids, dtype=numpy.int64)
+
+        valid = destinationids >= 0
+        if not valid.all():
+            sourceids, eventids, destinationids = sourceids[valid], eventids[valid], destinationids[valid]
+        if not len(sourceids):
+            return
+
+        self.slotcounts += numpy.bincount(sourceids * table.eventcount + eventids, minlength=len(self.slotcounts))
+
+        keys, counts = numpy.unique(sourceids * table.statecount + destinationids, return_counts=True)
+        keys = numpy.concatenate((self.keys, keys))
+        counts = numpy.concatenate((self.counts, counts))
+        self.keys, positions = numpy.unique(keys, return_inverse=True)
+        self.counts = numpy.bincount(positions, weights=counts).astype(numpy.int64)
+
+    def addJournal(self, filename, chunksize=1 << 22):
+        """
+        Count the transitions of a journal file. The file is memory mapped and counted in chunks of records. A torn
+        last record, left by a crash while writing, is skipped.
+
+        :param filename: the name of the journal file
+        :type filename: string
+        :param chunksize: the number of records counted at once
+        :type chunksize: int
+        """
+
+        with open(filename, 'rb') as journalfile:
+            journal.readHeader(journalfile, self.table)
+            count = (os.fstat(journalfile.fileno()).st_size - journal.HEADER.size) // RECORD.itemsize
+        if count <= 0:
+            return
+
+        records = numpy.memmap(filename, dtype=RECORD, mode='r', offset=journal.HEADER.size, shape=(count,))
+        for begin in range(0, len(records), chunksize):
+            chunk = records[begin:begin + chunksize]
+            self.add(chunk['source'], chunk['event'], chunk['destination'])
+
+    def addOutcomes(self, outcomes, chunksize=1 << 20):
+        """
+        Count the outcomes of a simulation, see ablauf.trace.Simulation.simulate. The outcomes are collected into
+        arrays in chunks, invalid transitions are skipped.
+
+        *Example:*
+
+        .. code-block:: python
+
+            simulation = Simulation(Game, "Menu")
+            matrix.addOutcomes(simulation.simulate(readJSONL("events.jsonl.gz")))
+
+        :param outcomes: tuples of instance, event, source state id and destination state id
+        :type outcomes: iterable of tuple
+        :param chunksize: the number of outcomes counted at once
+        :type chunksize: int
+        """
+
+        eventids = self.table.eventids
+        sources, events, destinations = array('l'), array('l'), array('l')
+        for instance, event, sourceid, destinationid in outcomes:
+            if destinationid < 0:
+                continue
+            sources.append(sourceid)
+            events.append(eventids[event])
+            destinations.append(destinationid)
+            if len(sources) >= chunksize:
+                self.add(numpy.frombuffer(sources, dtype=numpy.int_), numpy.frombuffer(events, dtype=numpy.int_),
+                         numpy.frombuffer(destinations, dtype=numpy.int_))
+                sources, events, destinations = array('l'), array('l'), array('l')
+
+        if sources:
+            self.add(numpy.frombuffer(sources, dtype=numpy.int_), numpy.frombuffer(events, dtype=numpy.int_),
+                     numpy.frombuffer(destinations, dtype=numpy.int_))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # results
+    # ------------------------------------------------------------------------------------------------------------------
+    def getCounts(self):
+        """
+        Return the counts of the transitions between states, as sparse arrays
+
+        :return: the source state ids, the destination state ids and the counts
+        :rtype: tuple of numpy array
+        """
+
+        sourceids, destinationids = numpy.divmod(self.keys, self.table.statecount)
+        return sourceids, destinationids, self.counts
+
+    def getProbabilities(self):
+        """
+        Return the probabilities of the transitions between states. The probability is the count divided by the
+        number of times the source state was left.
+
+        :return: the source state ids, the destination state ids and the probabilities
+        :rtype: tuple of numpy array
+        """
+
+        sourceids, destinationids, counts = self.getCounts()
+        totals = numpy.bincount(sourceids, weights=counts, minlength=self.table.statecount)
+        return sourceids, destinationids, counts / totals[sourceids]
+
+    def getMatrix(self, probabilities=False):
+        """
+        Return the dense matrix of the transitions, rows are the source states and columns the destination states. It
+        has statecount * statecount entries, for large definitions use getCounts.
+
+        :param probabilities: return the probabilities instead of the counts
+        :type probabilities: boolean
+        :return: the matrix
+        :rtype: numpy array
+        """
+
+        statecount = self.table.statecount
+        if probabilities:
+            sourceids, destinationids, values = self.getProbabilities()
+        else:
+            sourceids, destinationids, values = self.getCounts()
+        matrix = numpy.zeros((statecount, statecount), dtype=values.dtype)
+        matrix[sourceids, destinationids] = values
+        return matrix
+
+    def getEventFrequencies(self):
+        """
+        Return how often every event occurred
+
+        :return: the counts by event name
+        :rtype: dict
+        """
+
+        table = self.table
+        counts = self.slotcounts.reshape(table.statecount, table.eventcount).sum(axis=0)
+        return dict((table.eventnames[eventid], int(count)) for eventid, count in enumerate(counts) if count)
+
+    def getSteadyState(self, restartname=None, iterations=1000, tolerance=1e-12):
+        """
+        Return the steady state distribution of the states, the share of time an instance spends in every state in
+        the long run. It is computed by power iteration with the sparse transition probabilities.
+
+        States that were never left, like End, restart the instance: in the restart state if given, otherwise in any
+        state with equal probability.
+
+        :param restartname: the name of the state instances restart in
+        :type restartname: string
+        :param iterations: the maximum number of iterations
+        :type iterations: int
+        :param tolerance: stop when the distribution changes less than this
+        :type tolerance: float
+        :return: the probabilities by state id
+        :rtype: numpy array
+        """
+
+        statecount = self.table.statecount
+        sourceids, destinationids, probabilities = self.getProbabilities()
+        terminal = numpy.bincount(sourceids, minlength=statecount) == 0
+
+        restart = numpy.full(statecount, 1.0 / statecount)
+        if restartname is not None:
+            restart = numpy.zeros(statecount)
+            restart[self.table.getStateId(restartname)] = 1.0
+
+        distribution = numpy.full(statecount, 1.0 / statecount)
+        for _ in range(iterations):
+            following = numpy.bincount(destinationids, weights=distribution[sourceids] * probabilities,
+                                       minlength=statecount)
+            following += distribution[terminal].sum() * restart
+            following /= following.sum()
+            if numpy.abs(following - distribution).sum() < tolerance:
+                return following
+            distribution = following
+        return distribution
+
+    def getHotTransitions(self, count=10):
+        """
+        Return the most frequent transitions
+
+        :param count: the number of transitions
+        :type count: int
+        :return: tuples of source state name, event name, count and share of all transitions, most frequent first
+        :rtype: list of tuple
+        """
+
+        table = self.table
+        slotcounts = self.slotcounts
+        total = int(slotcounts.sum())
+        if not total:
+            return []
+
+        count = min(count, numpy.count_nonzero(slotcounts))
+        slots = numpy.argpartition(-slotcounts, count - 1)[:count]
+        slots = slots[numpy.argsort(-slotcounts[slots], kind="stable")]
+        return [(table.statenames[slot // table.eventcount], table.eventnames[slot % table.eventcount],
+                 int(slotcounts[slot]), float(slotcounts[slot]) / total) for slot in slots]
+
+    def getHotPath(self, statename, maxlength=100):
+        """
+        Return the most likely path from a state: the most frequent event of every state is followed until a state is
+        reached that was never left, or a state repeats. A guarded transition is followed to the state most often left
+        to.
+
+        :param statename: the name of the first state
+        :type statename: string
+        :param maxlength: the maximum number of transitions
+        :type maxlength: int
+        :return: tuples of event name, destination state name and the share of the event in the state
+        :rtype: list of tuple
+        """
+
+        table = self.table
+        slotcounts = self.slotcounts.reshape(table.statecount, table.eventcount)
+        sourceids, destinationids, counts = self.getCounts()
+
+        path = []
+        stateid = table.getStateId(statename)
+        visited = set([stateid])
+        while len(path) < maxlength and slotcounts[stateid].any():
+            row = slotcounts[stateid]
+            eventid = int(numpy.argmax(row))
+            share = float(row[eventid]) / int(row.sum())
+            destinationid = table.destinations[stateid * table.eventcount + eventid]
+            if destinationid < 0:
+                first = numpy.searchsorted(sourceids, stateid)
+                last = numpy.searchsorted(sourceids, stateid, side="right")
+                destinationid = int(destinationids[first + int(numpy.argmax(counts[first:last]))])
+            stateid = destinationid
+            path.append((table.eventnames[eventid], table.statenames[stateid], share))
+            if stateid in visited:
+                break
+            visited.add(stateid)
+        return path
@@ -0,0 +1,282 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# The Benchmark module
+# ----------------------------------------------------------------------------------------------------------------------
+"""
+Benchmarks of the state engine. Run them with::
+
+    python -m ablauf.bench [--quick] [--output results.json]
+
+The results are written as JSON, one entry per benchmark with its name, value and unit, so two runs can be compared.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import ablauf
+from ablauf import Automate, Definition, InstanceStore, State, Transition
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Synthetic graphs
+# ----------------------------------------------------------------------------------------------------------------------
+def nothing():
+    pass
+
+
+def buildStates(statecount, callbacks=False, definition=None):
+    """
+    Build a ring of states "S0" to "Sn". Every state has a transition "Next" to the following state and "Back" to the
+    previous state, "S0" also has a transition "Finish" to the End state.
+
+    :param statecount: the number of states
+    :type statecount: int
+    :param callbacks: set an enter, a leave and a transition function that do nothing
+    :type callbacks: boolean
+    :param definition: the definition the states are added to, the Automate if not set
+    :type definition: ablauf.Definition
+    """
+
+    function = nothing if callbacks else None
+    for index in range(statecount):
+        state = State("S" + str(index), definition)
+        state.addTransition(Transition("Next", "S" + str((index + 1) % statecount), function))
+        state.addTransition(Transition("Back", "S" + str((index - 1) % statecount), function))
+        if callbacks:
+            state.setEnterFunction(nothing)
+            state.setLeaveFunction(nothing)
+
+    registry = Automate if definition is None else definition
+    registry.getState("S0").addTransition(Transition("Finish", "End", None))
+
+
+def resetAutomate():
+    """
+    Remove all states of the Automate
+    """
+
+    Automate.states = {}
+    Automate.actualstate = None
+    Automate.table = None
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Benchmarks
+# ----------------------------------------------------------------------------------------------------------------------
+def benchAutomateTransit(statecount, transits, callbacks, debug, compiled):
+    """
+    Measure the transits per second of the Automate
+
+    :return: transits per second
+    :rtype: float
+    """
+
+    resetAutomate()
+    buildStates(statecount, callbacks)
+
+    devnull = open(os.devnull, 'w')
+    stream = ablauf._consolehandler.setStream(devnull)
+    Automate.setDebugMode(debug)
+    try:
+        Automate.start("S0", None)
+        if compiled:
+            Automate.compile()
+
+        begin = time.perf_counter()
+        for _ in range(transits):
+            Automate.transit("Next")
+        elapsed = time.perf_counter() - begin
+    finally:
+        Automate.setDebugMode(False)
+        ablauf._consolehandler.setStream(stream)
+        devnull.close()
+        resetAutomate()
+
+    return transits / elapsed
+
+
+def benchMachineTransit(statecount, transits, callbacks):
+    """
+    Measure the transits per second of a machine
+
+    :return: transits per second
+    :rtype: float
+    """
+
+    definition = Definition("Bench")
+    buildStates(statecount, callbacks, definition)
+    machine = definition.createMachine()
+    machine.start("S0")
+
+    begin = time.perf_counter()
+    for _ in range(transits):
+        machine.transit("Next")
+    return transits / (time.perf_counter() - begin)
+
+
+def benchStoreTransit(statecount, instances):
+    """
+    Measure the transits per second of an instance store, one bulk transit of all instances
+
+    :return: transits per second
+    :rtype: float
+    """
+
+    definition = Definition("Bench")
+    buildStates(statecount, False, definition)
+    store = InstanceStore(definition, instances, "S0")
+
+    begin = time.perf_counter()
+    store.transit(range(instances), "Next")
+    return instances / (time.perf_counter() - begin)
+
+
+def benchAutomateStart(repeat):
+    """
+    Measure the latency of Automate.start
+
+    :return: seconds per start
+    :rtype: float
+    """
+
+    resetAutomate()
+    buildStates(10)
+    try:
+        begin = time.perf_counter()
+        for _ in range(repeat):
+            Automate.start("S0", None)
+        elapsed = time.perf_counter() - begin
+    finally:
+        resetAutomate()
+
+    return elapsed / repeat
+
+
+def benchBuild(statecount):
+    """
+    Measure the time to build and compile a definition
+
+    :return: seconds to build, seconds to compile
+    :rtype: tuple
+    """
+
+    begin = time.perf_counter()
+    definition = Definition("Bench")
+    buildStates(statecount, True, definition)
+    built = time.perf_counter()
+    definition.compile()
+    return built - begin, time.perf_counter() - built
+
+
+def benchMemory(statecount, instances):
+    """
+    Measure the memory of states, machines and instance store entries
+
+    :return: bytes per state, bytes per machine, bytes per store instance
+    :rtype: tuple
+    """
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        definition = Definition("Bench")
+        buildStates(statecount, False, definition)
+        definition.compile()
+        states = tracemalloc.get_traced_memory()[0]
+
+        machines = [definition.createMachine() for _ in range(instances)]
+        for machine in machines:
+            machine.start("S0")
+        allocated = tracemalloc.get_traced_memory()[0]
+
+        store = InstanceStore(definition, instances, "S0")
+        stored = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    return (states - before) / float(statecount), (allocated - states) / float(instances), \
+        (stored - allocated) / float(instances)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Main
+# ----------------------------------------------------------------------------------------------------------------------
+def run(quick=False):
+    """
+    Run all benchmarks
+
+    :param quick: use smaller sizes, for a fast check
+    :type quick: boolean
+    :return: the results
+    :rtype: list of dict
+    """
+
+    scale = 10 if quick else 1
+    small, large = 10, 20000 // scale
+    transits = 200000 // scale
+    results = []
+
+    def add(name, value, unit):
+        results.append({"name": name, "value": value, "unit": unit})
+
+    for statecount, size in ((small, "small"), (large, "large")):
+        for callbacks in (False, True):
+            variant = size + ("_callbacks" if callbacks else "")
+            add("automate_transit_" + variant, benchAutomateTransit(statecount, transits, callbacks, False, False),
+                "transits/s")
+            add("automate_transit_compiled_" + variant,
+                benchAutomateTransit(statecount, transits, callbacks, False, True), "transits/s")
+            add("machine_transit_" + variant, benchMachineTransit(statecount, transits, callbacks), "transits/s")
+        add("automate_transit_debug_" + size, benchAutomateTransit(statecount, transits // 10, False, True, False),
+            "transits/s")
+        add("store_transit_" + size, benchStoreTransit(statecount, transits), "transits/s")
+
+    add("automate_start", benchAutomateStart(10000 // scale), "s")
+
+    build, compile = benchBuild(large)
+    add("definition_build_" + str(large) + "_states", build, "s")
+    add("definition_compile_" + str(large) + "_states", compile, "s")
+
+    perstate, permachine, perinstance = benchMemory(large, 100000 // scale)
+    add("memory_per_state", perstate, "bytes")
+    add("memory_per_machine", permachine, "bytes")
+    add("memory_per_store_instance", perinstance, "bytes")
+
+    return results
+
+
+def main(argv=None):
+    """
+    Run the benchmarks and write the results as JSON
+
+    :param argv: the command line arguments
+    :type argv: list
+    """
+
+    parser = argparse.ArgumentParser(prog="python -m ablauf.bench", description="Benchmarks of the ablauf state engine")
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes, for a fast check")
+    parser.add_argument("--output", help="write the results to this file instead of stdout")
+    arguments = parser.parse_args(argv)
+
+    report = {
+        "python": platform.python_implementation() + " " + platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "results": run(arguments.quick),
+    }
+
+    if arguments.output:
+        with open(arguments.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
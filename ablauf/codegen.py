@@ -0,0 +1,254 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# The Code generation module
+# ----------------------------------------------------------------------------------------------------------------------
+import hashlib
+import importlib.util
+import os
+import stat
+import tempfile
+
+# the version of the generated code, part of the cache key
+GENERATION = 3
+
+
+def getKey(table):
+    """
+    Return the cache key of a transition table. It changes when the states, events or destinations change, or when a
+    function is set or removed, or when the generated code changes.
+
+    :param table: the transition table
+    :type table: ablauf.table.TransitionTable
+    :return: the key
+    :rtype: string
+    """
+
+    digest = hashlib.sha1(table.getFingerprint())
+    digest.update(str(GENERATION).encode("ascii"))
+    digest.update(bytes(bytearray(function is not None for function in table.leaves)))
+    digest.update(bytes(bytearray(function is not None for function in table.enters)))
+    digest.update(bytes(bytearray(function is not None for function in table.functions)))
+    digest.update(repr(sorted(table.records)).encode("ascii"))
+    return digest.hexdigest()
+
+
+def generate(table):
+    """
+    Generate the source of a module for a transition table. The module has a function bind(table), that binds the
+    functions of the table and returns a transit function specialized for the table. For every transition the transit
+    function calls exactly the functions that are set, transitions with the same calls share their code. Guarded
+    transitions choose their candidate through the table, transitions to history states resume through the table.
+
+    :param table: the transition table
+    :type table: ablauf.table.TransitionTable
+    :return: the source of the module
+    :rtype: string
+    """
+
+    leaves = set()
+    functions = set()
+    enters = set()
+    handlers = {}
+    dispatch = []
+    body = []
+
+    for slot, destinationid in enumerate(table.destinations):
+        stateid = slot // table.eventcount
+        if destinationid == table.GUARDED or destinationid == table.HISTORY:
+            name = "g%d" % slot
+            body.append("")
+            body.append("")
+            body.append("def %s(machine, payload):" % name)
+            helper = "guarded" if destinationid == table.GUARDED else "resumed"
+            body.append("    %s(machine, payload, %d, %d)" % (helper, slot, stateid))
+            dispatch.append(name)
+            continue
+        if destinationid < 0:
+            dispatch.append("None")
+            continue
+
+        calls = []
+        if table.leaves[stateid] is not None:
+            leaves.add(stateid)
+            calls.append("    L%d(machine.context, payload)" % stateid)
+        if table.functions[slot] is not None:
+            functions.add(slot)
+            calls.append("    F%d(machine.context, payload)" % slot)
+        if table.enters[destinationid] is not None:
+            enters.add(destinationid)
+            calls.append("    E%d(machine.context, payload)" % destinationid)
+        calls.append("    machine.stateid = %d" % destinationid)
+        if slot in table.records:
+            calls.append("    table.remember(machine.history, %d, %d)" % (slot, destinationid))
+
+        code = "\n".join(calls)
+        name = handlers.get(code)
+        if name is None:
+            name = handlers[code] = "t%d" % len(handlers)
+            body.append("")
+            body.append("")
+            body.append("def %s(machine, payload):" % name)
+            body.append(code)
+        dispatch.append(name)
+
+    lines = [
+        "# Generated by ablauf.codegen, do not edit",
+        "",
+        "LEAVES = (%s)" % "".join("%d, " % stateid for stateid in sorted(leaves)),
+        "FUNCTIONS = (%s)" % "".join("%d, " % slot for slot in sorted(functions)),
+        "ENTERS = (%s)" % "".join("%d, " % stateid for stateid in sorted(enters)),
+        "",
+        "",
+        "def bind(table):",
+        "    names = globals()",
+        "    names['table'] = table",
+        "    names['eventids'] = table.eventids",
+        "    for stateid in LEAVES:",
+        "        names['L%d' % stateid] = table.leaves[stateid]",
+        "    for slot in FUNCTIONS:",
+        "        names['F%d' % slot] = table.functions[slot]",
+        "    for stateid in ENTERS:",
+        "        names['E%d' % stateid] = table.enters[stateid]",
+        "    return transit",
+        "",
+        "",
+        "def transit(machine, event, payload=None):",
+        "    stateid = machine.stateid",
+        "    if stateid < 0:",
+        "        raise KeyError(event)",
+        "    handler = dispatch[stateid * %d + eventids[event]]" % table.eventcount,
+        "    if handler is None:",
+        "        raise KeyError(event)",
+        "    handler(machine, payload)",
+        "",
+        "",
+        "def guarded(machine, payload, slot, stateid):",
+        "    candidate = table.choose(slot, machine.context)",
+        "    if candidate is None:",
+        "        raise KeyError(table.eventnames[slot %% %d])" % max(table.eventcount, 1),
+        "    call(machine, payload, slot, stateid, candidate[0], candidate[1])",
+        "",
+        "",
+        "def resumed(machine, payload, slot, stateid):",
+        "    destinationid, function = table.resume(slot, machine.history)",
+        "    call(machine, payload, slot, stateid, destinationid, function)",
+        "",
+        "",
+        "def call(machine, payload, slot, stateid, destinationid, function):",
+        "    leave = table.leaves[stateid]",
+        "    if leave is not None:",
+        "        leave(machine.context, payload)",
+        "    if function is not None:",
+        "        function(machine.context, payload)",
+        "    enter = table.enters[destinationid]",
+        "    if enter is not None:",
+        "        enter(machine.context, payload)",
+        "    machine.stateid = destinationid",
+        "    if machine.history is not None:",
+        "        table.remember(machine.history, slot, destinationid)",
+    ]
+    lines.extend(body)
+    lines.append("")
+    lines.append("")
+    lines.append("dispatch = (")
+    for index in range(0, len(dispatch), 16):
+        lines.append("    " + ", ".join(dispatch[index:index + 16]) + ",")
+    lines.append(")")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def getCacheDir():
+    """
+    Return the default cache directory of the generated modules, a directory of the user in the temp directory. It is
+    created with access for the user only.
+
+    :return: the name of the directory
+    :rtype: string
+    """
+
+    name = "ablauf-codegen"
+    if hasattr(os, "getuid"):
+        name += "-" + str(os.getuid())
+    cachedir = os.path.join(tempfile.gettempdir(), name)
+    os.makedirs(cachedir, 0o700, exist_ok=True)
+    return cachedir
+
+
+def checkPrivate(path):
+    """
+    Check that a cache directory or generated module can only be changed by the user, before code is loaded from it. It
+    must be owned by the user and not be writable by the group or others, and a directory must not be a symbolic link.
+    Nothing is checked on systems without user ids.
+
+    :param path: the name of the directory or file
+    :type path: string
+    :raises PermissionError: if others could have changed it
+    """
+
+    if not hasattr(os, "getuid"):
+        return
+    status = os.lstat(path)
+    if stat.S_ISLNK(status.st_mode):
+        raise PermissionError("Codegen cache " + path + " is a symbolic link")
+    if status.st_uid != os.getuid():
+        raise PermissionError("Codegen cache " + path + " is not owned by the user")
+    if status.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError("Codegen cache " + path + " is writable by others")
+
+
+def specialize(definition, cachedir=None):
+    """
+    Return a transit function specialized for a definition. The generated module is cached in the cache directory by
+    the key of the transition table, so it is generated only once and Python caches its bytecode. Every call loads a
+    new module, so definitions with the same key keep their own functions.
+
+    The specialized transit function calls the leave, transition and enter functions and sets the new state of the
+    machine, nothing else: no logging, no journal, no instrumentation and no timeouts.
+
+    The cache directory and the module are checked before the module is loaded, they must be owned by the user and
+    not be writable by others, see checkPrivate. So no other user can place code that is run by the process.
+
+    *Example:*
+
+    .. code-block:: python
+
+        transit = specialize(Game)
+
+        session = Game.createMachine()
+        session.start("Menu")
+        transit(session, "StartGame")
+
+    :param definition: the definition
+    :type definition: ablauf.Definition
+    :param cachedir: the directory of the generated modules, a private directory of the user if not set, see
+        getCacheDir
+    :type cachedir: string
+    :return: the transit function, called with the machine, the name or id of the transition and the payload
+    :rtype: function
+    :raises PermissionError: if the cache directory or the module could be changed by others
+    """
+
+    table = definition.getTable()
+    if cachedir is None:
+        cachedir = getCacheDir()
+    elif not os.path.isdir(cachedir):
+        os.makedirs(cachedir, 0o700)
+    checkPrivate(cachedir)
+    # the bytecode directory is created here, so it gets the same access as the cache directory
+    bytecodedir = os.path.join(cachedir, "__pycache__")
+    os.makedirs(bytecodedir, 0o700, exist_ok=True)
+    checkPrivate(bytecodedir)
+
+    modulename = "ablauf_" + getKey(table)
+    filename = os.path.join(cachedir, modulename + ".py")
+    if not os.path.exists(filename):
+        temporaryname = filename + "." + str(os.getpid())
+        with os.fdopen(os.open(temporaryname, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as modulefile:
+            modulefile.write(generate(table))
+        os.replace(temporaryname, filename)
+    checkPrivate(filename)
+
+    spec = importlib.util.spec_from_file_location(modulename, filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.bind(table)
@@ -0,0 +1,78 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# The Context module
+# ----------------------------------------------------------------------------------------------------------------------
+import sys
+
+
+def defineContext(name, fields, defaults=None, module=None):
+    """
+    Create a compact context type with __slots__. Its instances have no __dict__, so the data of a session lives in
+    the fixed fields of the context, without a dict per machine. A default that is callable, like list or dict, is
+    called for every new context, so contexts do not share mutable defaults.
+
+    *Example:*
+
+    .. code-block:: python
+
+        Session = defineContext("Session", ["user", "score", "items"], {"score": 0, "items": list})
+        Game.setContextType(Session)
+
+        session = Game.createMachine()
+        session.getContext().user = "anna"
+
+    :param name: the name of the type
+    :type name: string
+    :param fields: the names of the fields
+    :type fields: list of string
+    :param defaults: the default values by field name, fields without a default are None
+    :type defaults: dict
+    :param module: the name of the module the type is pickled from, the module of the caller if not set
+    :type module: string
+    :return: the context type
+    :rtype: type
+    """
+
+    fields = tuple(fields)
+    defaults = dict(defaults or {})
+    for field in defaults:
+        if field not in fields:
+            raise ValueError("Default for unknown field " + str(field) + " of context " + str(name))
+
+    initials = tuple((field, defaults.get(field)) for field in fields)
+
+    def __init__(self, **values):
+        for field, default in initials:
+            if field in values:
+                setattr(self, field, values.pop(field))
+            else:
+                setattr(self, field, default() if callable(default) else default)
+        if values:
+            raise TypeError("Unknown fields of context " + name + ": " + ", ".join(sorted(values)))
+
+    def __repr__(self):
+        return name + "(" + ", ".join(field + "=" + repr(getattr(self, field)) for field in fields) + ")"
+
+    def __getstate__(self):
+        return tuple(getattr(self, field) for field in fields)
+
+    def __setstate__(self, state):
+        for field, value in zip(fields, state):
+            setattr(self, field, value)
+
+    contexttype = type(name, (object,), {
+        '__slots__': fields,
+        '__init__': __init__,
+        '__repr__': __repr__,
+        '__getstate__': __getstate__,
+        '__setstate__': __setstate__,
+    })
+
+    # like namedtuple, the type is pickled by the name of the module it is defined in
+    if module is None:
+        try:
+            module = sys._getframe(1).f_globals.get('__name__', '__main__')
+        except (AttributeError, ValueError):
+            module = None
+    if module is not None:
+        contexttype.__module__ = module
+    return contexttype
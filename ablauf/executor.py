@@ -0,0 +1,280 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# The Executor module
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from ablauf.table import TransitionTable
+
+
+class ShardedExecutor(object):
+    """
+    Runs the instances of a definition in a pool of worker processes. Every instance is owned by one shard, chosen by
+    its key, and every shard is one worker process. The definition is sent to each worker once, when the worker starts.
+    Events are collected per shard and sent in batches, the results of a batch are returned when the batch is done.
+
+    An instance is started in the first state with its first event. The enter, leave and transition functions are
+    called in the worker process, so they and the definition must be picklable, e.g. functions defined at module level.
+    Keys are routed by their hash, which for strings is only stable during the life of the executor. Every instance
+    keeps its history for history states in its worker. Guarded transitions are not evaluated in the workers, like in
+    instance stores they are returned as TransitionTable.NONE.
+
+    *Example:*
+
+    .. code-block:: python
+
+        executor = ShardedExecutor(Game, "Menu", shards=8)
+
+        for session, event in events:
+            executor.post(session, event)
+        executor.flush()
+
+        for session, stateid in executor.results():
+            ...
+
+        executor.shutdown()
+
+    :param definition: the definition the instances run on
+    :type definition: ablauf.Definition
+    :param firststatename: the name of the state new instances start in
+    :type firststatename: string
+    :param shards: the number of worker processes, the number of CPUs if not set
+    :type shards: int
+    :param batchsize: the number of events of a shard that are sent together
+    :type batchsize: int
+    """
+
+    def __init__(self, definition, firststatename, shards=None, batchsize=1000):
+        """
+        An executor with one worker process per shard.
+        """
+
+        self.definition = definition
+        self.table = definition.getTable()
+        self.shards = shards or os.cpu_count() or 1
+        self.batchsize = batchsize
+
+        self.executors = [ProcessPoolExecutor(max_workers=1, initializer=_initializeShard,
+                                              initargs=(definition, firststatename))
+                          for _ in range(self.shards)]
+        self.batches = [[] for _ in range(self.shards)]
+        self.futures = []
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # getter / setter
+    # ------------------------------------------------------------------------------------------------------------------
+    def getShard(self, key):
+        """
+        Return the shard that owns an instance
+
+        :param key: the key of the instance
+        :return: the number of the shard
+        :rtype: int
+        """
+
+        return hash(key) % self.shards
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # functions
+    # ------------------------------------------------------------------------------------------------------------------
+    def post(self, key, event, payload=None):
+        """
+        Add an event for an instance. The event is sent to the owning shard when its batch is full or on flush.
+
+        :param key: the key of the instance
+        :param event: the name or the id of the transition
+        :type event: string or int
+        :param payload: the payload of the event, it is pickled to the worker
+        """
+
+        shard = hash(key) % self.shards
+        batch = self.batches[shard]
+        batch.append((key, event, payload))
+        if len(batch) >= self.batchsize:
+            self.send(shard)
+
+    def send(self, shard):
+        """
+        Send the collected events of a shard to its worker
+
+        :param shard: the number of the shard
+        :type shard: int
+        """
+
+        batch = self.batches[shard]
+        if batch:
+            self.batches[shard] = []
+            self.futures.append(self.executors[shard].submit(_processBatch, batch))
+
+    def flush(self):
+        """
+        Send the collected events of all shards to the workers
+        """
+
+        for shard in range(self.shards):
+            self.send(shard)
+
+    def results(self):
+        """
+        Return the results of all sent batches in the order the batches were sent, the results of a batch as soon as
+        it and all batches sent before it are done. Every result is a tuple of the key of the instance and the id of its
+        new state, or TransitionTable.NONE if the instance had no such transition. The results of one instance are in
+        the order of its events.
+
+        :return: the results
+        :rtype: generator of tuple
+        """
+
+        futures = self.futures
+        self.futures = []
+        for future in futures:
+            for result in future.result():
+                yield result
+
+    def map(self, events):
+        """
+        Post, flush and return the results of many events
+
+        :param events: tuples of the key of the instance and the name or id of the transition
+        :type events: iterable of tuple
+        :return: the results
+        :rtype: generator of tuple
+        """
+
+        for key, event in events:
+            self.post(key, event)
+        self.flush()
+        return self.results()
+
+    def getStates(self):
+        """
+        Return the actual state ids of all instances of all shards
+
+        :return: the state id by key of the instance
+        :rtype: dict
+        """
+
+        states = {}
+        for future in [executor.submit(_getStates) for executor in self.executors]:
+            states.update(future.result())
+        return states
+
+    def shutdown(self, wait=True):
+        """
+        Stop the worker processes
+
+        :param wait: wait until all sent batches are done
+        :type wait: boolean
+        """
+
+        for executor in self.executors:
+            executor.shutdown(wait)
+
+
+class ShardWorker(object):
+    """
+    The instances of one shard, running inside a worker process. The actual state id of every instance is held by its
+    key, and its history array if the definition has history states. The functions get the key of the instance as
+    context.
+
+    :param definition: the definition the instances run on
+    :type definition: ablauf.Definition
+    :param firststatename: the name of the state new instances start in
+    :type firststatename: string
+    """
+
+    def __init__(self, definition, firststatename):
+        """
+        A shard of instances.
+        """
+
+        self.table = definition.getTable()
+        self.firststateid, self.firstentry = self.table.getFirstState(firststatename)
+        self.states = {}
+        self.histories = {} if self.table.historycount else None
+
+    def process(self, batch):
+        """
+        Do the transitions of a batch of events
+
+        :param batch: tuples of the key of the instance, the name or id of the transition and the payload
+        :type batch: list
+        :return: tuples of the key of the instance and the id of its new state, or NONE if there is no such transition
+            or the event is unknown
+        :rtype: list
+        """
+
+        table = self.table
+        states = self.states
+        eventcount = table.eventcount
+        eventids = table.eventids
+        destinations = table.destinations
+        histories = self.histories
+        results = []
+
+        for key, event, payload in batch:
+            stateid = states.get(key)
+            if stateid is None:
+                stateid = self.firststateid
+                if self.firstentry is not None:
+                    self.firstentry(key, payload)
+                enter = table.enters[stateid]
+                if enter is not None:
+                    enter(key, payload)
+                states[key] = stateid
+
+            eventid = eventids.get(event)
+            if eventid is None:
+                results.append((key, TransitionTable.NONE))
+                continue
+            slot = stateid * eventcount + eventid
+            destinationid = destinations[slot]
+            history = None
+            if histories is not None:
+                history = histories.get(key)
+                if history is None:
+                    history = histories[key] = table.createHistory()
+            if destinationid == TransitionTable.HISTORY:
+                destinationid, function = table.resume(slot, history)
+            elif destinationid < 0:
+                results.append((key, TransitionTable.NONE))
+                continue
+            else:
+                function = table.functions[slot]
+
+            leave = table.leaves[stateid]
+            if leave is not None:
+                leave(key, payload)
+
+            if function is not None:
+                function(key, payload)
+
+            enter = table.enters[destinationid]
+            if enter is not None:
+                enter(key, payload)
+
+            states[key] = destinationid
+            if history is not None:
+                table.remember(history, slot, destinationid)
+            results.append((key, destinationid))
+
+        return results
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Worker process functions
+# ----------------------------------------------------------------------------------------------------------------------
+_worker = None
+
+
+def _initializeShard(definition, firststatename):
+    global _worker
+    _worker = ShardWorker(definition, firststatename)
+
+
+def _processBatch(batch):
+    return _worker.process(batch)
+
+
+def _getStates():
+    return _worker.states
@@ -0,0 +1,547 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# The Graph module
+# ----------------------------------------------------------------------------------------------------------------------
+from array import array
+from collections import OrderedDict, deque
+from fnmatch import fnmatchcase
+
+
+class Validation(object):
+    """
+    The result of checking a set of states. It reports
+
+    * dangling transitions, whose destination state does not exist
+    * unreachable states, that can not be reached from the first state. Only checked if the first state is given.
+    * dead ends, states without own or inherited transitions. The End state and parent states are not dead ends.
+    * a broken hierarchy: unknown parents, parents that form a cycle, parent states without initial state and
+      initial states that are no child
+    * timeouts that fire a transition the state, its parents and its groups do not have
+    * shadowed candidates of guarded transitions, that follow a candidate without guard and are never taken
+
+    Dangling transitions, timeouts and a broken hierarchy make the states invalid, the other problems are reported
+    only.
+
+    *Example:*
+
+    .. code-block:: python
+
+        validation = Game.validate("Menu")
+        for problem in validation.getProblems():
+            print(problem)
+
+    :param states: the states to check
+    :type states: dict
+    :param firststatename: the name of the first state
+    :type firststatename: string
+    :param scopes: the transitions of groups of states and the global transitions, see ablauf.Definition.getScopes
+    :type scopes: list of tuple
+    """
+
+    def __init__(self, states, firststatename=None, scopes=None):
+        """
+        Check the given states.
+        """
+
+        self.dangling = []
+        self.timeouts = []
+        self.shadowed = []
+        self.hierarchy = []
+        self.unreachable = []
+        self.deadends = []
+
+        scopes = [] if scopes is None else scopes
+        for pattern, transitions in scopes:
+            scopename = "*" if pattern is None else pattern
+            for transitionname, candidates in transitions.items():
+                for index, transition in enumerate(candidates):
+                    if transition.getDestinationName() not in states:
+                        self.dangling.append((scopename, transitionname, transition.getDestinationName()))
+                    if transition.guard is None and index < len(candidates) - 1:
+                        self.shadowed.extend((scopename, transitionname, shadowed.getDestinationName())
+                                             for shadowed in candidates[index + 1:])
+
+        children = {}
+        for state in states.values():
+            if state.parent is None:
+                continue
+            if state.parent not in states:
+                self.hierarchy.append("Parent " + str(state.parent) + " of state " + str(state.getName()) +
+                                      " is unknown")
+            else:
+                children.setdefault(state.parent, []).append(state.getName())
+            if len(self.getAncestors(states, state)) > len(states):
+                self.hierarchy.append("The parents of state " + str(state.getName()) + " form a cycle")
+        for state in states.values():
+            if state.getName() in children and state.initial is None:
+                self.hierarchy.append("State " + str(state.getName()) + " has child states but no initial state")
+            if state.initial is not None and state.initial not in children.get(state.getName(), ()):
+                self.hierarchy.append("Initial state " + str(state.initial) + " of state " + str(state.getName()) +
+                                      " is not its child")
+            if state.initial is not None and state.initial in states and states[state.initial].history is not None:
+                self.hierarchy.append("Initial state " + str(state.initial) + " of state " + str(state.getName()) +
+                                      " is a history state")
+            histories = [name for name in children.get(state.getName(), ()) if states[name].history is not None]
+            if len(histories) > 1:
+                self.hierarchy.append("State " + str(state.getName()) + " has more than one history state")
+            if state.history is not None:
+                if state.parent is None:
+                    self.hierarchy.append("History state " + str(state.getName()) + " has no parent")
+                if state.getName() in children or state.transitions:
+                    self.hierarchy.append("History state " + str(state.getName()) +
+                                          " has child states or transitions")
+            for candidates in state.candidates.values():
+                for transition in candidates:
+                    destination = states.get(transition.getDestinationName())
+                    if destination is not None and destination.history is not None:
+                        self.hierarchy.append("Guarded transition " + str(transition.getName()) + " of state " +
+                                              str(state.getName()) + " leads to a history state")
+
+        for state in states.values():
+            if state.getName() != "End" and state.getName() not in children and state.history is None and \
+                    not any(ancestor.transitions for ancestor in self.getAncestors(states, state)) and \
+                    not self.getScopeTransitions(scopes, state.getName()):
+                self.deadends.append(state.getName())
+            for transition in state.getAllTransitions():
+                if transition.getDestinationName() not in states:
+                    self.dangling.append((state.getName(), transition.getName(), transition.getDestinationName()))
+            for transitionname, candidates in state.candidates.items():
+                for index, transition in enumerate(candidates[:-1]):
+                    if transition.guard is None:
+                        self.shadowed.extend((state.getName(), transitionname, shadowed.getDestinationName())
+                                             for shadowed in candidates[index + 1:])
+                        break
+            # a child state can fire a transition it inherits from its parents
+            if state.timeout is not None and \
+                    not any(state.timeout[1] in ancestor.transitions
+                            for ancestor in self.getAncestors(states, state)) and \
+                    state.timeout[1] not in [transition.getName()
+                                             for transition in self.getScopeTransitions(scopes, state.getName())]:
+                self.timeouts.append((state.getName(), state.timeout[1]))
+
+        if firststatename is not None:
+            reached = set([firststatename])
+            pending = deque([firststatename])
+            while pending:
+                state = states.get(pending.popleft())
+                if state is None:
+                    continue
+                # entering a state enters its initial state, being in a state means being in its parent
+                following = [transition.getDestinationName() for transition in state.getAllTransitions()]
+                following.extend(transition.getDestinationName()
+                                 for transition in self.getScopeTransitions(scopes, state.getName()))
+                following.extend(name for name in (state.initial, state.parent) if name is not None)
+                for name in following:
+                    if name not in reached:
+                        reached.add(name)
+                        pending.append(name)
+
+            self.unreachable = [statename for statename in states if statename not in reached]
+
+    @staticmethod
+    def getAncestors(states, state):
+        """
+        Return the state and its known parent states, from the state up. Stops at a cycle.
+
+        :param states: the states
+        :type states: dict
+        :param state: the state
+        :type state: ablauf.State
+        :return: the state and its parents
+        :rtype: list of ablauf.State
+        """
+
+        ancestors = [state]
+        while ancestors[-1].parent in states and len(ancestors) <= len(states):
+            ancestors.append(states[ancestors[-1].parent])
+        return ancestors
+
+    @staticmethod
+    def getScopeTransitions(scopes, statename):
+        """
+        Return the transitions of the groups that contain a state and the global transitions, End has none
+
+        :param scopes: the transitions of groups of states and the global transitions
+        :type scopes: list of tuple
+        :param statename: the name of the state
+        :type statename: string
+        :return: the transitions
+        :rtype: list of ablauf.Transition
+        """
+
+        if statename == "End":
+            return []
+        return [transition for pattern, transitions in scopes
+                if pattern is None or fnmatchcase(str(statename), pattern)
+                for candidates in transitions.values() for transition in candidates]
+
+    def isValid(self):
+        """
+        Return True if there are no dangling transitions and timeouts and the hierarchy is not broken
+
+        :return: valid
+        :rtype: boolean
+        """
+
+        return not self.dangling and not self.timeouts and not self.hierarchy
+
+    def getProblems(self):
+        """
+        Return a description of every problem
+
+        :return: the descriptions
+        :rtype: list of string
+        """
+
+        problems = []
+        for statename, transitionname, destinationname in self.dangling:
+            problems.append("Transition " + str(transitionname) + " of state " + str(statename) +
+                            " leads to unknown state " + str(destinationname))
+        problems.extend(self.hierarchy)
+        for statename, transitionname in self.timeouts:
+            problems.append("Timeout of state " + str(statename) + " fires unknown transition " + str(transitionname))
+        for statename, transitionname, destinationname in self.shadowed:
+            problems.append("Transition " + str(transitionname) + " of state " + str(statename) + " to state " +
+                            str(destinationname) + " is shadowed by a transition without guard")
+        for statename in self.unreachable:
+            problems.append("State " + str(statename) + " can not be reached")
+        for statename in self.deadends:
+            problems.append("State " + str(statename) + " has no transitions")
+        return problems
+
+
+class GraphIndex(object):
+    """
+    An index of the paths between the states of a transition table. It answers if a state can be reached from
+    another one, which states can reach a terminal state and the shortest sequence of events between two states.
+
+    The states are grouped into strongly connected components and the reachable states of every component are kept
+    as a bitset, so reachability is one bit test. Shortest paths are found with a backward breadth first search from
+    the target, which is done once per target: afterwards every state knows its next event towards the target. The
+    paths of a target take two arrays of statecount entries, about 16 bytes per state, so only the paths of the
+    maxpaths targets used last are kept.
+
+    Guarded transitions count with all their candidates, so a path over a guarded transition is only possible if the
+    guard holds. A transition to a history state counts with every state it can resume.
+
+    A machine is always in a leaf state, so the paths lead between leaf states. A parent state is reached when one of
+    its child states is reached, and a query from a parent state starts at the state that is entered with it, going
+    down the initial states.
+
+    *Example:*
+
+    .. code-block:: python
+
+        index = Game.getIndex()
+
+        if index.canReach("Menu", "Highscore"):
+            print(index.getShortestPath("Menu", "Highscore"))
+        print(index.getFinishingStates())
+
+    :param table: the transition table
+    :type table: ablauf.table.TransitionTable
+    :param maxpaths: the number of targets whose paths are kept
+    :type maxpaths: int
+    """
+
+    def __init__(self, table, maxpaths=64):
+        """
+        Build the index of a transition table.
+        """
+
+        self.table = table
+        statecount = table.statecount
+        eventcount = table.eventcount
+
+        # the event id and destination id of every transition, by source state id
+        self.successors = [[] for _ in range(statecount)]
+        for slot, destinationid in enumerate(table.destinations):
+            if destinationid != table.NONE:
+                for targetid in table.getTargets(slot):
+                    self.successors[slot // eventcount].append((slot % eventcount, targetid))
+
+        self.component, components = self.getComponents()
+
+        # components come sinks first, so the components they lead to are done before
+        self.reachable = []
+        for members in components:
+            bits = 0
+            for stateid in members:
+                bits |= 1 << stateid
+            componentid = len(self.reachable)
+            for stateid in members:
+                for eventid, destinationid in self.successors[stateid]:
+                    if self.component[destinationid] != componentid:
+                        bits |= self.reachable[self.component[destinationid]]
+            self.reachable.append(bits)
+
+        # the leaf states inside every state, a leaf state contains only itself and a history state nothing
+        self.members = [0] * statecount
+        for stateid in range(statecount):
+            if table.initials[stateid] == stateid and table.histories[stateid] is None:
+                for ancestorid in table.getAncestors(stateid):
+                    self.members[ancestorid] |= 1 << stateid
+
+        self.terminals = 0
+        for stateid in range(statecount):
+            if not self.successors[stateid] and self.members[stateid] == 1 << stateid:
+                self.terminals |= 1 << stateid
+
+        self.predecessors = None
+        self.paths = OrderedDict()
+        self.maxpaths = maxpaths
+
+    def getComponents(self):
+        """
+        Find the strongly connected components with Tarjan's algorithm, without recursion
+
+        :return: the component id of every state, and the state ids of every component, sinks first
+        :rtype: tuple
+        """
+
+        statecount = self.table.statecount
+        successors = self.successors
+        index = [-1] * statecount
+        lowlink = [0] * statecount
+        onstack = [False] * statecount
+        component = [-1] * statecount
+        components = []
+        stack = []
+        counter = 0
+
+        for root in range(statecount):
+            if index[root] >= 0:
+                continue
+            work = [(root, 0)]
+            while work:
+                stateid, position = work.pop()
+                if position == 0:
+                    index[stateid] = lowlink[stateid] = counter
+                    counter += 1
+                    stack.append(stateid)
+                    onstack[stateid] = True
+                elif position > 0:
+                    childid = successors[stateid][position - 1][1]
+                    lowlink[stateid] = min(lowlink[stateid], lowlink[childid])
+
+                descended = False
+                while position < len(successors[stateid]):
+                    childid = successors[stateid][position][1]
+                    position += 1
+                    if index[childid] < 0:
+                        work.append((stateid, position))
+                        work.append((childid, 0))
+                        descended = True
+                        break
+                    if onstack[childid]:
+                        lowlink[stateid] = min(lowlink[stateid], index[childid])
+                if descended:
+                    continue
+
+                if lowlink[stateid] == index[stateid]:
+                    members = []
+                    while True:
+                        memberid = stack.pop()
+                        onstack[memberid] = False
+                        component[memberid] = len(components)
+                        members.append(memberid)
+                        if memberid == stateid:
+                            break
+                    components.append(members)
+
+        return component, components
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # queries
+    # ------------------------------------------------------------------------------------------------------------------
+    def canReach(self, sourcename, targetname):
+        """
+        Return True if the target state or one of its child states can be reached from the source state. Every state
+        reaches itself.
+
+        :param sourcename: the name of the source state
+        :type sourcename: string
+        :param targetname: the name of the target state
+        :type targetname: string
+        :return: reachable
+        :rtype: boolean
+        """
+
+        table = self.table
+        return bool(self.getReachableBits(table.getStateId(sourcename)) & self.members[table.getStateId(targetname)])
+
+    def getReachable(self, statename):
+        """
+        Return the names of the states that can be reached from a state, including the state itself and the parents
+        of the reached states
+
+        :param statename: the name of the state
+        :type statename: string
+        :return: the names of the states
+        :rtype: list of string
+        """
+
+        bits = self.getReachableBits(self.table.getStateId(statename))
+        return [name for stateid, name in enumerate(self.table.statenames) if self.members[stateid] & bits]
+
+    def canFinish(self, statename):
+        """
+        Return True if a terminal state, a state without transitions like End, can be reached from a state
+
+        :param statename: the name of the state
+        :type statename: string
+        :return: a terminal state can be reached
+        :rtype: boolean
+        """
+
+        return bool(self.getReachableBits(self.table.getStateId(statename)) & self.terminals)
+
+    def getTerminalStates(self):
+        """
+        Return the names of the leaf states without transitions
+
+        :return: the names of the states
+        :rtype: list of string
+        """
+
+        return self.getNames(self.terminals)
+
+    def getFinishingStates(self):
+        """
+        Return the names of the states that can reach a terminal state
+
+        :return: the names of the states
+        :rtype: list of string
+        """
+
+        return [statename for stateid, statename in enumerate(self.table.statenames)
+                if self.getReachableBits(stateid) & self.terminals]
+
+    def getShortestPath(self, sourcename, targetname):
+        """
+        Return the shortest sequence of events that leads from the source state to the target state or one of its
+        child states
+
+        :param sourcename: the name of the source state
+        :type sourcename: string
+        :param targetname: the name of the target state
+        :type targetname: string
+        :return: the names of the events, or None if the target can not be reached
+        :rtype: list
+        """
+
+        table = self.table
+        stateid = table.initials[table.getStateId(sourcename)]
+        targetid = table.getStateId(targetname)
+        events, states = self.getPaths(targetid)
+        if not self.isInside(stateid, targetid) and events[stateid] < 0:
+            return None
+
+        path = []
+        while not self.isInside(stateid, targetid):
+            path.append(table.eventnames[events[stateid]])
+            stateid = states[stateid]
+        return path
+
+    def getNextEvent(self, stateid, targetid):
+        """
+        Return the first event of the shortest path from a leaf state to the target state or one of its child states
+
+        :param stateid: the id of the state
+        :type stateid: int
+        :param targetid: the id of the target state
+        :type targetid: int
+        :return: the id of the event, or NONE if the target can not be reached or contains the state
+        :rtype: int
+        """
+
+        return self.getPaths(targetid)[0][stateid]
+
+    def isInside(self, stateid, targetid):
+        """
+        Return True if a leaf state is the target state or one of its child states
+
+        :param stateid: the id of the leaf state
+        :type stateid: int
+        :param targetid: the id of the target state
+        :type targetid: int
+        :return: inside
+        :rtype: boolean
+        """
+
+        return bool(self.members[targetid] >> stateid & 1)
+
+    def getReachableBits(self, stateid):
+        """
+        Return the bitset of the leaf states that can be reached from a state, starting at the state entered with it
+
+        :param stateid: the id of the state
+        :type stateid: int
+        :return: the bitset of state ids
+        :rtype: int
+        """
+
+        return self.reachable[self.component[self.table.initials[stateid]]]
+
+    def getPaths(self, targetid):
+        """
+        Return the next event and the next state of every state on its shortest path to the target state or one of its
+        child states. They are computed with a backward breadth first search on first use and kept, the paths of the
+        target used longest ago are dropped when more than maxpaths targets are kept.
+
+        :param targetid: the id of the target state
+        :type targetid: int
+        :return: the event ids and the state ids, by state id, NONE if the target can not be reached
+        :rtype: tuple of array.array
+        """
+
+        paths = self.paths.get(targetid)
+        if paths is not None:
+            self.paths.move_to_end(targetid)
+            return paths
+
+        table = self.table
+        if self.predecessors is None:
+            self.predecessors = [[] for _ in range(table.statecount)]
+            for stateid, successors in enumerate(self.successors):
+                for eventid, destinationid in successors:
+                    self.predecessors[destinationid].append((stateid, eventid))
+
+        events = array('l', [table.NONE]) * table.statecount
+        states = array('l', [table.NONE]) * table.statecount
+        visited = bytearray(table.statecount)
+        pending = deque()
+        for stateid in range(table.statecount):
+            if self.isInside(stateid, targetid):
+                visited[stateid] = 1
+                pending.append(stateid)
+        while pending:
+            destinationid = pending.popleft()
+            for stateid, eventid in self.predecessors[destinationid]:
+                if not visited[stateid]:
+                    visited[stateid] = 1
+                    events[stateid] = eventid
+                    states[stateid] = destinationid
+                    pending.append(stateid)
+
+        paths = self.paths[targetid] = (events, states)
+        if len(self.paths) > self.maxpaths:
+            self.paths.popitem(last=False)
+        return paths
+
+    def getNames(self, bits):
+        """
+        Return the names of the states of a bitset
+
+        :param bits: the bitset of state ids
+        :type bits: int
+        :return: the names of the states
+        :rtype: list of string
+        """
+
+        statenames = self.table.statenames
+        names = []
+        while bits:
+            lowest = bits & -bits
+            names.append(statenames[lowest.bit_length() - 1])
+            bits ^= lowest
+        return names
@@ -0,0 +1,131 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# The Guard module
+# ----------------------------------------------------------------------------------------------------------------------
+import ast
+import re
+
+EXPRESSION = re.compile(r"^\s*([A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*)\s*"
+                        r"(<=|>=|==|!=|<|>|not\s+in|in|is\s+not|is)\s*(.+?)\s*$")
+
+
+class Guard(object):
+    """
+    The condition of a guarded transition. A state can have several transitions with the same name, the first one
+    whose guard holds for the context of the machine is taken. A transition without guard always holds.
+
+    The condition is either a function that gets the context and returns a boolean, or a comparison of an attribute of
+    the context with a constant, e.g. ``"amount < 1000"`` or ``"customer.country in ('DE', 'AT')"``. Comparisons are
+    compiled once into a function that loads the attribute and compares it, without interpreting the expression.
+
+    Every guard counts how often it held and how often it did not, so the hot guards can be put first.
+
+    *Example:*
+
+    .. code-block:: python
+
+        Menu.addTransition(Transition("Submit", "Approved", None, "amount < 1000"))
+        Menu.addTransition(Transition("Submit", "Review", None))
+
+    :param condition: the function or the comparison
+    :type condition: function or string
+    """
+
+    def __init__(self, condition):
+        """
+        A guard of a transition.
+        """
+
+        if callable(condition):
+            self.expression = None
+            self.predicate = condition
+        else:
+            self.expression = condition
+            self.predicate = compileExpression(condition)
+        self.hits = 0
+        self.misses = 0
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # getter / setter
+    # ------------------------------------------------------------------------------------------------------------------
+    def getExpression(self):
+        """
+        Return the comparison of the guard
+
+        :return: the comparison, or None if the guard is a function
+        :rtype: string
+        """
+
+        return self.expression
+
+    def getHits(self):
+        """
+        Return how often the guard held
+
+        :return: the number of hits
+        :rtype: int
+        """
+
+        return self.hits
+
+    def getMisses(self):
+        """
+        Return how often the guard did not hold
+
+        :return: the number of misses
+        :rtype: int
+        """
+
+        return self.misses
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # functions
+    # ------------------------------------------------------------------------------------------------------------------
+    def test(self, context):
+        """
+        Evaluate the guard and count the result
+
+        :param context: the context of the machine
+        :return: True if the guard holds
+        :rtype: boolean
+        """
+
+        if self.predicate(context):
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def reset(self):
+        """
+        Set the counters to 0
+        """
+
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return "Guard(%r)" % (self.predicate if self.expression is None else self.expression)
+
+
+def compileExpression(expression):
+    """
+    Compile a comparison of an attribute of the context with a constant into a function
+
+    :param expression: the comparison, e.g. "amount < 1000"
+    :type expression: string
+    :return: the function that gets the context and returns a boolean
+    :rtype: function
+    """
+
+    match = EXPRESSION.match(expression)
+    if match is None:
+        raise ValueError("Guard " + repr(expression) + " is not a comparison of an attribute with a constant")
+
+    attribute, operator, constant = match.groups()
+    try:
+        value = ast.literal_eval(constant)
+    except (ValueError, SyntaxError):
+        raise ValueError("Guard " + repr(expression) + " does not compare with a constant")
+
+    # the attribute and the operator are checked by the regular expression, the constant is passed as global
+    return eval("lambda context: context.%s %s value" % (attribute, " ".join(operator.split())), {"value": value})
@@ -0,0 +1,426 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# The Instrumentation module
+# ----------------------------------------------------------------------------------------------------------------------
+import json
+import math
+import time
+from inspect import isawaitable
+
+from ablauf.journal import MACHINES
+
+
+class Histogram(object):
+    """
+    A latency histogram with power of two buckets. Bucket n counts the durations up to 2^n microseconds, the last
+    bucket counts all longer durations.
+    """
+
+    BUCKETS = 32
+
+    __slots__ = ('buckets', 'count', 'sum')
+
+    def __init__(self):
+        """
+        An empty histogram.
+        """
+
+        self.buckets = [0] * (self.BUCKETS + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, seconds):
+        """
+        Add a duration
+
+        :param seconds: the duration in seconds
+        :type seconds: float
+        """
+
+        # the smallest n with 2^n >= the duration in whole microseconds, so the bounds are inclusive like Prometheus le
+        microseconds = math.ceil(seconds * 1000000)
+        bucket = (microseconds - 1).bit_length() if microseconds > 0 else 0
+        self.buckets[min(bucket, self.BUCKETS)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def getBounds(self):
+        """
+        Return the upper bounds of the buckets in seconds. The bound of the last bucket is infinite.
+
+        :return: the upper bounds
+        :rtype: list of float
+        """
+
+        return [(1 << bucket) / 1000000.0 for bucket in range(self.BUCKETS)] + [float("inf")]
+
+    def getSnapshot(self):
+        """
+        Return the values of the histogram
+
+        :return: count, sum and the counts of the non empty buckets by their upper bound
+        :rtype: dict
+        """
+
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": dict((str(bound), count) for bound, count in zip(self.getBounds(), self.buckets) if count),
+        }
+
+
+class Instrumentation(object):
+    """
+    Records the call counts and latencies of the enter and leave functions of every state and of the function of every
+    transition, the dwell time in every state and the number of transits per transition.
+
+    Instrumentation is off unless it is set on a definition. When it is off, the machines only check that no
+    instrumentation is set. The dwell time of an instance is measured from entering a state to leaving it, for
+    instances started while instrumentation was set. The entry time is kept by the recorder id and the id of the
+    instance, so machines and the instances of stores of the same id do not overwrite each other, see
+    ablauf.Definition.nextRecorderId. It is only kept while an instance is in a state it can leave, it is dropped when
+    the instance enters a terminal state like End. Instances that are discarded in another state are dropped with
+    forget, so the memory follows the number of running instances.
+
+    *Example:*
+
+    .. code-block:: python
+
+        instrumentation = Instrumentation(Game.getTable())
+        Game.setInstrumentation(instrumentation)
+
+        ...
+
+        print(instrumentation.toPrometheus())
+
+    :param table: the transition table of the definition
+    :type table: ablauf.table.TransitionTable
+    :param clock: the clock that returns the time in seconds
+    :type clock: function
+    """
+
+    def __init__(self, table, clock=time.perf_counter):
+        """
+        An instrumentation of a transition table.
+        """
+
+        self.table = table
+        self.clock = clock
+        self.enters = [Histogram() for _ in range(table.statecount)]
+        self.leaves = [Histogram() for _ in range(table.statecount)]
+        self.dwells = [Histogram() for _ in range(table.statecount)]
+        self.functions = {}
+        self.transits = [0] * (table.statecount * table.eventcount)
+        self.entered = {}
+
+        # states without transitions, instances entering them need no entry time
+        self.terminals = bytearray(table.statecount)
+        for stateid in range(table.statecount):
+            slots = table.destinations[stateid * table.eventcount:(stateid + 1) * table.eventcount]
+            if all(destinationid == table.NONE for destinationid in slots):
+                self.terminals[stateid] = 1
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # recording
+    # ------------------------------------------------------------------------------------------------------------------
+    def start(self, recorderid, instanceid, destinationid, context=None, payload=None):
+        """
+        Call and time the enter function of the first state of an instance
+
+        :param recorderid: the id of the recorder, MACHINES or the recorder id of an instance store
+        :type recorderid: int
+        :param instanceid: the id of the instance
+        :type instanceid: int
+        :param destinationid: the id of the first state
+        :type destinationid: int
+        :param context: the context the enter function is called with
+        :param payload: the payload the enter function is called with
+        """
+
+        clock = self.clock
+        enter = self.table.enters[destinationid]
+        if enter is not None:
+            begin = clock()
+            enter(context, payload)
+            self.enters[destinationid].add(clock() - begin)
+        if not self.terminals[destinationid]:
+            self.entered[(recorderid, instanceid)] = clock()
+
+    async def startAsync(self, recorderid, instanceid, destinationid, context=None, payload=None):
+        """
+        Call and time the enter function of the first state of an instance, awaiting a coroutine
+
+        :param recorderid: the id of the recorder, MACHINES or the recorder id of an instance store
+        :type recorderid: int
+        :param instanceid: the id of the instance
+        :type instanceid: int
+        :param destinationid: the id of the first state
+        :type destinationid: int
+        :param context: the context the enter function is called with
+        :param payload: the payload the enter function is called with
+        """
+
+        clock = self.clock
+        enter = self.table.enters[destinationid]
+        if enter is not None:
+            begin = clock()
+            result = enter(context, payload)
+            if result is not None and isawaitable(result):
+                await result
+            self.enters[destinationid].add(clock() - begin)
+        if not self.terminals[destinationid]:
+            self.entered[(recorderid, instanceid)] = clock()
+
+    def transit(self, recorderid, instanceid, stateid, slot, destinationid, function=None, context=None, payload=None):
+        """
+        Call and time the leave, transition and enter function of a transition
+
+        :param recorderid: the id of the recorder, MACHINES or the recorder id of an instance store
+        :type recorderid: int
+        :param instanceid: the id of the instance
+        :type instanceid: int
+        :param stateid: the id of the source state
+        :type stateid: int
+        :param slot: the slot of the transition in the transition table
+        :type slot: int
+        :param destinationid: the id of the destination state
+        :type destinationid: int
+        :param function: the function of the transition, the function of the slot if not set
+        :type function: function
+        :param context: the context the functions are called with
+        :param payload: the payload the functions are called with
+        """
+
+        table = self.table
+        clock = self.clock
+
+        now = clock()
+        entered = self.entered.pop((recorderid, instanceid), None)
+        if entered is not None:
+            self.dwells[stateid].add(now - entered)
+        self.transits[slot] += 1
+
+        leave = table.leaves[stateid]
+        if leave is not None:
+            leave(context, payload)
+            end = clock()
+            self.leaves[stateid].add(end - now)
+            now = end
+
+        if function is None:
+            function = table.functions[slot]
+        if function is not None:
+            function(context, payload)
+            end = clock()
+            self.getFunctionHistogram(slot).add(end - now)
+            now = end
+
+        enter = table.enters[destinationid]
+        if enter is not None:
+            enter(context, payload)
+            end = clock()
+            self.enters[destinationid].add(end - now)
+            now = end
+
+        if not self.terminals[destinationid]:
+            self.entered[(recorderid, instanceid)] = now
+
+    async def transitAsync(self, recorderid, instanceid, stateid, slot, destinationid, function=None, context=None,
+                           payload=None):
+        """
+        Call and time the leave, transition and enter function of a transition, awaiting coroutines
+
+        :param recorderid: the id of the recorder, MACHINES or the recorder id of an instance store
+        :type recorderid: int
+        :param instanceid: the id of the instance
+        :type instanceid: int
+        :param stateid: the id of the source state
+        :type stateid: int
+        :param slot: the slot of the transition in the transition table
+        :type slot: int
+        :param destinationid: the id of the destination state
+        :type destinationid: int
+        :param function: the function of the transition, the function of the slot if not set
+        :type function: function
+        :param context: the context the functions are called with
+        :param payload: the payload the functions are called with
+        """
+
+        table = self.table
+        clock = self.clock
+
+        now = clock()
+        entered = self.entered.pop((recorderid, instanceid), None)
+        if entered is not None:
+            self.dwells[stateid].add(now - entered)
+        self.transits[slot] += 1
+
+        leave = table.leaves[stateid]
+        if leave is not None:
+            result = leave(context, payload)
+            if result is not None and isawaitable(result):
+                await result
+            end = clock()
+            self.leaves[stateid].add(end - now)
+            now = end
+
+        if function is None:
+            function = table.functions[slot]
+        if function is not None:
+            result = function(context, payload)
+            if result is not None and isawaitable(result):
+                await result
+            end = clock()
+            self.getFunctionHistogram(slot).add(end - now)
+            now = end
+
+        enter = table.enters[destinationid]
+        if enter is not None:
+            result = enter(context, payload)
+            if result is not None and isawaitable(result):
+                await result
+            end = clock()
+            self.enters[destinationid].add(end - now)
+            now = end
+
+        if not self.terminals[destinationid]:
+            self.entered[(recorderid, instanceid)] = now
+
+    def forget(self, instanceid, recorderid=MACHINES):
+        """
+        Drop the entry time of an instance, e.g. when a session is discarded before it reached a terminal state
+
+        :param instanceid: the id of the instance
+        :type instanceid: int
+        :param recorderid: the id of the recorder, the machines if not set
+        :type recorderid: int
+        """
+
+        self.entered.pop((recorderid, instanceid), None)
+
+    def getFunctionHistogram(self, slot):
+        """
+        Return the histogram of a transition function, it is created on first use
+
+        :param slot: the slot of the transition in the transition table
+        :type slot: int
+        :return: the histogram
+        :rtype: ablauf.instrument.Histogram
+        """
+
+        histogram = self.functions.get(slot)
+        if histogram is None:
+            histogram = self.functions[slot] = Histogram()
+        return histogram
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # reporting
+    # ------------------------------------------------------------------------------------------------------------------
+    def getSnapshot(self):
+        """
+        Return the recorded values. States and transitions that were never used are left out.
+
+        :return: the values by state name and by transition as "state.event"
+        :rtype: dict
+        """
+
+        table = self.table
+        states = {}
+        for stateid, statename in enumerate(table.statenames):
+            values = {}
+            for kind, histograms in (("enter", self.enters), ("leave", self.leaves), ("dwell", self.dwells)):
+                if histograms[stateid].count:
+                    values[kind] = histograms[stateid].getSnapshot()
+            if values:
+                states[str(statename)] = values
+
+        transitions = {}
+        for slot, count in enumerate(self.transits):
+            if count:
+                stateid, eventid = divmod(slot, table.eventcount)
+                values = {"count": count}
+                if slot in self.functions:
+                    values["function"] = self.functions[slot].getSnapshot()
+                transitions[str(table.statenames[stateid]) + "." + str(table.eventnames[eventid])] = values
+
+        return {"states": states, "transitions": transitions}
+
+    def toJSON(self):
+        """
+        Return the recorded values as JSON
+
+        :return: the JSON document
+        :rtype: string
+        """
+
+        return json.dumps(self.getSnapshot(), sort_keys=True)
+
+    def toPrometheus(self):
+        """
+        Return the recorded values in the Prometheus text format
+
+        :return: the metrics
+        :rtype: string
+        """
+
+        table = self.table
+        lines = []
+
+        for kind, histograms in (("enter", self.enters), ("leave", self.leaves), ("dwell", self.dwells)):
+            name = "ablauf_state_" + kind + "_seconds"
+            lines.append("# TYPE " + name + " histogram")
+            for stateid, histogram in enumerate(histograms):
+                if histogram.count:
+                    appendHistogram(lines, name, 'state="%s"' % escape(table.statenames[stateid]), histogram)
+
+        lines.append("# TYPE ablauf_transition_function_seconds histogram")
+        for slot in sorted(self.functions):
+            stateid, eventid = divmod(slot, table.eventcount)
+            labels = 'state="%s",event="%s"' % (escape(table.statenames[stateid]), escape(table.eventnames[eventid]))
+            appendHistogram(lines, "ablauf_transition_function_seconds", labels, self.functions[slot])
+
+        lines.append("# TYPE ablauf_transitions_total counter")
+        for slot, count in enumerate(self.transits):
+            if count:
+                stateid, eventid = divmod(slot, table.eventcount)
+                lines.append('ablauf_transitions_total{state="%s",event="%s"} %d' %
+                             (escape(table.statenames[stateid]), escape(table.eventnames[eventid]), count))
+
+        return "\n".join(lines) + "\n"
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Prometheus text format
+# ----------------------------------------------------------------------------------------------------------------------
+def escape(value):
+    """
+    Escape a label value for the Prometheus text format
+
+    :param value: the label value
+    :return: the escaped value
+    :rtype: string
+    """
+
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def appendHistogram(lines, name, labels, histogram):
+    """
+    Append the lines of one histogram in the Prometheus text format
+
+    :param lines: the lines to append to
+    :type lines: list
+    :param name: the name of the metric
+    :type name: string
+    :param labels: the labels of the metric
+    :type labels: string
+    :param histogram: the histogram
+    :type histogram: ablauf.instrument.Histogram
+    """
+
+    cumulative = 0
+    for bound, count in zip(histogram.getBounds(), histogram.buckets):
+        cumulative += count
+        lines.append('%s_bucket{%s,le="%s"} %d' % (name, labels, "+Inf" if bound == float("inf") else repr(bound),
+                                                   cumulative))
+    lines.append("%s_sum{%s} %r" % (name, labels, histogram.sum))
+    lines.append("%s_count{%s} %d" % (name, labels, histogram.count))
@@ -0,0 +1,217 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# The Journal module
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import struct
+import time
+
+# magic, version, record size, fingerprint of the transition table
+HEADER = struct.Struct('<4sHH16s')
+MAGIC = b'ABLJ'
+VERSION = 2
+
+# timestamp, recorder id, instance id, event id, source state id, destination state id
+RECORD = struct.Struct('<dIIIII')
+
+# the recorder id of the machines of a definition, instance stores have their own, see ablauf.Definition.nextRecorderId
+MACHINES = 0
+
+
+class Journal(object):
+    """
+    An append-only file of fired transitions. Every transition is one fixed size record of timestamp, recorder id,
+    instance id, event id, source state id and destination state id. Records are collected in memory and written as a
+    group, so a transit does not wait for the file.
+
+    A journal is set on a definition and records the transitions of all its machines and instance stores. Machine ids
+    and the instance ids of every store are numbered from 0, so every record carries the id of its recorder: MACHINES
+    for the machines, the recorder id of the store for an instance store. The file starts with the fingerprint of the
+    transition table, appending to a journal of a different definition fails.
+
+    *Example:*
+
+    .. code-block:: python
+
+        journal = Journal("sessions.journal", Game.getTable())
+        Game.setJournal(journal)
+
+        ...
+
+        journal.close()
+        states = replay("sessions.journal", Game)
+
+    :param filename: the name of the file
+    :type filename: string
+    :param table: the transition table of the definition
+    :type table: ablauf.table.TransitionTable
+    :param groupsize: the number of records that are written together
+    :type groupsize: int
+    :param sync: force the records to disk after every group
+    :type sync: boolean
+    """
+
+    def __init__(self, filename, table, groupsize=1024, sync=False):
+        """
+        A journal appending to a file.
+        """
+
+        self.filename = filename
+        self.groupsize = groupsize
+        self.sync = sync
+        self.buffer = bytearray()
+        self.count = 0
+
+        fingerprint = table.getFingerprint()
+        self.file = open(filename, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, fingerprint))
+        else:
+            with open(filename, 'rb') as journalfile:
+                readHeader(journalfile, table)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # functions
+    # ------------------------------------------------------------------------------------------------------------------
+    def record(self, recorderid, instanceid, eventid, sourceid, destinationid):
+        """
+        Add a fired transition to the journal
+
+        :param recorderid: the id of the recorder, MACHINES or the recorder id of an instance store
+        :type recorderid: int
+        :param instanceid: the id of the instance
+        :type instanceid: int
+        :param eventid: the id of the event
+        :type eventid: int
+        :param sourceid: the id of the source state
+        :type sourceid: int
+        :param destinationid: the id of the destination state
+        :type destinationid: int
+        """
+
+        self.buffer += RECORD.pack(time.time(), recorderid, instanceid, eventid, sourceid, destinationid)
+        self.count += 1
+        if self.count >= self.groupsize:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the collected records to the file
+        """
+
+        if self.buffer:
+            self.file.write(self.buffer)
+            self.buffer = bytearray()
+            self.count = 0
+        self.file.flush()
+        if self.sync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        """
+        Write the collected records and close the file
+        """
+
+        self.flush()
+        self.file.close()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Reading and replay
+# ----------------------------------------------------------------------------------------------------------------------
+def readHeader(journalfile, table):
+    """
+    Read and check the header of a journal file
+
+    :param journalfile: the opened journal file
+    :type journalfile: file
+    :param table: the transition table the journal must belong to
+    :type table: ablauf.table.TransitionTable
+    """
+
+    magic, version, recordsize, fingerprint = HEADER.unpack(journalfile.read(HEADER.size))
+    if magic != MAGIC or version != VERSION or recordsize != RECORD.size:
+        raise ValueError("Not an ablauf journal: " + str(journalfile.name))
+    if fingerprint != table.getFingerprint():
+        raise ValueError("Journal " + str(journalfile.name) + " was written for a different definition")
+
+
+def readRecords(filename, table, chunksize=65536):
+    """
+    Read the records of a journal file. The file is read in chunks, so the journal can be larger than the memory.
+
+    :param filename: the name of the file
+    :type filename: string
+    :param table: the transition table the journal must belong to
+    :type table: ablauf.table.TransitionTable
+    :param chunksize: the number of records read at once
+    :type chunksize: int
+    :return: tuples of timestamp, recorder id, instance id, event id, source state id and destination state id
+    :rtype: generator of tuple
+    """
+
+    with open(filename, 'rb') as journalfile:
+        readHeader(journalfile, table)
+        while True:
+            chunk = journalfile.read(chunksize * RECORD.size)
+            if len(chunk) < RECORD.size:
+                break
+            for record in RECORD.iter_unpack(chunk[:len(chunk) - len(chunk) % RECORD.size]):
+                yield record
+
+
+def replay(filename, definition, store=None, recorderid=None):
+    """
+    Rebuild the actual states of the instances of one recorder from a journal. The events are run through the
+    transition table of the definition, no functions are called. An instance starts in the source state of its first
+    record. A guarded transition or a transition to a history state goes to the recorded destination, if it can end
+    there. The records of other recorders are skipped.
+
+    If a store is given, the states are written into it, the instance ids of the journal are the instance ids of the
+    store. Otherwise a dictionary of state id by instance id is returned.
+
+    *Example:*
+
+    .. code-block:: python
+
+        sessions = InstanceStore(Game, 1000000)
+        replay("sessions.journal", Game, sessions)
+
+        machines = replay("sessions.journal", Game)
+
+    :param filename: the name of the file
+    :type filename: string
+    :param definition: the definition the journal was written for
+    :type definition: ablauf.Definition
+    :param store: the instance store to write the states into
+    :type store: ablauf.store.InstanceStore
+    :param recorderid: the id of the recorder, the recorder id of the store if a store is given, MACHINES otherwise
+    :type recorderid: int
+    :return: the state ids by instance id, or the store
+    :rtype: dict or ablauf.store.InstanceStore
+    """
+
+    if recorderid is None:
+        recorderid = MACHINES if store is None else store.getRecorderId()
+
+    table = definition.getTable()
+    eventcount = table.eventcount
+    destinations = table.destinations
+    states = {}
+
+    for timestamp, recorder, instanceid, eventid, sourceid, destinationid in readRecords(filename, table):
+        if recorder != recorderid:
+            continue
+        stateid = states.get(instanceid, sourceid)
+        slot = stateid * eventcount + eventid
+        if destinations[slot] >= 0 or destinationid not in table.getTargets(slot):
+            destinationid = destinations[slot]
+        if destinationid < 0:
+            raise ValueError("Journal " + str(filename) + " has an invalid transition of instance " + str(instanceid))
+        states[instanceid] = destinationid
+
+    if store is None:
+        return states
+
+    for instanceid, stateid in states.items():
+        store.states[instanceid] = stateid
+    return store
@@ -0,0 +1,289 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# The Loader module
+# ----------------------------------------------------------------------------------------------------------------------
+import hashlib
+import importlib
+import json
+import os
+import pickle
+from array import array
+from fnmatch import fnmatchcase
+
+from ablauf import Guard, State, Transition
+from ablauf.codegen import checkPrivate
+from ablauf.machine import Definition
+from ablauf.table import TransitionTable
+
+CACHEVERSION = 7
+
+
+def resolve(path):
+    """
+    Return the object of a dotted import path, e.g. "examples.SinglePlayerGame.states.GameLeaveFunction"
+
+    :param path: the dotted path, or None
+    :type path: string
+    :return: the object, or None
+    """
+
+    if path is None:
+        return None
+    modulename, _, name = path.rpartition(".")
+    return getattr(importlib.import_module(modulename), name)
+
+
+def build(specification):
+    """
+    Build a frozen definition from a specification. The specification is a dictionary, as read from JSON:
+
+    .. code-block:: javascript
+
+        {
+            "name": "SinglePlayerGame",
+            "states": {
+                "Menu": {
+                    "transitions": {
+                        "ShowOptions": "Options",
+                        "StartGame": {"destination": "Game", "function": "game.callbacks.StartGame"},
+                        "Submit": [
+                            {"destination": "Approved", "guard": "amount < 1000"},
+                            {"destination": "Review"}
+                        ]
+                    }
+                },
+                "Game": {
+                    "initial": "Playing",
+                    "enter": "game.callbacks.GameEnterFunction",
+                    "leave": "game.callbacks.GameLeaveFunction",
+                    "transitions": {"ShowHighscore": "Highscore", "Timeout": "Menu"},
+                    "timeout": {"seconds": 300, "transition": "Timeout"}
+                },
+                "Playing": {
+                    "parent": "Game"
+                },
+                "GameHistory": {
+                    "parent": "Game",
+                    "history": "deep"
+                }
+            },
+            "groups": {
+                "Level*": {"Pause": "Paused"}
+            },
+            "global": {
+                "Quit": "End"
+            }
+        }
+
+    A transition is either the name of its destination state, an object with destination, function and guard, or a
+    list of such objects for a guarded transition. Functions are given by their dotted import path, guards are
+    comparisons, see ablauf.Guard. A state can have a parent and an initial child state, see ablauf.State.setParent,
+    and can be the shallow or deep history state of its parent, see ablauf.State.setHistory.
+    A state can have a timeout that fires one of its transitions, see
+    ablauf.State.setTimeout. The transitions of groups apply to the states whose names match their pattern, global
+    transitions to all states, see ablauf.Definition.addGroupTransition. The End state exists in every definition.
+
+    :param specification: the specification
+    :type specification: dict
+    :return: the frozen definition
+    :rtype: ablauf.Definition
+    """
+
+    definition = Definition(specification.get("name"))
+
+    for statename, statespecification in specification.get("states", {}).items():
+        state = State(statename, definition)
+        if statespecification.get("enter") is not None:
+            state.setEnterFunction(resolve(statespecification["enter"]))
+        if statespecification.get("leave") is not None:
+            state.setLeaveFunction(resolve(statespecification["leave"]))
+        if statespecification.get("parent") is not None:
+            state.setParent(statespecification["parent"])
+        if statespecification.get("initial") is not None:
+            state.setInitialState(statespecification["initial"])
+        if statespecification.get("history") is not None:
+            state.setHistory(statespecification["history"])
+        if statespecification.get("timeout") is not None:
+            state.setTimeout(statespecification["timeout"]["seconds"], statespecification["timeout"]["transition"])
+
+        for transitionname, transitionspecification in statespecification.get("transitions", {}).items():
+            for candidate in getCandidates(transitionspecification):
+                state.addTransition(Transition(transitionname, candidate["destination"],
+                                               resolve(candidate.get("function")), candidate.get("guard")))
+
+    for pattern, transitions in specification.get("groups", {}).items():
+        for transitionname, transitionspecification in transitions.items():
+            for candidate in getCandidates(transitionspecification):
+                definition.addGroupTransition(pattern, Transition(transitionname, candidate["destination"],
+                                                                  resolve(candidate.get("function")),
+                                                                  candidate.get("guard")))
+    for transitionname, transitionspecification in specification.get("global", {}).items():
+        for candidate in getCandidates(transitionspecification):
+            definition.addGlobalTransition(Transition(transitionname, candidate["destination"],
+                                                      resolve(candidate.get("function")), candidate.get("guard")))
+
+    definition.freeze()
+    return definition
+
+
+def getCandidates(transitionspecification):
+    """
+    Return the candidates of a transition specification as objects with destination, function and guard
+
+    :param transitionspecification: the specification of the transition
+    :type transitionspecification: string, dict or list
+    :return: the candidates
+    :rtype: list of dict
+    """
+
+    if isinstance(transitionspecification, list):
+        return transitionspecification
+    if isinstance(transitionspecification, dict):
+        return [transitionspecification]
+    return [{"destination": transitionspecification}]
+
+
+def getPaths(specification, table):
+    """
+    Return the dotted paths of the functions of a compiled specification
+
+    :param specification: the specification
+    :type specification: dict
+    :param table: the transition table built from the specification
+    :type table: ablauf.table.TransitionTable
+    :return: the paths of the enter functions and leave functions by state id, of the transition functions by slot, and
+        the guard, destination id and function path of the candidates of guarded transitions by slot
+    :rtype: tuple
+    """
+
+    states = specification.get("states", {})
+    enters = []
+    leaves = []
+    functions = [None] * len(table.destinations)
+    guards = {}
+    inherited = {}
+
+    for stateid, statename in enumerate(table.statenames):
+        statespecification = states.get(statename, {})
+        enters.append(statespecification.get("enter"))
+        leaves.append(statespecification.get("leave"))
+
+    # child states inherit the transitions of their parents, the nearest one is taken
+    for stateid in range(table.statecount):
+        for ancestorid in reversed(table.getAncestors(stateid)):
+            transitions = states.get(table.statenames[ancestorid], {}).get("transitions", {})
+            for transitionname, transitionspecification in transitions.items():
+                inherited[stateid * table.eventcount + table.eventids[transitionname]] = transitionspecification
+
+    # the transitions of groups and the global transitions are used for the events a state has no transition for
+    scopes = list(specification.get("groups", {}).items()) + [(None, specification.get("global", {}))]
+    for stateid, statename in enumerate(table.statenames):
+        if statename == "End":
+            continue
+        for pattern, transitions in scopes:
+            if pattern is None or fnmatchcase(str(statename), pattern):
+                for transitionname, transitionspecification in transitions.items():
+                    inherited.setdefault(stateid * table.eventcount + table.eventids[transitionname],
+                                         transitionspecification)
+
+    for slot, transitionspecification in inherited.items():
+        candidates = getCandidates(transitionspecification)
+        if slot in table.guards:
+            guards[slot] = [(candidate.get("guard"), table.initials[table.getStateId(candidate["destination"])],
+                             candidate.get("function")) for candidate in candidates]
+        else:
+            functions[slot] = candidates[-1].get("function")
+
+    return enters, leaves, functions, guards
+
+
+def load(source, cachedir=None):
+    """
+    Load a definition from a JSON file or a specification dictionary, see build.
+
+    If a cache directory is given, the compiled transition table is cached there in a binary file, keyed by a hash of
+    the content. On a warm start the table is read from the cache and only the functions are imported, the
+    specification is not parsed and no State and Transition objects are built. The returned definition is frozen.
+
+    Reading the cache unpickles it and imports the functions it names, so the cache directory and file must only be
+    changeable by the user, see ablauf.codegen.checkPrivate. They are created with access for the user only.
+
+    *Example:*
+
+    .. code-block:: python
+
+        SinglePlayerGame = load("singleplayergame.json", cachedir="/var/cache/game")
+
+        session = SinglePlayerGame.createMachine()
+        session.start("Menu")
+
+    :param source: the name of a JSON file, or the specification
+    :type source: string or dict
+    :param cachedir: the directory of the cache, no cache if not set
+    :type cachedir: string
+    :return: the frozen definition
+    :rtype: ablauf.Definition
+    :raises PermissionError: if the cache directory or file could be changed by others
+    """
+
+    if isinstance(source, dict):
+        specification = source
+        content = json.dumps(source, sort_keys=True).encode("utf-8")
+    else:
+        specification = None
+        with open(source, 'rb') as sourcefile:
+            content = sourcefile.read()
+
+    cachename = None
+    if cachedir is not None:
+        key = hashlib.sha256(content + str(CACHEVERSION).encode("ascii")).hexdigest()
+        cachename = os.path.join(cachedir, key + ".ablauf")
+        if os.path.exists(cachename):
+            checkPrivate(cachedir)
+            checkPrivate(cachename)
+            with open(cachename, 'rb') as cachefile:
+                cached = pickle.load(cachefile)
+            table = TransitionTable.fromArrays(
+                cached["statenames"], cached["eventnames"], array('l', cached["destinations"]),
+                [resolve(path) for path in cached["enters"]],
+                [resolve(path) for path in cached["leaves"]],
+                [resolve(path) for path in cached["functions"]],
+                cached["timeouts"],
+                dict((slot, [(None if guard is None else Guard(guard), destinationid, resolve(path))
+                             for guard, destinationid, path in candidates])
+                     for slot, candidates in cached["guards"].items()),
+                cached["parents"], cached["initials"], cached["chains"], cached["guardchains"], cached["histories"],
+                cached["resumes"])
+            return Definition(cached["name"], table)
+
+    if specification is None:
+        specification = json.loads(content.decode("utf-8"))
+    definition = build(specification)
+
+    if cachename is not None:
+        table = definition.getTable()
+        enters, leaves, functions, guards = getPaths(specification, table)
+        cached = {
+            "name": definition.getName(),
+            "statenames": table.statenames,
+            "eventnames": table.eventnames,
+            "destinations": table.destinations.tobytes(),
+            "enters": enters,
+            "leaves": leaves,
+            "functions": functions,
+            "timeouts": table.timeouts,
+            "guards": guards,
+            "parents": table.parents,
+            "initials": table.initials,
+            "chains": table.chains,
+            "guardchains": table.guardchains,
+            "histories": table.histories,
+            "resumes": table.resumes,
+        }
+        if not os.path.isdir(cachedir):
+            os.makedirs(cachedir, 0o700)
+        temporaryname = cachename + "." + str(os.getpid())
+        with os.fdopen(os.open(temporaryname, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as cachefile:
+            pickle.dump(cached, cachefile, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporaryname, cachename)
+
+    return definition
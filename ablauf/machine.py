@@ -0,0 +1,763 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# The Machine module
+# ----------------------------------------------------------------------------------------------------------------------
+import logging
+from collections import deque
+
+from ablauf import DefinitionError, State, logger, logTransit
+from ablauf.graph import GraphIndex, Validation
+from ablauf.journal import MACHINES
+from ablauf.table import TransitionTable
+
+
+class Definition(object):
+    """
+    The definition of a state machine. It holds the states and transitions and is shared by all machines created from
+    it. A definition is built once, any number of machines can run on it.
+
+    Before the first machine is created, the definition is frozen: it is checked, every transition is bound to its
+    destination state and the states are compiled. A frozen definition can not be changed anymore.
+
+    *Example:*
+
+    .. code-block:: python
+
+        from ablauf import Definition, State, Transition
+
+        Game = Definition("Game")
+
+        StartState = State("StartState", Game)
+
+        FinishFromState = Transition("FinishFromState", "End", None)
+        StartState.addTransition(FinishFromState)
+
+        session = Game.createMachine()
+        session.start("StartState", None)
+        session.transit("FinishFromState")
+
+    :param name: the name of the definition
+    :type name: string
+    """
+
+    def __init__(self, name=None, table=None):
+        """
+        A definition of a state machine. Every definition has an End state.
+
+        A definition can also be created from a compiled transition table, e.g. one loaded from a cache. Such a
+        definition is frozen and has no State objects, machines still run on it.
+
+        :param name: the name of the definition
+        :type name: string
+        :param table: the compiled transition table
+        :type table: ablauf.table.TransitionTable
+        """
+        self.name = name
+        self.states = {}
+        self.globaltransitions = {}
+        self.grouptransitions = []
+        self.table = table
+        self.frozen = table is not None
+        self.journal = None
+        self.instrumentation = None
+        self.timers = None
+        self.index = None
+        self.contexttype = None
+        self.machinecount = 0
+        self.recordercount = MACHINES
+
+        if table is None:
+            State("End", self)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # getter / setter
+    # ------------------------------------------------------------------------------------------------------------------
+    def getName(self):
+        """
+        Get the name of the definition
+
+        :return: the name of the definition
+        :rtype: string
+        """
+
+        return self.name
+
+    def getStates(self):
+        """
+        Returns the list of states
+
+        :return: list of states
+        :rtype: dict
+        """
+
+        return self.states
+
+    def getTable(self):
+        """
+        Return the compiled transition table. The definition is frozen if this was not done yet.
+
+        :return: the transition table
+        :rtype: ablauf.table.TransitionTable
+        """
+
+        if not self.frozen:
+            self.freeze()
+        return self.table
+
+    def isFrozen(self):
+        """
+        Return True if the definition is frozen
+
+        :return: frozen
+        :rtype: boolean
+        """
+
+        return self.frozen
+
+    def getIndex(self):
+        """
+        Return the index of the paths between the states. It is built once, the definition is frozen if this was not
+        done yet.
+
+        :return: the index
+        :rtype: ablauf.graph.GraphIndex
+        """
+
+        if self.index is None:
+            self.index = GraphIndex(self.getTable())
+        return self.index
+
+    def getJournal(self):
+        """
+        Return the journal that records the transitions of the machines, or None
+
+        :return: the journal
+        :rtype: ablauf.journal.Journal
+        """
+
+        return self.journal
+
+    def setJournal(self, journal):
+        """
+        Set the journal that records the transitions of all machines and instance stores of the definition. Set None
+        to stop recording.
+
+        :param journal: the journal
+        :type journal: ablauf.journal.Journal
+        """
+
+        self.journal = journal
+
+    def getInstrumentation(self):
+        """
+        Return the instrumentation that times the functions of the machines, or None
+
+        :return: the instrumentation
+        :rtype: ablauf.instrument.Instrumentation
+        """
+
+        return self.instrumentation
+
+    def setInstrumentation(self, instrumentation):
+        """
+        Set the instrumentation that times the functions of all machines and instance stores of the definition. Set
+        None to stop timing.
+
+        :param instrumentation: the instrumentation
+        :type instrumentation: ablauf.instrument.Instrumentation
+        """
+
+        self.instrumentation = instrumentation
+
+    def getTimers(self):
+        """
+        Return the timer wheel that handles the timeouts of the states, or None
+
+        :return: the timer wheel
+        :rtype: ablauf.timers.TimerWheel
+        """
+
+        return self.timers
+
+    def setTimers(self, timers):
+        """
+        Set the timer wheel that handles the timeouts of the states for all machines of the definition. Timeouts are
+        armed for machines that enter a state while the timer wheel is set. Set None to stop arming timeouts.
+
+        :param timers: the timer wheel
+        :type timers: ablauf.timers.TimerWheel
+        """
+
+        self.timers = timers
+
+    def getContextType(self):
+        """
+        Return the type of the contexts of new machines, or None
+
+        :return: the context type
+        :rtype: type
+        """
+
+        return self.contexttype
+
+    def setContextType(self, contexttype):
+        """
+        Set the type of the contexts of new machines. A machine created without a context gets a new instance of the
+        type, e.g. a compact type with __slots__ from ablauf.context.defineContext, so the data of a session lives with
+        the machine without a dict of its own. Set None to create machines without a context.
+
+        :param contexttype: the context type, or any function without parameters that returns a new context
+        :type contexttype: type
+        """
+
+        self.contexttype = contexttype
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # functions
+    # ------------------------------------------------------------------------------------------------------------------
+    def addState(self, state):
+        """
+        Add a State to the list of states
+
+        :param state: The new state that is added to the list of states
+        :type state: ablauf.State
+        """
+
+        if self.frozen:
+            raise DefinitionError("Definition " + str(self.name) + " is frozen")
+
+        self.states[state.getName()] = state
+        self.table = None
+
+    def addGlobalTransition(self, transition):
+        """
+        Add a transition to all states except End. A state uses it for an event it has no transition of its own for,
+        e.g. a global Cancel or Logout. Transitions with the same name are handled like the transitions of a state.
+
+        *Example:*
+
+        .. code-block:: python
+
+            Game.addGlobalTransition(Transition("Quit", "End", None))
+
+        :param transition: the transition to add
+        :type transition: ablauf.Transition
+        """
+
+        if self.frozen:
+            raise DefinitionError("Definition " + str(self.name) + " is frozen")
+
+        self.addScopedTransition(self.globaltransitions, transition)
+        self.table = None
+
+    def addGroupTransition(self, pattern, transition):
+        """
+        Add a transition to a group of states, the states whose names match a pattern with the wildcards * and ?. A
+        state uses it for an event it has no transition of its own for. Groups come before global transitions, and
+        groups added first come before later ones.
+
+        *Example:*
+
+        .. code-block:: python
+
+            Game.addGroupTransition("Level*", Transition("Pause", "Paused", None))
+
+        :param pattern: the pattern of the state names
+        :type pattern: string
+        :param transition: the transition to add
+        :type transition: ablauf.Transition
+        """
+
+        if self.frozen:
+            raise DefinitionError("Definition " + str(self.name) + " is frozen")
+
+        for grouppattern, transitions in self.grouptransitions:
+            if grouppattern == pattern:
+                break
+        else:
+            transitions = {}
+            self.grouptransitions.append((pattern, transitions))
+        self.addScopedTransition(transitions, transition)
+        self.table = None
+
+    @staticmethod
+    def addScopedTransition(transitions, transition):
+        """
+        Add a transition to the candidates of a group. A transition replaces the transition with the same name, unless
+        one of them has a guard, see ablauf.State.addTransition.
+
+        :param transitions: the candidates by transition name
+        :type transitions: dict
+        :param transition: the transition to add
+        :type transition: ablauf.Transition
+        """
+
+        candidates = transitions.get(transition.getName())
+        if candidates is None:
+            transitions[transition.getName()] = [transition]
+        elif len(candidates) == 1 and candidates[0].guard is None and transition.guard is None:
+            candidates[0] = transition
+        else:
+            candidates.append(transition)
+
+    def getScopes(self):
+        """
+        Return the transitions of the groups and the global transitions, in the order they are used
+
+        :return: tuples of the pattern, None for all states, and the candidates by transition name
+        :rtype: list of tuple
+        """
+
+        return self.grouptransitions + [(None, self.globaltransitions)]
+
+    def getState(self, statename):
+        """
+        Get a state from the list of states
+
+        :param statename: the name of the state
+        :type statename: string
+        :return: the state
+        :rtype: ablauf.State
+        """
+
+        return self.states[statename]
+
+    def validate(self, firststatename=None):
+        """
+        Check the states for dangling transitions, unreachable states and dead ends
+
+        :param firststatename: the name of the first state, unreachable states are only checked if given
+        :type firststatename: string
+        :return: the result
+        :rtype: ablauf.graph.Validation
+        """
+
+        return Validation(self.states, firststatename, self.getScopes())
+
+    def compile(self):
+        """
+        Compile the states into a transition table
+
+        :return: the transition table
+        :rtype: ablauf.table.TransitionTable
+        """
+
+        if not self.frozen:
+            self.table = TransitionTable(self.states, self.getScopes())
+        return self.table
+
+    def freeze(self, firststatename=None):
+        """
+        Check the states, bind every transition to its destination state, compile the states and make the definition
+        immutable. Dangling transitions raise a DefinitionError, unreachable states and dead ends are logged as
+        warning. This is done automatically when the first machine is created.
+
+        *Example:*
+
+        .. code-block:: python
+
+            Game.freeze("Menu")
+
+        :param firststatename: the name of the first state, unreachable states are only checked if given
+        :type firststatename: string
+        :return: the transition table
+        :rtype: ablauf.table.TransitionTable
+        """
+
+        if self.frozen:
+            return self.table
+
+        validation = self.validate(firststatename)
+        if not validation.isValid():
+            raise DefinitionError("; ".join(validation.getProblems()))
+        for problem in validation.getProblems():
+            logger.warning("Definition %s: %s", self.name, problem)
+
+        for state in self.states.values():
+            for transition in state.getAllTransitions():
+                transition.destination = self.states[transition.getDestinationName()]
+        for pattern, transitions in self.getScopes():
+            for candidates in transitions.values():
+                for transition in candidates:
+                    transition.destination = self.states[transition.getDestinationName()]
+
+        self.table = TransitionTable(self.states, self.getScopes())
+
+        for state in self.states.values():
+            state.frozen = True
+        self.frozen = True
+        return self.table
+
+    def createMachine(self, context=None):
+        """
+        Create a new machine that runs on this definition
+
+        :param context: the context of the machine, a new context of the context type if not set
+        :return: the new machine
+        :rtype: ablauf.Machine
+        """
+
+        return Machine(self, context)
+
+    def nextMachineId(self):
+        """
+        Return a new machine id. Machine ids are numbered from 0 per definition.
+
+        :return: the machine id
+        :rtype: int
+        """
+
+        machineid = self.machinecount
+        self.machinecount += 1
+        return machineid
+
+    def nextRecorderId(self):
+        """
+        Return a new recorder id for an instance store. The journal and the instrumentation tell the instances of the
+        stores and the machines apart by it, the machines have the recorder id MACHINES. Recorder ids are numbered from
+        1 per definition, so stores that are created in the same order get the same ids.
+
+        :return: the recorder id
+        :rtype: int
+        """
+
+        self.recordercount += 1
+        return self.recordercount
+
+
+class Machine(object):
+    """
+    A running instance of a definition. A machine only holds its actual state and its context, the states and
+    transitions are shared with all other machines of the same definition. The machine runs on the compiled transition
+    table of its definition, events can be given by their name or by their id. If the definition has history states,
+    the machine also holds the state ids its parents were left in, one per parent.
+
+    Events can also be posted to the event queue of the machine and processed later. Processing runs every event to
+    completion before the next one is taken, so a callback that posts an event does not start a nested transit.
+
+    *Example:*
+
+    .. code-block:: python
+
+        session = Machine(Game)
+        session.start("StartState", None)
+        session.transit("FinishFromState")
+
+        session.post("ShowOptions")
+        session.post("BackToMenu")
+        session.process()
+
+    :param definition: the definition the machine runs on
+    :type definition: ablauf.Definition
+    :param context: the context of the machine, a new context of the context type of the definition if not set
+    :param id: the id of the machine, a new id of the definition if not set
+    :type id: int
+    """
+
+    __slots__ = ('definition', 'table', 'id', 'stateid', 'context', 'queue', 'processing', 'history')
+
+    def __init__(self, definition, context=None, id=None):
+        """
+        A machine running on a definition.
+        """
+
+        self.definition = definition
+        self.table = definition.getTable()
+        self.id = definition.nextMachineId() if id is None else id
+        self.stateid = TransitionTable.NONE
+        if context is None and definition.contexttype is not None:
+            context = definition.contexttype()
+        self.context = context
+        self.queue = None
+        self.processing = False
+        self.history = self.table.createHistory()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # getter / setter
+    # ------------------------------------------------------------------------------------------------------------------
+    def getDefinition(self):
+        """
+        Return the definition of the machine
+
+        :return: the definition
+        :rtype: ablauf.Definition
+        """
+
+        return self.definition
+
+    def getActualState(self):
+        """
+        Return the actual state of the machine
+
+        :return: actual state
+        :rtype: ablauf.State
+        """
+
+        if self.stateid < 0:
+            return None
+        return self.table.states[self.stateid]
+
+    def getActualStateName(self):
+        """
+        Return the name of the actual state of the machine
+
+        :return: name of the actual state, None if the machine is not started
+        :rtype: string
+        """
+
+        if self.stateid < 0:
+            return None
+        return self.table.statenames[self.stateid]
+
+    def setActualState(self, state):
+        """
+        Set the actual state to a given state
+
+        :param state: the new state
+        :type state: ablauf.State
+        """
+
+        self.stateid = self.table.getStateId(state.getName())
+
+    def getId(self):
+        """
+        Return the id of the machine
+
+        :return: the id
+        :rtype: int
+        """
+
+        return self.id
+
+    def getActualStateId(self):
+        """
+        Return the id of the actual state of the machine
+
+        :return: id of the actual state
+        :rtype: int
+        """
+
+        return self.stateid
+
+    def getContext(self):
+        """
+        Return the context of the machine
+
+        :return: the context
+        """
+
+        return self.context
+
+    def setContext(self, context):
+        """
+        Set the context of the machine
+
+        :param context: the new context
+        """
+
+        self.context = context
+
+    def getPendingCount(self):
+        """
+        Return the number of events waiting in the event queue
+
+        :return: number of events
+        :rtype: int
+        """
+
+        if self.queue is None:
+            return 0
+        return len(self.queue)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # functions
+    # ------------------------------------------------------------------------------------------------------------------
+    def start(self, firststatename, initfunction=None, payload=None):
+        """
+        Start the machine in the first state. The init function is called before the first state is entered. If the
+        first state has child states, its parents and the state are entered and the machine starts in its initial
+        state.
+
+        :param firststatename: the name of the first state
+        :type firststatename: string
+        :param initfunction: the function that is called before the first state is entered
+        :type initfunction: function
+        :param payload: the payload the enter functions are called with
+        """
+
+        table = self.table
+        destinationid, entry = table.getFirstState(firststatename)
+
+        logger.debug("Start machine in state: %s", firststatename)
+        if initfunction is not None:
+            initfunction()
+        if entry is not None:
+            entry(self.context, payload)
+
+        instrumentation = self.definition.instrumentation
+        if instrumentation is not None:
+            instrumentation.start(MACHINES, self.id, destinationid, self.context, payload)
+        else:
+            enter = table.enters[destinationid]
+            if enter is not None:
+                enter(self.context, payload)
+        self.stateid = destinationid
+
+        timers = self.definition.timers
+        if timers is not None:
+            timers.enter(self, table.timeouts[destinationid])
+
+    def transit(self, transitionname, payload=None):
+        """
+        Do a transition to given state. The guards of a guarded transition are evaluated for the context of the
+        machine, if no guard holds or the machine is not started a KeyError is raised. The leave, transition and enter
+        functions are called with the context of the machine and the payload.
+
+        *Example:*
+
+        .. code-block:: python
+
+            def StartGame(context, payload):
+                context.level = payload["level"]
+
+            session.transit("StartGame", {"level": 3})
+
+        :param transitionname: the name or the id of the transition
+        :type transitionname: string or int
+        :param payload: the payload of the event
+        """
+
+        table = self.table
+        stateid = self.stateid
+        if stateid < 0:
+            raise KeyError(transitionname)
+        eventid = table.eventids[transitionname]
+        slot = stateid * table.eventcount + eventid
+        destinationid = table.destinations[slot]
+        if destinationid < 0:
+            if destinationid == table.GUARDED:
+                candidate = table.choose(slot, self.context)
+            elif destinationid == table.HISTORY:
+                candidate = table.resume(slot, self.history)
+            else:
+                candidate = None
+            if candidate is None:
+                raise KeyError(transitionname)
+            destinationid, function = candidate
+        else:
+            function = table.functions[slot]
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logTransit(table.statenames[stateid], table.statenames[destinationid], transitionname)
+
+        instrumentation = self.definition.instrumentation
+        if instrumentation is not None:
+            instrumentation.transit(MACHINES, self.id, stateid, slot, destinationid, function, self.context, payload)
+        else:
+            context = self.context
+            leave = table.leaves[stateid]
+            if leave is not None:
+                leave(context, payload)
+
+            if function is not None:
+                function(context, payload)
+
+            enter = table.enters[destinationid]
+            if enter is not None:
+                enter(context, payload)
+
+        self.stateid = destinationid
+        if self.history is not None:
+            table.remember(self.history, slot, destinationid)
+
+        timers = self.definition.timers
+        if timers is not None and not table.keeps[slot]:
+            timers.enter(self, table.timeouts[destinationid])
+
+        journal = self.definition.journal
+        if journal is not None:
+            journal.record(MACHINES, self.id, eventid, stateid, destinationid)
+
+    def timeout(self, ownerid, eventid):
+        """
+        Do the timeout transition of a state, if the machine is still in the state or one of its child states that
+        inherit its timeout. Called by the timer wheel.
+
+        :param ownerid: the id of the state whose timeout is due
+        :type ownerid: int
+        :param eventid: the id of the timeout transition
+        :type eventid: int
+        :return: True if the transition was done
+        :rtype: boolean
+        """
+
+        if not self.table.isTimedBy(self.stateid, ownerid):
+            return False
+        self.transit(eventid)
+        return True
+
+    def transitTo(self, statename):
+        """
+        Do the transitions of the shortest path from the actual state to the given state, e.g. to fast forward a
+        machine in a test. If a guard leads elsewhere, the path is continued from there. A parent state is reached
+        with any of its child states.
+
+        :param statename: the name of the target state
+        :type statename: string
+        :return: the names of the done transitions
+        :rtype: list
+        """
+
+        table = self.table
+        index = self.definition.getIndex()
+        targetid = table.getStateId(statename)
+        events = []
+
+        while not index.isInside(self.stateid, targetid):
+            eventid = index.getNextEvent(self.stateid, targetid)
+            if eventid < 0 or len(events) > table.statecount:
+                raise KeyError(statename)
+            self.transit(eventid)
+            events.append(table.eventnames[eventid])
+        return events
+
+    def post(self, event, payload=None):
+        """
+        Add an event to the event queue. The event is handled by the next call of process.
+
+        :param event: the name or the id of the transition
+        :type event: string or int
+        :param payload: the payload of the event
+        """
+
+        queue = self.queue
+        if queue is None:
+            queue = self.queue = deque()
+        queue.append((event, payload))
+
+    def process(self, maxevents=None):
+        """
+        Handle the events of the event queue in the order they were posted. Each event is run to completion before the
+        next one is taken. Events posted by callbacks are handled in the same call. If called while the queue is
+        already being processed, e.g. from a callback, nothing is done, the running call handles the events.
+
+        If a transit fails, the exception is raised and the remaining events stay in the queue.
+
+        :param maxevents: the maximum number of events to handle, all events if not set
+        :type maxevents: int
+        :return: the number of handled events
+        :rtype: int
+        """
+
+        queue = self.queue
+        if not queue or self.processing:
+            return 0
+
+        count = 0
+        self.processing = True
+        try:
+            while queue and (maxevents is None or count < maxevents):
+                self.transit(*queue.popleft())
+                count += 1
+        finally:
+            self.processing = False
+        return count
@@ -0,0 +1,332 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# The Parallel module
+# ----------------------------------------------------------------------------------------------------------------------
+import logging
+
+from ablauf import logger, logTransit
+
+
+class ParallelDefinition(object):
+    """
+    The definition of a machine with parallel regions. Every region is a definition of its own, e.g. the connection,
+    the authentication and the workflow of a session, and a machine is in one state of every region at the same time.
+    The regions are not multiplied into one flat definition, a region with 4 states and one with 5 states stay 9
+    states instead of 20.
+
+    An event is dispatched to all regions that have a transition with its name. Which regions these are is computed
+    once for every event, so a region that does not know an event costs nothing when the event is handled.
+
+    *Example:*
+
+    .. code-block:: python
+
+        Session = ParallelDefinition("Session", [Connection, Authentication, Workflow])
+
+        session = Session.createMachine()
+        session.start(["Offline", "Anonymous", "Menu"])
+        session.transit("Connect")
+        print(session.getActualStateNames())
+
+    :param name: the name of the definition
+    :type name: string
+    :param regions: the definitions of the regions
+    :type regions: list of ablauf.Definition
+    """
+
+    def __init__(self, name, regions):
+        """
+        A definition of a machine with parallel regions. The definitions of the regions are frozen.
+        """
+
+        self.name = name
+        self.regions = list(regions)
+        self.tables = tuple(region.getTable() for region in self.regions)
+        self.machinecount = 0
+
+        self.eventnames = []
+        for table in self.tables:
+            for eventname in table.eventnames:
+                if eventname not in self.eventnames:
+                    self.eventnames.append(eventname)
+
+        # events can be looked up by name or by id
+        self.eventids = {}
+        for eventid, eventname in enumerate(self.eventnames):
+            self.eventids[eventname] = eventid
+            self.eventids[eventid] = eventid
+
+        # the index and the event id of every region that knows an event, by event id
+        self.dispatch = [tuple((regionindex, table.eventids[eventname])
+                               for regionindex, table in enumerate(self.tables) if eventname in table.eventids)
+                         for eventname in self.eventnames]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # getter / setter
+    # ------------------------------------------------------------------------------------------------------------------
+    def getName(self):
+        """
+        Get the name of the definition
+
+        :return: the name of the definition
+        :rtype: string
+        """
+
+        return self.name
+
+    def getRegions(self):
+        """
+        Return the definitions of the regions
+
+        :return: the definitions
+        :rtype: list of ablauf.Definition
+        """
+
+        return self.regions
+
+    def getRegionNames(self, eventname):
+        """
+        Return the names of the regions an event is dispatched to
+
+        :param eventname: the name of the event
+        :type eventname: string
+        :return: the names of the definitions of the regions
+        :rtype: list of string
+        """
+
+        return [self.regions[regionindex].getName() for regionindex, _ in self.dispatch[self.eventids[eventname]]]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # functions
+    # ------------------------------------------------------------------------------------------------------------------
+    def createMachine(self, context=None):
+        """
+        Create a new machine that runs on this definition
+
+        :param context: the context of the machine
+        :return: the new machine
+        :rtype: ablauf.parallel.ParallelMachine
+        """
+
+        return ParallelMachine(self, context)
+
+    def nextMachineId(self):
+        """
+        Return a new machine id. Machine ids are numbered from 0 per definition.
+
+        :return: the machine id
+        :rtype: int
+        """
+
+        machineid = self.machinecount
+        self.machinecount += 1
+        return machineid
+
+
+class ParallelMachine(object):
+    """
+    A running instance of a definition with parallel regions. The machine holds its configuration, a tuple with the
+    actual state id of every region, and its context.
+
+    A transit does the transition of the event in every region it is dispatched to, in the order of the regions. A
+    region whose actual state has no transition for the event stays in its state. If no region does a transition, a
+    KeyError is raised and the configuration is not changed. The guards of all regions are evaluated for the context
+    of the machine.
+
+    Every region keeps its own history for its history states. The journal, the instrumentation and the timers of the
+    region definitions are not used.
+
+    :param definition: the definition the machine runs on
+    :type definition: ablauf.parallel.ParallelDefinition
+    :param context: the context of the machine
+    :param id: the id of the machine, a new id of the definition if not set
+    :type id: int
+    """
+
+    __slots__ = ('definition', 'tables', 'id', 'stateids', 'context', 'histories')
+
+    def __init__(self, definition, context=None, id=None):
+        """
+        A machine running on a definition with parallel regions.
+        """
+
+        self.definition = definition
+        self.tables = definition.tables
+        self.id = definition.nextMachineId() if id is None else id
+        self.stateids = None
+        self.context = context
+        self.histories = tuple(table.createHistory() for table in self.tables)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # getter / setter
+    # ------------------------------------------------------------------------------------------------------------------
+    def getDefinition(self):
+        """
+        Return the definition of the machine
+
+        :return: the definition
+        :rtype: ablauf.parallel.ParallelDefinition
+        """
+
+        return self.definition
+
+    def getId(self):
+        """
+        Return the id of the machine
+
+        :return: the id
+        :rtype: int
+        """
+
+        return self.id
+
+    def getConfiguration(self):
+        """
+        Return the ids of the actual states of the regions
+
+        :return: the state ids, None if the machine is not started
+        :rtype: tuple of int
+        """
+
+        return self.stateids
+
+    def getActualStateNames(self):
+        """
+        Return the names of the actual states of the regions
+
+        :return: the names of the states, None if the machine is not started
+        :rtype: tuple of string
+        """
+
+        if self.stateids is None:
+            return None
+        return tuple(table.statenames[stateid] for table, stateid in zip(self.tables, self.stateids))
+
+    def isIn(self, statename):
+        """
+        Return True if the actual state of any region has the given name, or is a child state of it
+
+        :param statename: the name of the state
+        :type statename: string
+        :return: in the state
+        :rtype: boolean
+        """
+
+        if self.stateids is None:
+            return False
+        for table, stateid in zip(self.tables, self.stateids):
+            if statename in table.stateids and table.stateids[statename] in table.getAncestors(stateid):
+                return True
+        return False
+
+    def getContext(self):
+        """
+        Return the context of the machine
+
+        :return: the context
+        """
+
+        return self.context
+
+    def setContext(self, context):
+        """
+        Set the context of the machine
+
+        :param context: the new context
+        """
+
+        self.context = context
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # functions
+    # ------------------------------------------------------------------------------------------------------------------
+    def start(self, firststatenames, initfunction=None, payload=None):
+        """
+        Start the machine in the first state of every region. The init function is called before the first states are
+        entered.
+
+        :param firststatenames: the names of the first states, one per region
+        :type firststatenames: list of string
+        :param initfunction: the function that is called before the first states are entered
+        :type initfunction: function
+        :param payload: the payload the enter functions are called with
+        """
+
+        if len(firststatenames) != len(self.tables):
+            raise ValueError("Expected " + str(len(self.tables)) + " first states, got " + str(len(firststatenames)))
+
+        logger.debug("Start machine in states: %s", ", ".join(str(name) for name in firststatenames))
+        if initfunction is not None:
+            initfunction()
+
+        stateids = []
+        for table, firststatename in zip(self.tables, firststatenames):
+            destinationid, entry = table.getFirstState(firststatename)
+            if entry is not None:
+                entry(self.context, payload)
+            enter = table.enters[destinationid]
+            if enter is not None:
+                enter(self.context, payload)
+            stateids.append(destinationid)
+        self.stateids = tuple(stateids)
+
+    def transit(self, transitionname, payload=None):
+        """
+        Do the transition of an event in every region it is dispatched to
+
+        :param transitionname: the name or the id of the event
+        :type transitionname: string or int
+        :param payload: the payload of the event, the functions of all regions get it
+        :return: the number of regions that did a transition
+        :rtype: int
+        """
+
+        tables = self.tables
+        stateids = self.stateids
+        histories = self.histories
+        if stateids is None:
+            raise KeyError(transitionname)
+        following = None
+        count = 0
+        for regionindex, eventid in self.definition.dispatch[self.definition.eventids[transitionname]]:
+            table = tables[regionindex]
+            stateid = stateids[regionindex]
+            slot = stateid * table.eventcount + eventid
+            destinationid = table.destinations[slot]
+            if destinationid < 0:
+                if destinationid == table.GUARDED:
+                    candidate = table.choose(slot, self.context)
+                elif destinationid == table.HISTORY:
+                    candidate = table.resume(slot, histories[regionindex])
+                else:
+                    candidate = None
+                if candidate is None:
+                    continue
+                destinationid, function = candidate
+            else:
+                function = table.functions[slot]
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logTransit(table.statenames[stateid], table.statenames[destinationid], transitionname)
+
+            leave = table.leaves[stateid]
+            if leave is not None:
+                leave(self.context, payload)
+
+            if function is not None:
+                function(self.context, payload)
+
+            enter = table.enters[destinationid]
+            if enter is not None:
+                enter(self.context, payload)
+
+            if following is None:
+                following = list(stateids)
+            following[regionindex] = destinationid
+            if histories[regionindex] is not None:
+                table.remember(histories[regionindex], slot, destinationid)
+            count += 1
+
+        if following is None:
+            raise KeyError(transitionname)
+        self.stateids = tuple(following)
+        return count
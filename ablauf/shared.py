@@ -0,0 +1,304 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# The Shared module
+# ----------------------------------------------------------------------------------------------------------------------
+import multiprocessing
+import struct
+from itertools import repeat
+from multiprocessing import resource_tracker, shared_memory
+
+from ablauf.journal import MACHINES
+from ablauf.store import InstanceStore
+
+# magic, version, item size, fingerprint of the transition table, number of instances, recorder id
+HEADER = struct.Struct('<4sHH16sQI')
+MAGIC = b'ABLM'
+VERSION = 2
+
+
+def createLocks(stripes=64):
+    """
+    Create the locks of a shared instance store. They are created once, before the worker processes are started, and
+    passed to every worker.
+
+    :param stripes: the number of locks, instances are spread over them by instance id
+    :type stripes: int
+    :return: the locks
+    :rtype: list of multiprocessing.Lock
+    """
+
+    return [multiprocessing.Lock() for _ in range(stripes)]
+
+
+class SharedInstanceStore(InstanceStore):
+    """
+    An instance store whose state ids are kept in shared memory, so several worker processes can transit the same
+    instances, e.g. when any worker may get the next event of a session. Every worker builds the same definition, the
+    shared memory only holds the header and the state ids. The fingerprint of the transition table in the header is
+    checked when a worker attaches, so all workers run on the same compiled definition.
+
+    Instances are spread over striped locks by instance id, a transit of an instance holds the lock of its stripe from
+    reading the actual state until the new state is written, including the functions. So the transits of one instance
+    are done one after the other, transits of instances of different stripes run in parallel. A function must not
+    transit another instance of the store, it could be in the same stripe. The locks can not be found by name, they are
+    created with createLocks by the process that starts the workers and given to every worker.
+
+    Transits with numpy arrays are done one by one as well, every instance needs its lock. Timer wheels are per process,
+    a worker only arms the timeouts of the instances it transits. The history of history states is not shared,
+    transitions to history states fail. The recorder id of the store is kept in the shared memory, so all workers
+    journal the instances under the same recorder id.
+
+    *Example:*
+
+    .. code-block:: python
+
+        locks = createLocks()
+        sessions = SharedInstanceStore(Game, 1000000, locks, statename="Menu")
+
+        def work(name, locks):
+            sessions = SharedInstanceStore(Game, 0, locks, name=name, create=False)
+            sessions.step([17], ["StartGame"])
+            sessions.close()
+
+        worker = multiprocessing.Process(target=work, args=(sessions.getName(), locks))
+
+    :param definition: the definition the instances run on
+    :type definition: ablauf.Definition
+    :param size: the number of instances, taken from the shared memory when attaching
+    :type size: int
+    :param locks: the striped locks, see createLocks
+    :type locks: list of multiprocessing.Lock
+    :param name: the name of the shared memory, a new name if not set
+    :type name: string
+    :param create: create the shared memory, otherwise attach to an existing one
+    :type create: boolean
+    :param statename: the name of the state all instances are in when created, if not set they are not started
+    :type statename: string
+    :param recorderid: the recorder id of the store when created, a new one of the definition if not set
+    :type recorderid: int
+    """
+
+    def __init__(self, definition, size, locks, name=None, create=True, statename=None, recorderid=None):
+        """
+        A store of instances in shared memory.
+        """
+
+        # an attaching store takes the recorder id from the shared memory
+        InstanceStore.__init__(self, definition, 0, recorderid=recorderid if create else MACHINES)
+        self.locks = list(locks)
+        self.stripes = len(self.locks)
+        itemsize = 2 if self.typecode == 'H' else 4
+
+        if create:
+            self.memory = shared_memory.SharedMemory(name, create=True, size=HEADER.size + size * itemsize)
+            HEADER.pack_into(self.memory.buf, 0, MAGIC, VERSION, itemsize, self.table.getFingerprint(), size,
+                             self.recorderid)
+            fill = b'\xff' * itemsize if statename is None else \
+                struct.pack(self.typecode, self.table.getFirstState(statename)[0])
+            self.memory.buf[HEADER.size:HEADER.size + size * itemsize] = fill * size
+        else:
+            # the creating process unlinks the memory, not the ones that attach. Before Python 3.13 attaching registers
+            # the memory with the resource tracker of the process, which unlinks it when the process exits, so it is
+            # unregistered again.
+            try:
+                self.memory = shared_memory.SharedMemory(name, track=False)
+            except TypeError:
+                self.memory = shared_memory.SharedMemory(name)
+                resource_tracker.unregister(self.memory._name, "shared_memory")
+            magic, version, itemsize, fingerprint, size, self.recorderid = HEADER.unpack_from(self.memory.buf, 0)
+            if magic != MAGIC or version != VERSION:
+                self.memory.close()
+                raise ValueError("Not an ablauf instance store: " + str(name))
+            if fingerprint != self.table.getFingerprint():
+                self.memory.close()
+                raise ValueError("Instance store " + str(name) + " was created for a different definition")
+
+        self.setStates(self.memory.buf[HEADER.size:HEADER.size + size * itemsize].cast('H' if itemsize == 2 else 'I'))
+        self.history = None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # getter / setter
+    # ------------------------------------------------------------------------------------------------------------------
+    def getName(self):
+        """
+        Return the name of the shared memory, workers attach to it by name
+
+        :return: the name
+        :rtype: string
+        """
+
+        return self.memory.name
+
+    def getLocks(self):
+        """
+        Return the striped locks
+
+        :return: the locks
+        :rtype: list of multiprocessing.Lock
+        """
+
+        return self.locks
+
+    def getLock(self, instanceid):
+        """
+        Return the lock of the stripe of an instance
+
+        :param instanceid: the id of the instance
+        :type instanceid: int
+        :return: the lock
+        :rtype: multiprocessing.Lock
+        """
+
+        return self.locks[instanceid % self.stripes]
+
+    def setStateId(self, instanceid, stateid):
+        """
+        Set the actual state of an instance without calling any function
+
+        :param instanceid: the id of the instance
+        :type instanceid: int
+        :param stateid: the id of the new state
+        :type stateid: int
+        """
+
+        with self.locks[instanceid % self.stripes]:
+            self.states[instanceid] = stateid
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # functions
+    # ------------------------------------------------------------------------------------------------------------------
+    def start(self, instanceids, firststatename, payload=None):
+        """
+        Start instances in the first state. The enter function of the state is called once for every instance.
+
+        :param instanceids: the ids of the instances
+        :type instanceids: iterable of int
+        :param firststatename: the name of the first state
+        :type firststatename: string
+        :param payload: the payload the enter functions are called with
+        """
+
+        table = self.table
+        states = self.states
+        locks = self.locks
+        stripes = self.stripes
+        destinationid, entry = table.getFirstState(firststatename)
+        enter = table.enters[destinationid]
+        timers = self.timers
+        timeout = table.timeouts[destinationid]
+
+        for instanceid in instanceids:
+            with locks[instanceid % stripes]:
+                if entry is not None:
+                    entry(instanceid, payload)
+                if enter is not None:
+                    enter(instanceid, payload)
+                states[instanceid] = destinationid
+            if timers is not None:
+                timers.enter(instanceid, timeout)
+
+    def stepIds(self, instanceids, eventids, payload=None, ownerids=None):
+        """
+        Do one transition for each of many instances, the events are given by their id. Every instance is transited
+        while the lock of its stripe is held.
+
+        :param instanceids: the ids of the instances
+        :type instanceids: iterable of int
+        :param eventids: the ids of the transitions
+        :type eventids: iterable of int
+        :param payload: the payload of the events, the same for all instances
+        :param ownerids: the ids of the states whose timeout the instances must have, for timeouts, any state if not
+            set
+        :type ownerids: iterable of int
+        :return: the ids of the instances that could not do the transition
+        :rtype: list
+        """
+
+        table = self.table
+        states = self.states
+        locks = self.locks
+        stripes = self.stripes
+        none = self.none
+        eventcount = table.eventcount
+        destinations = table.destinations
+        callbackslots = self.callbackslots
+        timeouts = table.timeouts
+        keeps = table.keeps
+        timers = self.timers
+        journal = self.definition.journal
+        recorderid = self.recorderid
+        instrumentation = self.definition.instrumentation
+        failed = []
+
+        for instanceid, eventid, ownerid in zip(instanceids, eventids, repeat(None) if ownerids is None else ownerids):
+            with locks[instanceid % stripes]:
+                stateid = states[instanceid]
+                if ownerid is not None and (stateid == none or not table.isTimedBy(stateid, ownerid)):
+                    continue
+                if stateid == none:
+                    failed.append(instanceid)
+                    continue
+
+                slot = stateid * eventcount + eventid
+                destinationid = destinations[slot]
+                if destinationid < 0:
+                    failed.append(instanceid)
+                    continue
+
+                if instrumentation is not None:
+                    instrumentation.transit(recorderid, instanceid, stateid, slot, destinationid, None, instanceid,
+                                            payload)
+                elif callbackslots[slot]:
+                    self.call(stateid, slot, destinationid, None, instanceid, payload)
+                states[instanceid] = destinationid
+
+            if timers is not None and not keeps[slot]:
+                timers.enter(instanceid, timeouts[destinationid])
+            if journal is not None:
+                journal.record(recorderid, instanceid, eventid, stateid, destinationid)
+
+        return failed
+
+    def stepVectorized(self, instanceids, eventids, payload=None):
+        """
+        Do one transition for each of many instances given as numpy arrays. Every instance needs its lock, so they
+        are transited one by one.
+
+        :param instanceids: the ids of the instances
+        :type instanceids: numpy array of int
+        :param eventids: the ids of the transitions
+        :type eventids: numpy array of int
+        :param payload: the payload of the events, the same for all instances
+        :return: the ids of the instances that could not do the transition
+        :rtype: list
+        """
+
+        return self.stepIds(instanceids.tolist(), eventids.tolist(), payload)
+
+    def fire(self, due):
+        """
+        Do the due timeouts of the instances in one batch. Instances that left the state owning the timeout in the
+        meantime, also in another process, are skipped.
+
+        :param due: the instance ids and the owning state ids and event ids of the due timeouts
+        :type due: list of tuple
+        :return: the ids of the instances that could not do the transition
+        :rtype: list
+        """
+
+        return self.stepIds([instanceid for instanceid, _ in due], [timeout[1] for _, timeout in due],
+                            ownerids=[timeout[0] for _, timeout in due])
+
+    def close(self):
+        """
+        Detach from the shared memory. The store can not be used anymore.
+        """
+
+        self.states.release()
+        self.memory.close()
+
+    def unlink(self):
+        """
+        Free the shared memory, done once by the process that created it after all workers closed their stores
+        """
+
+        self.memory.unlink()
@@ -0,0 +1,245 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# The Snapshot module
+# ----------------------------------------------------------------------------------------------------------------------
+import mmap
+import struct
+from array import array
+
+from ablauf.machine import Machine
+from ablauf.store import InstanceStore
+from ablauf.table import TransitionTable
+
+# magic, version, item size, fingerprint of the transition table, number of records
+HEADER = struct.Struct('<4sHH16sQ')
+MAGIC = b'ABLS'
+VERSION = 2
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Snapshot files
+# ----------------------------------------------------------------------------------------------------------------------
+def writeSnapshot(filename, table, stateids, history=None):
+    """
+    Write a snapshot file. The file has a fixed size header with the fingerprint of the transition table followed by
+    one fixed width record per instance, holding the id of its actual state. If the definition has history states,
+    the records are followed by the history of the instances, historycount state ids per instance of the same width.
+
+    :param filename: the name of the file
+    :type filename: string
+    :param table: the transition table the state ids belong to
+    :type table: ablauf.table.TransitionTable
+    :param stateids: the state ids of the instances
+    :type stateids: array.array
+    :param history: the history of the instances, not set if none was kept yet
+    :type history: array.array
+    """
+
+    with open(filename, 'wb') as snapshotfile:
+        snapshotfile.write(HEADER.pack(MAGIC, VERSION, stateids.itemsize, table.getFingerprint(), len(stateids)))
+        snapshotfile.write(memoryview(stateids).cast('B'))
+        if table.historycount:
+            if history is None:
+                none = 0xFFFF if stateids.itemsize == 2 else 0xFFFFFFFF
+                history = array(stateids.typecode, [none]) * (len(stateids) * table.historycount)
+            snapshotfile.write(memoryview(history).cast('B'))
+
+
+def readHeader(snapshotfile, table):
+    """
+    Read and check the header of a snapshot file
+
+    :param snapshotfile: the opened snapshot file
+    :type snapshotfile: file
+    :param table: the transition table the snapshot must belong to
+    :type table: ablauf.table.TransitionTable
+    :return: the item size and the number of records
+    :rtype: tuple
+    """
+
+    magic, version, itemsize, fingerprint, count = HEADER.unpack(snapshotfile.read(HEADER.size))
+    # snapshots of the first version have no history, they are the same for definitions without history states
+    if magic != MAGIC or not (version == VERSION or version == 1 and not table.historycount):
+        raise ValueError("Not an ablauf snapshot: " + str(snapshotfile.name))
+    if fingerprint != table.getFingerprint():
+        raise ValueError("Snapshot " + str(snapshotfile.name) + " was written for a different definition")
+    return itemsize, count
+
+
+def readSnapshot(filename, table):
+    """
+    Read the state ids of a snapshot file into an array
+
+    :param filename: the name of the file
+    :type filename: string
+    :param table: the transition table the snapshot must belong to
+    :type table: ablauf.table.TransitionTable
+    :return: the state ids of the instances
+    :rtype: array.array
+    """
+
+    with open(filename, 'rb') as snapshotfile:
+        itemsize, count = readHeader(snapshotfile, table)
+        stateids = array('H' if itemsize == 2 else 'I')
+        stateids.fromfile(snapshotfile, count)
+    return stateids
+
+
+def readHistory(filename, table):
+    """
+    Read the history of a snapshot file into an array
+
+    :param filename: the name of the file
+    :type filename: string
+    :param table: the transition table the snapshot must belong to
+    :type table: ablauf.table.TransitionTable
+    :return: the history of the instances, historycount state ids per instance, or None if the definition has no
+        history states
+    :rtype: array.array
+    """
+
+    if not table.historycount:
+        return None
+    with open(filename, 'rb') as snapshotfile:
+        itemsize, count = readHeader(snapshotfile, table)
+        snapshotfile.seek(HEADER.size + count * itemsize)
+        history = array('H' if itemsize == 2 else 'I')
+        history.fromfile(snapshotfile, count * table.historycount)
+    return history
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Machines
+# ----------------------------------------------------------------------------------------------------------------------
+def snapshotMachines(filename, machines, definition=None):
+    """
+    Write the actual states and the history of machines to a snapshot file. All machines must run on the same
+    definition. Without machines a snapshot without records is written, which needs the definition.
+
+    *Example:*
+
+    .. code-block:: python
+
+        snapshotMachines("sessions.snapshot", sessions)
+
+        sessions = restoreMachines("sessions.snapshot", Game)
+
+    :param filename: the name of the file
+    :type filename: string
+    :param machines: the machines
+    :type machines: list of ablauf.Machine
+    :param definition: the definition the machines run on, the one of the first machine if not set
+    :type definition: ablauf.Definition
+    """
+
+    if definition is not None:
+        table = definition.getTable()
+    elif machines:
+        table = machines[0].table
+    else:
+        raise ValueError("A snapshot without machines needs the definition")
+
+    typecode, none = ('H', 0xFFFF) if table.statecount < 0xFFFF else ('I', 0xFFFFFFFF)
+    stateids = array(typecode, [none if machine.stateid < 0 else machine.stateid for machine in machines])
+    history = None
+    if table.historycount:
+        history = array(typecode, [none if stateid < 0 else stateid
+                                   for machine in machines for stateid in machine.history])
+    writeSnapshot(filename, table, stateids, history)
+
+
+def restoreMachines(filename, definition, contexts=None):
+    """
+    Create machines in the states and with the history of a snapshot file. No enter functions are called.
+
+    :param filename: the name of the file
+    :type filename: string
+    :param definition: the definition the machines run on
+    :type definition: ablauf.Definition
+    :param contexts: the contexts of the machines, in the order of the snapshot
+    :type contexts: list
+    :return: the machines
+    :rtype: list of ablauf.Machine
+    """
+
+    table = definition.getTable()
+    stateids = readSnapshot(filename, table)
+    history = readHistory(filename, table)
+    none = 0xFFFF if stateids.itemsize == 2 else 0xFFFFFFFF
+    historycount = table.historycount
+
+    machines = []
+    for index, stateid in enumerate(stateids):
+        machine = Machine(definition, None if contexts is None else contexts[index])
+        machine.stateid = TransitionTable.NONE if stateid == none else stateid
+        if history is not None:
+            for entry, stateid in enumerate(history[index * historycount:(index + 1) * historycount]):
+                machine.history[entry] = TransitionTable.NONE if stateid == none else stateid
+        machines.append(machine)
+    return machines
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Instance stores
+# ----------------------------------------------------------------------------------------------------------------------
+def snapshotStore(filename, store):
+    """
+    Write the actual states and the history of all instances of an instance store to a snapshot file
+
+    :param filename: the name of the file
+    :type filename: string
+    :param store: the instance store
+    :type store: ablauf.store.InstanceStore
+    """
+
+    writeSnapshot(filename, store.table, store.states, store.history)
+
+
+def restoreStore(filename, definition, mapped=True):
+    """
+    Create an instance store in the states and with the history of a snapshot file. If mapped, the file is memory
+    mapped and the store works directly on the mapped records, so nothing is read before it is used. Changes of the
+    store are not written back to the file. No enter functions are called.
+
+    *Example:*
+
+    .. code-block:: python
+
+        snapshotStore("sessions.snapshot", sessions)
+
+        sessions = restoreStore("sessions.snapshot", Game)
+
+    :param filename: the name of the file
+    :type filename: string
+    :param definition: the definition the instances run on
+    :type definition: ablauf.Definition
+    :param mapped: memory map the file instead of reading it
+    :type mapped: boolean
+    :return: the instance store
+    :rtype: ablauf.store.InstanceStore
+    """
+
+    store = InstanceStore(definition, 0)
+    table = store.table
+
+    if not mapped:
+        stateids = readSnapshot(filename, table)
+        history = readHistory(filename, table)
+    else:
+        with open(filename, 'rb') as snapshotfile:
+            itemsize, count = readHeader(snapshotfile, table)
+            typecode = 'H' if itemsize == 2 else 'I'
+            if count == 0:
+                stateids = array(typecode)
+                history = array(typecode) if table.historycount else None
+            else:
+                mapping = memoryview(mmap.mmap(snapshotfile.fileno(), 0, access=mmap.ACCESS_COPY))
+                end = HEADER.size + count * itemsize
+                stateids = mapping[HEADER.size:end].cast(typecode)
+                history = None
+                if table.historycount:
+                    history = mapping[end:end + count * table.historycount * itemsize].cast(typecode)
+
+    store.setStates(stateids)
+    if history is not None:
+        store.history = history
+    return store
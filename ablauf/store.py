@@ -0,0 +1,441 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# The Store module
+# ----------------------------------------------------------------------------------------------------------------------
+from array import array
+from itertools import repeat
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class InstanceStore(object):
+    """
+    A compact store for many instances of a definition. The store holds only the actual state id of every instance in
+    a typed array, indexed by the instance id. Instance ids are dense, from 0 to size - 1. Transits are done in bulk
+    through the compiled transition table of the definition, the enter, leave and transition functions are only called
+    for the instances whose transition has one.
+
+    State ids are stored as unsigned short ('H'), or as unsigned int ('I') for definitions with 65535 states or more.
+    If numpy is installed and the instance ids are given as numpy array, the transits are vectorized.
+
+    Instances have no context object, the enter, leave and transition functions get the instance id as context, so
+    the data of the instances can be kept in arrays indexed by it. Guarded transitions can not be chosen, instances
+    with a guarded transition are returned as failed.
+
+    The timeouts of the states are handled by a timer wheel of the store, the timers are keyed by the instance id. Due
+    timeouts are done in one batch.
+
+    If the definition has history states, the store keeps one state id per instance and parent with a history state in
+    a second typed array of fixed size. Transits are then done one by one, also for numpy arrays.
+
+    Every store has a recorder id of its own. The journal and the instrumentation of the definition record the
+    instances of the store under it, so they are not mixed up with machines or other stores of the same instance id.
+
+    *Example:*
+
+    .. code-block:: python
+
+        sessions = InstanceStore(Game, 1000000, "Menu")
+
+        failed = sessions.transit(range(0, 1000000, 2), "ShowOptions")
+        failed = sessions.step([1, 3, 5], ["StartGame", "ShowHighscores", "FinishFromMenu"])
+
+    :param definition: the definition the instances run on
+    :type definition: ablauf.Definition
+    :param size: the number of instances
+    :type size: int
+    :param statename: the name of the state all instances are in, if not set the instances are not started
+    :type statename: string
+    :param recorderid: the recorder id of the store, a new one of the definition if not set
+    :type recorderid: int
+    """
+
+    def __init__(self, definition, size, statename=None, recorderid=None):
+        """
+        A store of instances running on a definition.
+        """
+
+        self.definition = definition
+        self.table = table = definition.getTable()
+        self.timers = None
+        self.recorderid = definition.nextRecorderId() if recorderid is None else recorderid
+
+        if table.statecount < 0xFFFF:
+            self.typecode = 'H'
+            self.none = 0xFFFF
+        else:
+            self.typecode = 'I'
+            self.none = 0xFFFFFFFF
+
+        initial = self.none if statename is None else table.getFirstState(statename)[0]
+        self.states = array(self.typecode, [initial]) * size
+        self.history = None
+        if table.historycount:
+            self.history = array(self.typecode, [self.none]) * (size * table.historycount)
+
+        # slots where leave, transition or enter function has to be called
+        self.callbackslots = bytearray(table.statecount * table.eventcount)
+        for slot, destinationid in enumerate(table.destinations):
+            if destinationid >= 0:
+                stateid = slot // table.eventcount
+                if table.leaves[stateid] is not None or table.functions[slot] is not None or \
+                        table.enters[destinationid] is not None:
+                    self.callbackslots[slot] = 1
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # getter / setter
+    # ------------------------------------------------------------------------------------------------------------------
+    def getSize(self):
+        """
+        Return the number of instances
+
+        :return: number of instances
+        :rtype: int
+        """
+
+        return len(self.states)
+
+    def getStateId(self, instanceid):
+        """
+        Return the id of the actual state of an instance
+
+        :param instanceid: the id of the instance
+        :type instanceid: int
+        :return: the id of the actual state, or the none value of the store if the instance is not started
+        :rtype: int
+        """
+
+        return self.states[instanceid]
+
+    def getStateName(self, instanceid):
+        """
+        Return the name of the actual state of an instance
+
+        :param instanceid: the id of the instance
+        :type instanceid: int
+        :return: the name of the actual state, None if the instance is not started
+        :rtype: string
+        """
+
+        stateid = self.states[instanceid]
+        if stateid == self.none:
+            return None
+        return self.table.statenames[stateid]
+
+    def getRecorderId(self):
+        """
+        Return the recorder id the journal and the instrumentation record the instances of the store under
+
+        :return: the recorder id
+        :rtype: int
+        """
+
+        return self.recorderid
+
+    def setStateId(self, instanceid, stateid):
+        """
+        Set the actual state of an instance without calling any function
+
+        :param instanceid: the id of the instance
+        :type instanceid: int
+        :param stateid: the id of the new state
+        :type stateid: int
+        """
+
+        self.states[instanceid] = stateid
+
+    def setStates(self, states):
+        """
+        Replace the actual state ids of all instances, e.g. with a memoryview of a memory mapped file. No function is
+        called.
+
+        :param states: the state ids of unsigned short ('H') or unsigned int ('I')
+        :type states: array.array or memoryview
+        """
+
+        self.typecode = states.typecode if isinstance(states, array) else states.format
+        self.none = 0xFFFF if self.typecode == 'H' else 0xFFFFFFFF
+        self.states = states
+        if self.table.historycount:
+            self.history = array(self.typecode, [self.none]) * (len(states) * self.table.historycount)
+
+    def getTimers(self):
+        """
+        Return the timer wheel that handles the timeouts of the instances, or None
+
+        :return: the timer wheel
+        :rtype: ablauf.timers.TimerWheel
+        """
+
+        return self.timers
+
+    def setTimers(self, timers):
+        """
+        Set the timer wheel that handles the timeouts of the instances. The handler of the timer wheel is set to the
+        fire function of the store, so a timer wheel can only be used by one store. Timeouts are armed for instances
+        that enter a state while the timer wheel is set.
+
+        *Example:*
+
+        .. code-block:: python
+
+            sessions = InstanceStore(Game, 1000000)
+            sessions.setTimers(TimerWheel())
+            sessions.start(range(1000000), "Menu")
+
+            while True:
+                sessions.getTimers().poll()
+                time.sleep(0.1)
+
+        :param timers: the timer wheel
+        :type timers: ablauf.timers.TimerWheel
+        """
+
+        self.timers = timers
+        if timers is not None:
+            timers.setHandler(self.fire)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # functions
+    # ------------------------------------------------------------------------------------------------------------------
+    def start(self, instanceids, firststatename, payload=None):
+        """
+        Start instances in the first state. The enter function of the state is called once for every instance.
+
+        :param instanceids: the ids of the instances
+        :type instanceids: iterable of int
+        :param firststatename: the name of the first state
+        :type firststatename: string
+        :param payload: the payload the enter functions are called with
+        """
+
+        table = self.table
+        states = self.states
+        destinationid, entry = table.getFirstState(firststatename)
+        enter = table.enters[destinationid]
+        timers = self.timers
+        timeout = table.timeouts[destinationid]
+
+        for instanceid in instanceids:
+            if entry is not None:
+                entry(instanceid, payload)
+            if enter is not None:
+                enter(instanceid, payload)
+            states[instanceid] = destinationid
+            if timers is not None:
+                timers.enter(instanceid, timeout)
+
+    def transit(self, instanceids, event, payload=None):
+        """
+        Do the same transition for many instances. Instances that are not started or have no such transition in their
+        actual state are left unchanged and returned.
+
+        :param instanceids: the ids of the instances
+        :type instanceids: iterable of int or numpy array
+        :param event: the name or the id of the transition
+        :type event: string or int
+        :param payload: the payload of the event, the same for all instances
+        :return: the ids of the instances that could not do the transition
+        :rtype: list
+        """
+
+        eventid = self.table.eventids[event]
+
+        if numpy is not None and isinstance(instanceids, numpy.ndarray):
+            return self.stepVectorized(instanceids, numpy.full(len(instanceids), eventid, dtype=numpy.intp), payload)
+
+        return self.stepIds(instanceids, repeat(eventid), payload)
+
+    def step(self, instanceids, events, payload=None):
+        """
+        Do one transition for each of many instances. The n-th event is done by the n-th instance. Instances that are
+        not started or have no such transition in their actual state are left unchanged and returned.
+
+        :param instanceids: the ids of the instances
+        :type instanceids: iterable of int or numpy array
+        :param events: the names or the ids of the transitions
+        :type events: iterable of string or int or numpy array of int
+        :param payload: the payload of the events, the same for all instances
+        :return: the ids of the instances that could not do the transition
+        :rtype: list
+        """
+
+        if numpy is not None and isinstance(instanceids, numpy.ndarray) and isinstance(events, numpy.ndarray):
+            return self.stepVectorized(instanceids, events, payload)
+
+        eventids = self.table.eventids
+        return self.stepIds(instanceids, [eventids[event] for event in events], payload)
+
+    def stepIds(self, instanceids, eventids, payload=None):
+        """
+        Do one transition for each of many instances, the events are given by their id
+
+        :param instanceids: the ids of the instances
+        :type instanceids: iterable of int
+        :param eventids: the ids of the transitions
+        :type eventids: iterable of int
+        :param payload: the payload of the events, the same for all instances
+        :return: the ids of the instances that could not do the transition
+        :rtype: list
+        """
+
+        table = self.table
+        states = self.states
+        none = self.none
+        eventcount = table.eventcount
+        destinations = table.destinations
+        callbackslots = self.callbackslots
+        timeouts = table.timeouts
+        keeps = table.keeps
+        timers = self.timers
+        journal = self.definition.journal
+        recorderid = self.recorderid
+        instrumentation = self.definition.instrumentation
+        history = self.history
+        historycount = table.historycount
+        failed = []
+
+        for instanceid, eventid in zip(instanceids, eventids):
+            stateid = states[instanceid]
+            if stateid == none:
+                failed.append(instanceid)
+                continue
+
+            slot = stateid * eventcount + eventid
+            destinationid = destinations[slot]
+            if destinationid < 0:
+                if destinationid != table.HISTORY or history is None:
+                    failed.append(instanceid)
+                    continue
+                destinationid, function = table.resume(slot, history, instanceid * historycount)
+                if instrumentation is not None:
+                    instrumentation.transit(recorderid, instanceid, stateid, slot, destinationid, function, instanceid,
+                                            payload)
+                else:
+                    self.call(stateid, slot, destinationid, function, instanceid, payload)
+            elif instrumentation is not None:
+                instrumentation.transit(recorderid, instanceid, stateid, slot, destinationid, None, instanceid, payload)
+            elif callbackslots[slot]:
+                self.call(stateid, slot, destinationid, None, instanceid, payload)
+            states[instanceid] = destinationid
+            if history is not None:
+                table.remember(history, slot, destinationid, instanceid * historycount)
+
+            if timers is not None and not keeps[slot]:
+                timers.enter(instanceid, timeouts[destinationid])
+            if journal is not None:
+                journal.record(recorderid, instanceid, eventid, stateid, destinationid)
+
+        return failed
+
+    def stepVectorized(self, instanceids, eventids, payload=None):
+        """
+        Do one transition for each of many instances with numpy. The functions are called only for the instances whose
+        transition has one, in the order of the instance ids. An instance id must not occur twice.
+
+        :param instanceids: the ids of the instances
+        :type instanceids: numpy array of int
+        :param eventids: the ids of the transitions
+        :type eventids: numpy array of int
+        :param payload: the payload of the events, the same for all instances
+        :return: the ids of the instances that could not do the transition
+        :rtype: list
+        """
+
+        if self.history is not None:
+            return self.stepIds(instanceids.tolist(), eventids.tolist(), payload)
+
+        table = self.table
+        states = numpy.frombuffer(self.states, dtype=self.typecode)
+        destinations = numpy.asarray(memoryview(table.destinations))
+        callbackslots = numpy.frombuffer(self.callbackslots, dtype=numpy.uint8)
+
+        stateids = states[instanceids].astype(numpy.intp)
+        started = stateids != self.none
+        slots = numpy.where(started, stateids * table.eventcount + eventids, 0)
+        destinationids = numpy.where(started, destinations[slots], -1)
+        valid = destinationids >= 0
+
+        instrumentation = self.definition.instrumentation
+        if instrumentation is not None:
+            for index in numpy.flatnonzero(valid):
+                instanceid = int(instanceids[index])
+                instrumentation.transit(self.recorderid, instanceid, int(stateids[index]), int(slots[index]),
+                                        int(destinationids[index]), None, instanceid, payload)
+        else:
+            for index in numpy.flatnonzero(valid & (callbackslots[slots] != 0)):
+                self.call(int(stateids[index]), int(slots[index]), int(destinationids[index]), None,
+                          int(instanceids[index]), payload)
+
+        states[instanceids[valid]] = destinationids[valid]
+
+        timers = self.timers
+        if timers is not None:
+            timeouts = table.timeouts
+            keeps = numpy.frombuffer(table.keeps, dtype=numpy.uint8)
+            for index in numpy.flatnonzero(valid & (keeps[slots] == 0)):
+                timers.enter(int(instanceids[index]), timeouts[int(destinationids[index])])
+
+        journal = self.definition.journal
+        if journal is not None:
+            for index in numpy.flatnonzero(valid):
+                journal.record(self.recorderid, int(instanceids[index]), int(eventids[index]), int(stateids[index]),
+                               int(destinationids[index]))
+
+        return instanceids[~valid].tolist()
+
+    def fire(self, due):
+        """
+        Do the due timeouts of the instances in one batch. Instances that left the state owning the timeout in the
+        meantime are skipped. This is the handler of the timer wheel of the store.
+
+        :param due: the instance ids and the owning state ids and event ids of the due timeouts
+        :type due: list of tuple
+        :return: the ids of the instances that could not do the transition
+        :rtype: list
+        """
+
+        states = self.states
+        none = self.none
+        isTimedBy = self.table.isTimedBy
+        instanceids = []
+        eventids = []
+        for instanceid, (ownerid, eventid) in due:
+            stateid = states[instanceid]
+            if stateid != none and isTimedBy(stateid, ownerid):
+                instanceids.append(instanceid)
+                eventids.append(eventid)
+        return self.stepIds(instanceids, eventids)
+
+    def call(self, stateid, slot, destinationid, function=None, context=None, payload=None):
+        """
+        Call the leave, transition and enter function of a transition
+
+        :param stateid: the id of the source state
+        :type stateid: int
+        :param slot: the slot of the transition in the transition table
+        :type slot: int
+        :param destinationid: the id of the destination state
+        :type destinationid: int
+        :param function: the transition function, the one of the slot if not set
+        :type function: function
+        :param context: the context the functions are called with, the id of the instance
+        :param payload: the payload the functions are called with
+        """
+
+        table = self.table
+
+        leave = table.leaves[stateid]
+        if leave is not None:
+            leave(context, payload)
+
+        if function is None:
+            function = table.functions[slot]
+        if function is not None:
+            function(context, payload)
+
+        enter = table.enters[destinationid]
+        if enter is not None:
+            enter(context, payload)
@@ -0,0 +1,859 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# The Table module
+# ----------------------------------------------------------------------------------------------------------------------
+import hashlib
+from array import array
+from fnmatch import fnmatchcase
+from inspect import Parameter, isawaitable, signature
+
+
+class TransitionTable(object):
+    """
+    The compiled form of a set of states. State and transition names are interned to small integers and the
+    destinations are stored in a flat array, indexed by ``stateid * eventcount + eventid``. A transition resolves with
+    one indexed load instead of name lookups.
+
+    Events can be given by their id or by their name, both are looked up in ``eventids``, so transition names must be
+    strings. Compiling assigns the id of every state to ``State.id``.
+
+    States can have a parent state. Child states inherit the transitions of their parents and a transition to a
+    parent state goes down its initial states, so the destinations are always states without children. The leave and
+    enter functions of the parent states a transition passes are computed once and folded into its function. All
+    functions of the table are called with the context of the machine and the payload of the event, see adaptCallback.
+
+    Transitions of groups of states, selected by a pattern of their names, and global transitions of all states are
+    written into the slots of the states that have no transition of their own for the event. Transitions of groups
+    come before global transitions.
+
+    The slot of a guarded transition holds GUARDED instead of a destination. Its candidates are kept in ``guards`` by
+    slot, as tuples of the guard, the destination id and the function, and are resolved with choose.
+
+    The slot of a transition to a history state holds HISTORY. Machines keep a small array with one state id per parent
+    that has a history state, see createHistory. Which entries of the array a transition writes when it leaves such a
+    parent is computed once for every slot, see remember, and a transition to a history state reads its entry, see
+    resume.
+
+    *Example:*
+
+    .. code-block:: python
+
+        table = TransitionTable(Game.getStates())
+
+        slot = table.getStateId("Menu") * table.eventcount + table.getEventId("ShowOptions")
+        destinationid = table.destinations[slot]
+
+    :param states: the states to compile
+    :type states: dict
+    """
+
+    NONE = -1
+    GUARDED = -2
+    HISTORY = -3
+
+    def __init__(self, states, scopes=None):
+        """
+        Compile the given states.
+
+        :param states: the states to compile
+        :type states: dict
+        :param scopes: the transitions of groups of states, tuples of the pattern of the state names, None for all
+            states, and the candidates by transition name. The first matching scope wins.
+        :type scopes: list of tuple
+        """
+
+        self.states = list(states.values())
+        self.statenames = [state.getName() for state in self.states]
+        self.stateids = {}
+        for stateid, state in enumerate(self.states):
+            state.id = stateid
+            self.stateids[state.getName()] = stateid
+
+        # events can be looked up by name or by id, so event names must be strings
+        scopes = [] if scopes is None else scopes
+        self.eventnames = []
+        self.eventids = {}
+        for transitions in [state.transitions for state in self.states] + [scope[1] for scope in scopes]:
+            for transitionname in transitions:
+                if transitionname not in self.eventids:
+                    if not isinstance(transitionname, str):
+                        raise TypeError("Transition name " + repr(transitionname) + " is not a string")
+                    self.eventids[transitionname] = len(self.eventnames)
+                    self.eventnames.append(transitionname)
+        for eventid in range(len(self.eventnames)):
+            self.eventids[eventid] = eventid
+
+        self.statecount = len(self.states)
+        self.eventcount = len(self.eventnames)
+
+        # the parent of every state and the state that is entered in the end, going down the initial states
+        self.parents = [self.NONE] * self.statecount
+        for stateid, state in enumerate(self.states):
+            if state.parent is not None:
+                if state.parent not in self.stateids:
+                    raise KeyError("Parent " + str(state.parent) + " of state " + str(state.getName()) + " is unknown")
+                self.parents[stateid] = self.stateids[state.parent]
+        self.initials = []
+        for stateid in range(self.statecount):
+            self.getAncestors(stateid)
+            while self.states[stateid].initial is not None:
+                childid = self.stateids[self.states[stateid].initial]
+                if self.parents[childid] != stateid:
+                    raise ValueError("Initial state " + str(self.statenames[childid]) + " of state " +
+                                     str(self.statenames[stateid]) + " is not its child")
+                stateid = childid
+            self.initials.append(stateid)
+
+        size = self.statecount * self.eventcount
+        self.destinations = array('l', [self.NONE]) * size
+        self.transitions = [None] * size
+        self.enters = [adaptCallback(state.enterfunction) for state in self.states]
+        self.leaves = [adaptCallback(state.leavefunction) for state in self.states]
+        self.chains = {}
+        self.guardchains = {}
+        self.resumes = {}
+        functions = [None] * size
+        guards = {}
+
+        # the kind of every history state, a parent has at most one
+        self.histories = [state.history for state in self.states]
+        historyparents = set()
+        for stateid, kind in enumerate(self.histories):
+            if kind is not None:
+                parentid = self.parents[stateid]
+                if parentid == self.NONE or parentid in historyparents:
+                    raise ValueError("History state " + str(self.statenames[stateid]) +
+                                     " needs a parent without another history state")
+                historyparents.add(parentid)
+
+        # seconds, event id and owning state id of the timeout of every state, child states inherit the timeout of
+        # their parents
+        self.timeouts = [None] * self.statecount
+        for stateid in range(self.statecount):
+            for ancestorid in self.getAncestors(stateid):
+                state = self.states[ancestorid]
+                if state.timeout is not None:
+                    seconds, transitionname = state.timeout
+                    if transitionname not in self.eventids:
+                        raise KeyError("Timeout of state " + str(state.getName()) + " fires unknown transition " +
+                                       str(transitionname))
+                    self.timeouts[stateid] = (seconds, self.eventids[transitionname], ancestorid)
+                    break
+
+        for state in self.states:
+            for transition in state.getAllTransitions():
+                destinationname = transition.getDestinationName()
+                if destinationname not in self.stateids:
+                    raise KeyError("Transition " + str(transition.getName()) + " of state " + str(state.getName()) +
+                                   " leads to unknown state " + str(destinationname))
+        for pattern, transitions in scopes:
+            for candidates in transitions.values():
+                for transition in candidates:
+                    if transition.getDestinationName() not in self.stateids:
+                        raise KeyError("Transition " + str(transition.getName()) + " of states " + str(pattern) +
+                                       " leads to unknown state " + str(transition.getDestinationName()))
+
+        # child states inherit the transitions of their parents, unless they have a transition with the same name.
+        # Transitions of groups and global transitions are used for the events a state has no transition for, they
+        # are written into the slots here, so a lookup stays one indexed load.
+        for stateid in range(self.statecount):
+            for ancestorid in self.getAncestors(stateid):
+                ancestor = self.states[ancestorid]
+                for transitionname, transition in ancestor.transitions.items():
+                    slot = stateid * self.eventcount + self.eventids[transitionname]
+                    if self.transitions[slot] is None:
+                        self.setSlot(stateid, slot, transition, ancestor.candidates.get(transitionname), functions,
+                                     guards)
+
+            statename = self.statenames[stateid]
+            if statename == "End":
+                continue
+            for pattern, transitions in scopes:
+                if pattern is not None and not fnmatchcase(str(statename), pattern):
+                    continue
+                for transitionname, candidates in transitions.items():
+                    slot = stateid * self.eventcount + self.eventids[transitionname]
+                    if self.transitions[slot] is None:
+                        guarded = len(candidates) > 1 or candidates[0].guard is not None
+                        self.setSlot(stateid, slot, candidates[0], candidates if guarded else None, functions, guards)
+
+        self.bindFunctions(functions, guards)
+
+    def setSlot(self, stateid, slot, transition, candidates, functions, guards):
+        """
+        Compile a transition into a slot
+
+        :param stateid: the id of the source state
+        :type stateid: int
+        :param slot: the slot
+        :type slot: int
+        :param transition: the transition, the first candidate of a guarded transition
+        :type transition: ablauf.Transition
+        :param candidates: the candidates of a guarded transition, None if the transition is not guarded
+        :type candidates: list of ablauf.Transition
+        :param functions: the transition functions, by slot
+        :type functions: list
+        :param guards: the candidates of guarded transitions, by slot
+        :type guards: dict
+        """
+
+        self.transitions[slot] = transition
+        if candidates is None:
+            destinationid = self.stateids[transition.getDestinationName()]
+            if self.histories[destinationid] is not None:
+                self.destinations[slot] = self.HISTORY
+                self.resumes[slot] = destinationid
+                functions[slot] = transition.funct
+                return
+            self.destinations[slot] = self.initials[destinationid]
+            functions[slot] = transition.funct
+            chain = self.getChain(stateid, destinationid)
+            if chain is not None:
+                self.chains[slot] = chain
+        else:
+            self.destinations[slot] = self.GUARDED
+            destinationids = [self.stateids[candidate.getDestinationName()] for candidate in candidates]
+            if any(self.histories[destinationid] is not None for destinationid in destinationids):
+                raise ValueError("Guarded transition " + str(transition.getName()) + " of state " +
+                                 str(self.statenames[stateid]) + " can not lead to a history state")
+            guards[slot] = tuple((candidate.guard, self.initials[destinationid], candidate.funct)
+                                 for candidate, destinationid in zip(candidates, destinationids))
+            chains = tuple(self.getChain(stateid, destinationid) for destinationid in destinationids)
+            if any(chain is not None for chain in chains):
+                self.guardchains[slot] = chains
+
+    @classmethod
+    def fromArrays(cls, statenames, eventnames, destinations, enters, leaves, functions, timeouts=None, guards=None,
+                   parents=None, initials=None, chains=None, guardchains=None, histories=None, resumes=None):
+        """
+        Create a table from its arrays, without State and Transition objects. The states and transitions of the table
+        are None.
+
+        :param statenames: the names of the states, by state id
+        :type statenames: list
+        :param eventnames: the names of the events, by event id
+        :type eventnames: list
+        :param destinations: the destination state ids, by slot
+        :type destinations: array.array
+        :param enters: the enter functions, by state id
+        :type enters: list
+        :param leaves: the leave functions, by state id
+        :type leaves: list
+        :param functions: the transition functions, by slot
+        :type functions: list
+        :param timeouts: the seconds, event id and owning state id of the timeouts, by state id
+        :type timeouts: list
+        :param guards: the guard, destination id and function of the candidates of guarded transitions, by slot
+        :type guards: dict
+        :param parents: the parent state ids, by state id
+        :type parents: list
+        :param initials: the ids of the states entered in the end, by state id
+        :type initials: list
+        :param chains: the ids of the left and entered parent states, by slot
+        :type chains: dict
+        :param guardchains: the ids of the left and entered parent states of every candidate, by slot
+        :type guardchains: dict
+        :param histories: the kind of the history states, by state id
+        :type histories: list
+        :param resumes: the ids of the history states of the transitions to them, by slot
+        :type resumes: dict
+        :return: the table
+        :rtype: ablauf.table.TransitionTable
+        """
+
+        table = cls.__new__(cls)
+        table.statenames = list(statenames)
+        table.stateids = dict((statename, stateid) for stateid, statename in enumerate(table.statenames))
+        table.eventnames = list(eventnames)
+        table.statecount = len(table.statenames)
+        table.eventcount = len(table.eventnames)
+
+        table.eventids = {}
+        for eventid, eventname in enumerate(table.eventnames):
+            table.eventids[eventname] = eventid
+            table.eventids[eventid] = eventid
+
+        table.states = [None] * table.statecount
+        table.parents = [cls.NONE] * table.statecount if parents is None else list(parents)
+        table.initials = list(range(table.statecount)) if initials is None else list(initials)
+        table.destinations = array('l', destinations)
+        table.transitions = [None] * len(table.destinations)
+        table.enters = [adaptCallback(function) for function in enters]
+        table.leaves = [adaptCallback(function) for function in leaves]
+        table.chains = {} if chains is None else dict(chains)
+        table.guardchains = {} if guardchains is None else dict(guardchains)
+        table.histories = [None] * table.statecount if histories is None else list(histories)
+        table.resumes = {} if resumes is None else dict(resumes)
+        table.timeouts = [None] * table.statecount if timeouts is None else [
+            None if timeout is None else tuple(timeout) for timeout in timeouts]
+        table.bindFunctions(functions, {} if guards is None else guards)
+        return table
+
+    def bindFunctions(self, functions, guards):
+        """
+        Set the transition functions and the candidates of guarded transitions. The leave functions of the left
+        parent states and the enter functions of the entered parent states are folded into the transition function,
+        so a transition of a hierarchical definition calls one function between the leave function of its source and
+        the enter function of its destination. The enter functions of the parents of every state are folded into one
+        function for the start.
+
+        :param functions: the transition functions, by slot
+        :type functions: list
+        :param guards: the guard, destination id and function of the candidates of guarded transitions, by slot
+        :type guards: dict
+        """
+
+        functions = [adaptCallback(function) for function in functions]
+        guards = dict((slot, [(guard, destinationid, adaptCallback(function))
+                              for guard, destinationid, function in candidates])
+                      for slot, candidates in guards.items())
+
+        self.functions = list(functions)
+        for slot, (exitids, enterids) in self.chains.items():
+            self.functions[slot] = self.fold(exitids, self.functions[slot], enterids)
+
+        self.guards = {}
+        for slot, candidates in guards.items():
+            chains = self.guardchains.get(slot, (None,) * len(candidates))
+            self.guards[slot] = tuple(
+                (guard, destinationid, function if chain is None else self.fold(chain[0], function, chain[1]))
+                for (guard, destinationid, function), chain in zip(candidates, chains))
+
+        self.entries = [None] * self.statecount
+        for stateid in range(self.statecount):
+            if self.parents[stateid] != self.NONE:
+                self.entries[stateid] = self.fold((), None, self.getAncestors(stateid)[:0:-1])
+
+        self.bindHistories(functions)
+        self.keeps = self.getKeeps()
+
+    def bindHistories(self, functions):
+        """
+        Compute the entries of the history array of a machine, the entries every transition writes and the states a
+        transition to a history state can resume, with their folded functions.
+
+        :param functions: the transition functions, by slot
+        :type functions: list
+        """
+
+        # the index in the history array and the kind, by parent state id
+        self.historyids = [self.NONE] * self.statecount
+        self.historykinds = []
+        for stateid, kind in enumerate(self.histories):
+            if kind is not None:
+                self.historyids[self.parents[stateid]] = len(self.historykinds)
+                self.historykinds.append(kind)
+        self.historycount = len(self.historykinds)
+
+        self.records = {}
+        self.restores = {}
+        if not self.historycount:
+            return
+
+        for slot, historyid in self.resumes.items():
+            sourceid = slot // self.eventcount
+            parentid = self.parents[historyid]
+            targets = {}
+            for stateid in self.getResumableIds(parentid):
+                chain = self.getChain(sourceid, parentid, stateid)
+                targets[stateid] = functions[slot] if chain is None else self.fold(chain[0], functions[slot], chain[1])
+            self.restores[slot] = (self.historyids[parentid], self.initials[parentid], targets)
+            chain = self.getChain(sourceid, parentid)
+            if chain is not None and self.getRecords(sourceid, chain[0]):
+                self.records[slot] = self.getRecords(sourceid, chain[0])
+
+        for slot, chain in self.chains.items():
+            if self.getRecords(slot // self.eventcount, chain[0]):
+                self.records[slot] = self.getRecords(slot // self.eventcount, chain[0])
+        for slot, chains in self.guardchains.items():
+            records = {}
+            for (guard, destinationid, function), chain in zip(self.guards[slot], chains):
+                if chain is not None and self.getRecords(slot // self.eventcount, chain[0]):
+                    records[destinationid] = self.getRecords(slot // self.eventcount, chain[0])
+            if records:
+                self.records[slot] = records
+
+    def getKeeps(self):
+        """
+        Return the slots whose transitions keep the timer of their source running: the source inherits its timeout
+        from a parent, the transition does not leave that parent and ends in a state with the same timeout. All
+        other transitions cancel the timer and arm the timeout of their destination.
+
+        :return: 1 for the slots that keep the timer, by slot
+        :rtype: bytearray
+        """
+
+        keeps = bytearray(self.statecount * self.eventcount)
+        timeouts = self.timeouts
+        for slot, destinationid in enumerate(self.destinations):
+            if destinationid == self.NONE:
+                continue
+            stateid = slot // self.eventcount
+            timeout = timeouts[stateid]
+            if timeout is None or timeout[2] == stateid:
+                continue
+
+            if destinationid >= 0:
+                targets = [(destinationid, self.chains.get(slot))]
+            elif destinationid == self.GUARDED:
+                chains = self.guardchains.get(slot, (None,) * len(self.guards[slot]))
+                targets = [(candidate[1], chain) for candidate, chain in zip(self.guards[slot], chains)]
+            else:
+                parentid = self.parents[self.resumes[slot]]
+                targets = [(targetid, self.getChain(stateid, parentid, targetid))
+                           for targetid in self.restores[slot][2]]
+            if all(timeouts[targetid] == timeout and (chain is None or timeout[2] not in chain[0])
+                   for targetid, chain in targets):
+                keeps[slot] = 1
+        return keeps
+
+    def getResumableIds(self, parentid):
+        """
+        Return the states a transition to the history state of a parent can end in
+
+        :param parentid: the id of the parent state
+        :type parentid: int
+        :return: the ids of the states
+        :rtype: list of int
+        """
+
+        deep = self.historykinds[self.historyids[parentid]] == "deep"
+        stateids = []
+        for stateid in range(self.statecount):
+            if self.histories[stateid] is not None or self.initials[stateid] != stateid:
+                continue
+            ancestors = self.getAncestors(stateid)
+            if parentid not in ancestors[1:]:
+                continue
+            # a shallow history resumes a child of the parent, which goes down its initial states again
+            if deep or self.initials[ancestors[ancestors.index(parentid) - 1]] == stateid:
+                stateids.append(stateid)
+        return stateids
+
+    def getRecords(self, sourceid, exitids):
+        """
+        Return the entries of the history array a transition writes when it leaves parent states with a history state
+
+        :param sourceid: the id of the source state
+        :type sourceid: int
+        :param exitids: the ids of the left parent states
+        :type exitids: tuple
+        :return: tuples of the index in the history array and the state id
+        :rtype: tuple
+        """
+
+        ancestors = self.getAncestors(sourceid)
+        records = []
+        for exitid in exitids:
+            index = self.historyids[exitid]
+            if index == self.NONE:
+                continue
+            if self.historykinds[index] == "deep":
+                records.append((index, sourceid))
+            else:
+                records.append((index, self.initials[ancestors[ancestors.index(exitid) - 1]]))
+        return tuple(records)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # functions
+    # ------------------------------------------------------------------------------------------------------------------
+    def getStateId(self, statename):
+        """
+        Return the id of a state
+
+        :param statename: the name of the state
+        :type statename: string
+        :return: the id of the state
+        :rtype: int
+        """
+
+        return self.stateids[statename]
+
+    def getFirstState(self, firststatename):
+        """
+        Return the state a machine is started in and the function that enters its parent states. If the first state
+        has child states, the machine is started in its initial state.
+
+        :param firststatename: the name of the first state
+        :type firststatename: string
+        :return: the id of the state and the function, or None if no parent has an enter function
+        :rtype: tuple
+        """
+
+        stateid = self.initials[self.stateids[firststatename]]
+        return stateid, self.entries[stateid]
+
+    def getAncestors(self, stateid):
+        """
+        Return the state and its parent states, from the state up
+
+        :param stateid: the id of the state
+        :type stateid: int
+        :return: the ids of the state and its parents
+        :rtype: list of int
+        """
+
+        ancestors = [stateid]
+        parentid = self.parents[stateid]
+        while parentid != self.NONE:
+            if len(ancestors) > self.statecount:
+                raise ValueError("The parents of state " + str(self.statenames[stateid]) + " form a cycle")
+            ancestors.append(parentid)
+            parentid = self.parents[parentid]
+        return ancestors
+
+    def getChain(self, sourceid, destinationid, leafid=None):
+        """
+        Return the parent states that are left and entered by a transition, besides its source and the state it ends
+        in. The states are left up to the least common ancestor of source and destination and entered down from there.
+        A transition to a parent of its source leaves and enters that parent again.
+
+        :param sourceid: the id of the source state
+        :type sourceid: int
+        :param destinationid: the id of the destination state, before going down its initial states
+        :type destinationid: int
+        :param leafid: the id of the state the transition ends in, the initial state of the destination if not set
+        :type leafid: int
+        :return: the ids of the left states from the bottom up and of the entered states from the top down, or None if
+            there are none
+        :rtype: tuple
+        """
+
+        sources = self.getAncestors(sourceid)
+        commonid = self.parents[destinationid]
+        while commonid != self.NONE and commonid not in sources:
+            commonid = self.parents[commonid]
+
+        destinations = self.getAncestors(self.initials[destinationid] if leafid is None else leafid)
+        if commonid == self.NONE:
+            exitids = sources[1:]
+            enterids = destinations[:0:-1]
+        else:
+            exitids = sources[1:sources.index(commonid)]
+            enterids = destinations[destinations.index(commonid) - 1:0:-1]
+
+        if not exitids and not enterids:
+            return None
+        return tuple(exitids), tuple(enterids)
+
+    def fold(self, exitids, function, enterids):
+        """
+        Return a function that calls the leave functions of the left states, the transition function and the enter
+        functions of the entered states. The function itself is returned if no state has such a function. If one of
+        the functions returns an awaitable, a coroutine that awaits it and calls the remaining functions is returned.
+
+        :param exitids: the ids of the left states
+        :type exitids: tuple
+        :param function: the transition function
+        :type function: function
+        :param enterids: the ids of the entered states
+        :type enterids: tuple
+        :return: the function
+        :rtype: function
+        """
+
+        calls = [self.leaves[stateid] for stateid in exitids if self.leaves[stateid] is not None]
+        if function is not None:
+            calls.append(function)
+        calls.extend(self.enters[stateid] for stateid in enterids if self.enters[stateid] is not None)
+
+        if len(calls) <= 1 and (not calls or calls[0] is function):
+            return function
+        calls = tuple(calls)
+
+        def chain(context, payload):
+            for index, call in enumerate(calls):
+                result = call(context, payload)
+                if result is not None and isawaitable(result):
+                    return resume(result, calls[index + 1:], context, payload)
+        return chain
+
+    def getStateName(self, stateid):
+        """
+        Return the name of a state
+
+        :param stateid: the id of the state
+        :type stateid: int
+        :return: the name of the state
+        :rtype: string
+        """
+
+        return self.statenames[stateid]
+
+    def getEventId(self, event):
+        """
+        Return the id of an event
+
+        :param event: the name or the id of the event
+        :type event: string or int
+        :return: the id of the event
+        :rtype: int
+        """
+
+        return self.eventids[event]
+
+    def getEventName(self, eventid):
+        """
+        Return the name of an event
+
+        :param eventid: the id of the event
+        :type eventid: int
+        :return: the name of the event
+        :rtype: string
+        """
+
+        return self.eventnames[eventid]
+
+    def lookup(self, stateid, event):
+        """
+        Return the id of the destination state of an event, or NONE if the state has no such transition
+
+        :param stateid: the id of the source state
+        :type stateid: int
+        :param event: the name or the id of the event
+        :type event: string or int
+        :return: the id of the destination state
+        :rtype: int
+        """
+
+        return self.destinations[stateid * self.eventcount + self.eventids[event]]
+
+    def choose(self, slot, context):
+        """
+        Return the destination and the function of the first candidate of a guarded transition whose guard holds for
+        the context. The guards count their hits and misses.
+
+        :param slot: the slot of the guarded transition
+        :type slot: int
+        :param context: the context of the machine
+        :return: the id of the destination state and the function, or None if no guard holds
+        :rtype: tuple
+        """
+
+        for guard, destinationid, function in self.guards[slot]:
+            if guard is None:
+                return destinationid, function
+            if guard.predicate(context):
+                guard.hits += 1
+                return destinationid, function
+            guard.misses += 1
+        return None
+
+    def createHistory(self):
+        """
+        Return a new history array for a machine, with one state id per parent that has a history state
+
+        :return: the history array, or None if no state has a history state
+        :rtype: array.array
+        """
+
+        if not self.historycount:
+            return None
+        return array('l', [self.NONE]) * self.historycount
+
+    def remember(self, history, slot, destinationid, offset=0):
+        """
+        Write the entries of the history array for a transition that was done
+
+        :param history: the history array
+        :type history: array.array
+        :param slot: the slot of the transition
+        :type slot: int
+        :param destinationid: the id of the destination state
+        :type destinationid: int
+        :param offset: the index of the first entry of the machine in the history array
+        :type offset: int
+        """
+
+        records = self.records.get(slot)
+        if records is None:
+            return
+        if isinstance(records, dict):
+            records = records.get(destinationid, ())
+        for index, stateid in records:
+            history[offset + index] = stateid
+
+    def resume(self, slot, history, offset=0):
+        """
+        Return the destination and the function of a transition to a history state. The parents left by the
+        transition are remembered first, so a transition from inside a parent to its history state resumes its
+        source.
+
+        :param slot: the slot of the transition
+        :type slot: int
+        :param history: the history array
+        :type history: array.array
+        :param offset: the index of the first entry of the machine in the history array
+        :type offset: int
+        :return: the id of the destination state and the function
+        :rtype: tuple
+        """
+
+        index, defaultid, targets = self.restores[slot]
+        self.remember(history, slot, self.HISTORY, offset)
+        stateid = history[offset + index]
+        if stateid not in targets:
+            stateid = defaultid
+        return stateid, targets[stateid]
+
+    def isTimedBy(self, stateid, ownerid):
+        """
+        Return True if a state has the timeout of the given state, its own or inherited from that parent
+
+        :param stateid: the id of the state, negative if the machine is not started
+        :type stateid: int
+        :param ownerid: the id of the state owning the timeout
+        :type ownerid: int
+        :return: the state has the timeout
+        :rtype: boolean
+        """
+
+        if stateid < 0:
+            return False
+        timeout = self.timeouts[stateid]
+        return timeout is not None and timeout[2] == ownerid
+
+    def getTargets(self, slot):
+        """
+        Return the states a transition can end in
+
+        :param slot: the slot of the transition
+        :type slot: int
+        :return: the ids of the destination states
+        :rtype: list of int
+        """
+
+        destinationid = self.destinations[slot]
+        if destinationid >= 0:
+            return [destinationid]
+        if destinationid == self.GUARDED:
+            return [candidate[1] for candidate in self.guards[slot]]
+        if destinationid == self.HISTORY:
+            return list(self.restores[slot][2])
+        return []
+
+    def getGuardCounts(self):
+        """
+        Return the hits and misses of all guards, in the order the candidates are evaluated
+
+        :return: tuples of state name, event name, destination name, guard, hits and misses
+        :rtype: list of tuple
+        """
+
+        counts = []
+        for slot in sorted(self.guards):
+            stateid, eventid = divmod(slot, self.eventcount)
+            for guard, destinationid, function in self.guards[slot]:
+                if guard is not None:
+                    counts.append((self.statenames[stateid], self.eventnames[eventid], self.statenames[destinationid],
+                                   guard, guard.hits, guard.misses))
+        return counts
+
+    def getFingerprint(self):
+        """
+        Return a fingerprint of the table. Two tables have the same fingerprint if they have the same states and events
+        with the same ids and the same destinations, including the candidates of guarded transitions, so state ids of
+        one table are valid for the other.
+
+        :return: the fingerprint
+        :rtype: bytes
+        """
+
+        digest = hashlib.sha1()
+        for name in self.statenames:
+            digest.update(repr(name).encode("utf-8") + b"\0")
+        digest.update(b"\1")
+        for name in self.eventnames:
+            digest.update(repr(name).encode("utf-8") + b"\0")
+        digest.update(b"\1")
+        digest.update(array('q', self.destinations).tobytes())
+        for slot in sorted(self.guards):
+            digest.update(array('q', [slot] + [candidate[1] for candidate in self.guards[slot]]).tobytes())
+        for slot in sorted(self.resumes):
+            digest.update(array('q', [slot, self.resumes[slot]]).tobytes() + repr(self.histories[self.resumes[slot]])
+                          .encode("utf-8"))
+        return digest.digest()[:16]
+
+
+def adaptCallback(function):
+    """
+    Return a function that takes the context of the machine and the payload of the event. Functions are inspected
+    once, when they are set or the table is compiled, never when they are called: a function with two parameters is
+    called with the context and the payload, a function with one parameter only with the context, and a function
+    without parameters with nothing.
+
+    :param function: the enter, leave or transition function, or None
+    :type function: function
+    :return: the function, or None
+    :rtype: function
+    """
+
+    if function is None:
+        return None
+    try:
+        parameters = list(signature(function).parameters.values())
+    except (TypeError, ValueError):
+        parameters = []
+
+    if any(parameter.kind == Parameter.VAR_POSITIONAL for parameter in parameters):
+        return function
+    count = sum(1 for parameter in parameters
+                if parameter.kind in (Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD))
+    if count >= 2:
+        return function
+    if count == 1:
+        return ContextCallback(function)
+    return LegacyCallback(function)
+
+
+class LegacyCallback(object):
+    """
+    A function without parameters, called like a function with the context and the payload. It can be pickled if the
+    function can.
+
+    :param function: the function
+    :type function: function
+    """
+
+    __slots__ = ('function',)
+
+    def __init__(self, function):
+        self.function = function
+
+    def __call__(self, context, payload):
+        return self.function()
+
+
+class ContextCallback(object):
+    """
+    A function with the context as only parameter, called like a function with the context and the payload. It can be
+    pickled if the function can.
+
+    :param function: the function
+    :type function: function
+    """
+
+    __slots__ = ('function',)
+
+    def __init__(self, function):
+        self.function = function
+
+    def __call__(self, context, payload):
+        return self.function(context)
+
+
+async def resume(result, calls, context, payload):
+    """
+    Await the result of a function and call the remaining functions, awaiting their results
+
+    :param result: the awaitable
+    :param calls: the remaining functions
+    :type calls: tuple
+    :param context: the context of the machine
+    :param payload: the payload of the event
+    """
+
+    await result
+    for call in calls:
+        result = call(context, payload)
+        if result is not None and isawaitable(result):
+            await result
@@ -0,0 +1,249 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# The Timers module
+# ----------------------------------------------------------------------------------------------------------------------
+import asyncio
+import math
+import time
+from inspect import isawaitable
+
+from ablauf import logger
+
+
+class TimerWheel(object):
+    """
+    A hashed timer wheel for the timeouts of states. Time is divided into ticks of the resolution, the wheel has a fixed
+    number of slots and a timer is kept in the slot of its due tick. Arming and cancelling a timer is O(1), polling only
+    looks at the slots of the ticks that passed since the last poll. Timers fire at most one tick late.
+
+    Every timer has a key, arming a key again replaces its timer. Due timers are collected and given to the handler in
+    one batch. The default handler does the timeout transitions of machines, see fireMachines.
+
+    The wheel is driven by calling poll regularly, or by the coroutine runAsync in an asyncio event loop.
+
+    *Example:*
+
+    .. code-block:: python
+
+        Game.setTimeout(30, "Timeout")
+
+        timers = TimerWheel()
+        SinglePlayerGame.setTimers(timers)
+
+        session = SinglePlayerGame.createMachine()
+        session.start("Menu")
+
+        while True:
+            timers.poll()
+            time.sleep(timers.getResolution())
+
+    :param handler: the function called with the list of keys and values of the due timers, fireMachines if not set
+    :type handler: function
+    :param resolution: the length of a tick in seconds
+    :type resolution: float
+    :param slots: the number of slots of the wheel
+    :type slots: int
+    :param clock: the clock that returns the time in seconds
+    :type clock: function
+    """
+
+    def __init__(self, handler=None, resolution=0.1, slots=1024, clock=time.monotonic):
+        """
+        An empty timer wheel.
+        """
+
+        self.handler = fireMachines if handler is None else handler
+        self.resolution = resolution
+        self.clock = clock
+        self.slots = [{} for _ in range(slots)]
+        self.timers = {}
+        self.tick = int(clock() / resolution)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # getter / setter
+    # ------------------------------------------------------------------------------------------------------------------
+    def getHandler(self):
+        """
+        Return the function that is called with the due timers
+
+        :return: the handler
+        :rtype: function
+        """
+
+        return self.handler
+
+    def setHandler(self, handler):
+        """
+        Set the function that is called with the due timers. It gets a list of (key, value) tuples.
+
+        :param handler: the handler
+        :type handler: function
+        """
+
+        self.handler = handler
+
+    def getResolution(self):
+        """
+        Return the length of a tick
+
+        :return: the length of a tick in seconds
+        :rtype: float
+        """
+
+        return self.resolution
+
+    def getCount(self):
+        """
+        Return the number of armed timers
+
+        :return: the number of timers
+        :rtype: int
+        """
+
+        return len(self.timers)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # functions
+    # ------------------------------------------------------------------------------------------------------------------
+    def arm(self, key, delay, value):
+        """
+        Arm a timer. An armed timer of the same key is cancelled.
+
+        :param key: the key of the timer
+        :param delay: the time until the timer is due in seconds
+        :type delay: float
+        :param value: the value given to the handler with the key
+        """
+
+        self.cancel(key)
+        due = max(int(math.ceil((self.clock() + delay) / self.resolution)), self.tick + 1)
+        index = due % len(self.slots)
+        self.slots[index][key] = (due, value)
+        self.timers[key] = index
+
+    def cancel(self, key):
+        """
+        Cancel a timer. Nothing is done if the key has no timer.
+
+        :param key: the key of the timer
+        """
+
+        index = self.timers.pop(key, None)
+        if index is not None:
+            del self.slots[index][key]
+
+    def enter(self, key, timeout):
+        """
+        Cancel the timer of a key and arm the timeout of the state it entered. This is called by the machines when
+        they start and on every transition that does not stay in the state owning the timeout, see
+        ablauf.table.TransitionTable.keeps. The value of the timer is the id of the owning state and the event id.
+
+        :param key: the key of the timer, e.g. the machine
+        :param timeout: the seconds, the event id and the owning state id of the timeout of the state, or None
+        :type timeout: tuple
+        """
+
+        if timeout is None:
+            self.cancel(key)
+        else:
+            self.arm(key, timeout[0], (timeout[2], timeout[1]))
+
+    def collect(self, now=None):
+        """
+        Remove the due timers and return them, without calling the handler
+
+        :param now: the time, the time of the clock if not set
+        :type now: float
+        :return: the keys and values of the due timers
+        :rtype: list of tuple
+        """
+
+        tick = int((self.clock() if now is None else now) / self.resolution)
+        if tick <= self.tick:
+            return []
+
+        slots = self.slots
+        timers = self.timers
+        first = max(self.tick + 1, tick - len(slots) + 1)
+        due = []
+        for current in range(first, tick + 1):
+            slot = slots[current % len(slots)]
+            if slot:
+                for key in [key for key, entry in slot.items() if entry[0] <= tick]:
+                    due.append((key, slot.pop(key)[1]))
+                    del timers[key]
+
+        self.tick = tick
+        return due
+
+    def poll(self, now=None):
+        """
+        Fire the due timers, the handler is called once with all of them
+
+        :param now: the time, the time of the clock if not set
+        :type now: float
+        :return: the number of fired timers
+        :rtype: int
+        """
+
+        due = self.collect(now)
+        if due:
+            self.handler(due)
+        return len(due)
+
+
+def fireMachines(due):
+    """
+    Do the timeout transitions of machines. The keys are the machines and the values the id of the state owning the
+    timeout and the event id, a machine that left the state in the meantime is skipped. A failed transition is logged
+    and does not stop the others.
+
+    :param due: the keys and values of the due timers
+    :type due: list of tuple
+    :return: the awaitables of asyncio machines
+    :rtype: list
+    """
+
+    awaitables = []
+    for machine, (ownerid, eventid) in due:
+        try:
+            result = machine.timeout(ownerid, eventid)
+        except Exception:
+            logger.exception("Timeout of machine %s failed", machine.getId())
+            continue
+        if result is not None and isawaitable(result):
+            awaitables.append(result)
+    return awaitables
+
+
+async def runAsync(wheel, interval=None):
+    """
+    Drive a timer wheel in the asyncio event loop. The due timers are fired every interval and the timeout transitions
+    of asyncio machines are awaited concurrently. Other results of the handler, like the ids of the instances a store
+    could not transit, are ignored. Runs until it is cancelled.
+
+    *Example:*
+
+    .. code-block:: python
+
+        timers = TimerWheel()
+        SinglePlayerGame.setTimers(timers)
+        driver = asyncio.ensure_future(runAsync(timers))
+
+    :param wheel: the timer wheel
+    :type wheel: ablauf.timers.TimerWheel
+    :param interval: the time between two polls in seconds, the resolution of the wheel if not set
+    :type interval: float
+    """
+
+    if interval is None:
+        interval = wheel.getResolution()
+
+    while True:
+        due = wheel.collect()
+        if due:
+            awaitables = [result for result in wheel.handler(due) or () if isawaitable(result)]
+            if awaitables:
+                for result in await asyncio.gather(*awaitables, return_exceptions=True):
+                    if isinstance(result, Exception):
+                        logger.error("Timeout failed: %r", result)
+        await asyncio.sleep(interval)
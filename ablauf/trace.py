@@ -0,0 +1,316 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# The Trace module
+# ----------------------------------------------------------------------------------------------------------------------
+import csv
+import gzip
+import io
+import json
+
+from ablauf.table import TransitionTable
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Readers
+# ----------------------------------------------------------------------------------------------------------------------
+def openText(source):
+    """
+    Open a text file for reading, files ending with ".gz" are decompressed
+
+    :param source: the name of the file
+    :type source: string
+    :return: the file
+    """
+
+    if source.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(source, 'rb'), encoding="utf-8", newline="")
+    return open(source, 'r', encoding="utf-8", newline="")
+
+
+def readJSONL(source, instancekey="instance", eventkey="event"):
+    """
+    Read the events of a JSON lines trace, one object per line. Lines are read one by one, so the memory does not
+    grow with the size of the trace. Empty lines are skipped.
+
+    .. code-block:: javascript
+
+        {"instance": "session-1", "event": "StartGame"}
+
+    :param source: the name of the file, or an open text file
+    :type source: string or file
+    :param instancekey: the key of the instance
+    :type instancekey: string
+    :param eventkey: the key of the event
+    :type eventkey: string
+    :return: tuples of instance and event
+    :rtype: generator of tuple
+    """
+
+    tracefile = openText(source) if isinstance(source, str) else source
+    try:
+        for line in tracefile:
+            if line.strip():
+                record = json.loads(line)
+                yield record[instancekey], record[eventkey]
+    finally:
+        if tracefile is not source:
+            tracefile.close()
+
+
+def readCSV(source, instancecolumn="instance", eventcolumn="event", delimiter=","):
+    """
+    Read the events of a CSV trace with a header line. Rows are read one by one, so the memory does not grow with the
+    size of the trace.
+
+    :param source: the name of the file, or an open text file
+    :type source: string or file
+    :param instancecolumn: the name of the column of the instance
+    :type instancecolumn: string
+    :param eventcolumn: the name of the column of the event
+    :type eventcolumn: string
+    :param delimiter: the delimiter of the columns
+    :type delimiter: string
+    :return: tuples of instance and event
+    :rtype: generator of tuple
+    """
+
+    tracefile = openText(source) if isinstance(source, str) else source
+    try:
+        reader = csv.reader(tracefile, delimiter=delimiter)
+        header = next(reader, None)
+        if header is None:
+            return
+        instanceindex = header.index(instancecolumn)
+        eventindex = header.index(eventcolumn)
+        for row in reader:
+            if row:
+                yield row[instanceindex], row[eventindex]
+    finally:
+        if tracefile is not source:
+            tracefile.close()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Simulation
+# ----------------------------------------------------------------------------------------------------------------------
+class Simulation(object):
+    """
+    Runs a stream of recorded events against a definition, e.g. to check a new definition against the traffic of
+    production before rollout. The events are tuples of instance and event, from a reader or any iterator.
+
+    An instance is started in the first state on its first event. Only the actual state id of every instance is kept,
+    instances that reach a terminal state, a state without transitions like End, are removed. So the memory depends on
+    the number of running instances, not on the number of events. An instance that gets an event after it finished is
+    started again.
+
+    Nothing is logged. Callbacks are not called unless enabled. Guards are evaluated for one context that is shared
+    by all instances. No history is kept, transitions to history states are counted as invalid.
+
+    *Example:*
+
+    .. code-block:: python
+
+        simulation = Simulation(NewGame, "Menu")
+        for instance, event, sourceid, destinationid in simulation.simulate(readJSONL("events.jsonl.gz")):
+            if destinationid < 0:
+                print(instance, event, NewGame.getTable().getStateName(sourceid))
+
+        print(simulation.getReport())
+
+    :param definition: the definition
+    :type definition: ablauf.Definition
+    :param firststatename: the name of the state instances start in
+    :type firststatename: string
+    :param callbacks: call the enter, leave and transition functions
+    :type callbacks: boolean
+    :param context: the context the guards are evaluated for and the functions are called with
+    """
+
+    def __init__(self, definition, firststatename, callbacks=False, context=None):
+        """
+        A simulation of a definition.
+        """
+
+        self.table = table = definition.getTable()
+        self.firststateid, self.firstentry = table.getFirstState(firststatename)
+        self.callbacks = callbacks
+        self.context = context
+        self.states = {}
+
+        self.terminals = bytearray(table.statecount)
+        for stateid in range(table.statecount):
+            slots = table.destinations[stateid * table.eventcount:(stateid + 1) * table.eventcount]
+            if all(destinationid == TransitionTable.NONE for destinationid in slots):
+                self.terminals[stateid] = 1
+
+        self.events = 0
+        self.transits = 0
+        self.started = 0
+        self.finished = 0
+        self.unknown = {}
+        self.invalid = {}
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # getter / setter
+    # ------------------------------------------------------------------------------------------------------------------
+    def getRunningCount(self):
+        """
+        Return the number of running instances
+
+        :return: number of instances
+        :rtype: int
+        """
+
+        return len(self.states)
+
+    def getStateName(self, instance):
+        """
+        Return the name of the actual state of an instance
+
+        :param instance: the instance
+        :return: the name of the state, None if the instance is not running
+        :rtype: string
+        """
+
+        stateid = self.states.get(instance)
+        if stateid is None:
+            return None
+        return self.table.statenames[stateid]
+
+    def getReport(self):
+        """
+        Return the counts of the simulation. Invalid transitions are counted by state and event, unknown events by
+        event.
+
+        :return: the counts
+        :rtype: dict
+        """
+
+        table = self.table
+        invalid = {}
+        for slot, count in self.invalid.items():
+            stateid, eventid = divmod(slot, table.eventcount)
+            invalid[str(table.statenames[stateid]) + "." + str(table.eventnames[eventid])] = count
+
+        return {
+            "events": self.events,
+            "transits": self.transits,
+            "started": self.started,
+            "finished": self.finished,
+            "running": len(self.states),
+            "invalid": invalid,
+            "unknown": dict((str(event), count) for event, count in self.unknown.items()),
+        }
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # functions
+    # ------------------------------------------------------------------------------------------------------------------
+    def simulate(self, events):
+        """
+        Apply the events and yield the outcome of every event. The destination id is NONE for invalid transitions and
+        unknown events, the instance stays in its state.
+
+        :param events: tuples of instance and event
+        :type events: iterable of tuple
+        :return: tuples of instance, event, source state id and destination state id
+        :rtype: generator of tuple
+        """
+
+        table = self.table
+        states = self.states
+        terminals = self.terminals
+        eventids = table.eventids
+        eventcount = table.eventcount
+        destinations = table.destinations
+        guarded = TransitionTable.GUARDED
+        none = TransitionTable.NONE
+        callbacks = self.callbacks
+        firststateid = self.firststateid
+
+        for instance, event in events:
+            self.events += 1
+            stateid = states.get(instance)
+            if stateid is None:
+                stateid = states[instance] = firststateid
+                self.started += 1
+                if callbacks:
+                    self.start()
+
+            eventid = eventids.get(event)
+            if eventid is None:
+                self.unknown[event] = self.unknown.get(event, 0) + 1
+                yield instance, event, stateid, none
+                continue
+
+            slot = stateid * eventcount + eventid
+            destinationid = destinations[slot]
+            function = None
+            if destinationid == guarded:
+                candidate = table.choose(slot, self.context)
+                if candidate is not None:
+                    destinationid, function = candidate
+                else:
+                    destinationid = none
+            elif callbacks and destinationid >= 0:
+                function = table.functions[slot]
+
+            if destinationid < 0:
+                self.invalid[slot] = self.invalid.get(slot, 0) + 1
+                yield instance, event, stateid, none
+                continue
+
+            if callbacks:
+                self.call(stateid, function, destinationid)
+            self.transits += 1
+            if terminals[destinationid]:
+                del states[instance]
+                self.finished += 1
+            else:
+                states[instance] = destinationid
+            yield instance, event, stateid, destinationid
+
+    def replay(self, events):
+        """
+        Apply all events and return the report, the outcomes of the single events are dropped
+
+        :param events: tuples of instance and event
+        :type events: iterable of tuple
+        :return: the report, see getReport
+        :rtype: dict
+        """
+
+        for _ in self.simulate(events):
+            pass
+        return self.getReport()
+
+    def start(self):
+        """
+        Call the enter functions of the first state
+        """
+
+        if self.firstentry is not None:
+            self.firstentry(self.context, None)
+        enter = self.table.enters[self.firststateid]
+        if enter is not None:
+            enter(self.context, None)
+
+    def call(self, stateid, function, destinationid):
+        """
+        Call the leave function of the source state, the transition function and the enter function of the
+        destination state
+
+        :param stateid: the id of the source state
+        :type stateid: int
+        :param function: the transition function
+        :type function: function
+        :param destinationid: the id of the destination state
+        :type destinationid: int
+        """
+
+        leave = self.table.leaves[stateid]
+        if leave is not None:
+            leave(self.context, None)
+        if function is not None:
+            function(self.context, None)
+        enter = self.table.enters[destinationid]
+        if enter is not None:
+            enter(self.context, None)
@@ -0,0 +1,118 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Definitions used by the tests
+# ----------------------------------------------------------------------------------------------------------------------
+from ablauf import Definition, State, Transition
+
+
+def record(calls, name):
+    """
+    Return a function without parameters that appends a name to the list of calls
+
+    :param calls: the list of calls
+    :type calls: list
+    :param name: the name to append
+    :type name: string
+    :return: the function
+    :rtype: function
+    """
+
+    return lambda: calls.append(name)
+
+
+def transit(machine, calls, event):
+    """
+    Do a transition and return the calls it made
+
+    :param machine: the machine
+    :type machine: ablauf.machine.Machine
+    :param calls: the list of calls the functions of the definition append to
+    :type calls: list
+    :param event: the name of the event
+    :type event: string
+    :return: the calls of the transition
+    :rtype: list
+    """
+
+    del calls[:]
+    machine.transit(event)
+    return list(calls)
+
+
+def buildFlat(name="Flat"):
+    """
+    Build a definition with the states A and B, A goes to B with "go", B goes back with "back" and ends with "finish"
+
+    :param name: the name of the definition
+    :type name: string
+    :return: the definition
+    :rtype: ablauf.Definition
+    """
+
+    definition = Definition(name)
+    State("A", definition).addTransition(Transition("go", "B", None))
+    B = State("B", definition)
+    B.addTransition(Transition("back", "A", None))
+    B.addTransition(Transition("finish", "End", None))
+    return definition
+
+
+def buildGame(kind="shallow", calls=None):
+    """
+    Build a hierarchical definition with a history state:
+
+    Menu -Start-> Game, Game has the children Playing and Paused and the history state GameHistory, Playing has the
+    children Level1 and Level2. Game -ShowOptions-> Options -BackToGame-> GameHistory.
+
+    :param kind: the kind of the history state, "shallow" or "deep"
+    :type kind: string
+    :param calls: the list the enter and leave functions append to, no functions if not set
+    :type calls: list
+    :return: the definition
+    :rtype: ablauf.Definition
+    """
+
+    definition = Definition("Game")
+    for statename in ["Menu", "Game", "Playing", "Level1", "Level2", "Paused", "Options", "GameHistory"]:
+        state = State(statename, definition)
+        if calls is not None:
+            state.setEnterFunction(record(calls, "enter " + statename))
+            state.setLeaveFunction(record(calls, "leave " + statename))
+
+    Game = definition.getState("Game")
+    Game.setInitialState("Playing")
+    for statename in ["Playing", "Paused", "GameHistory"]:
+        definition.getState(statename).setParent("Game")
+    Playing = definition.getState("Playing")
+    Playing.setInitialState("Level1")
+    for statename in ["Level1", "Level2"]:
+        definition.getState(statename).setParent("Playing")
+    definition.getState("GameHistory").setHistory(kind)
+
+    definition.getState("Menu").addTransition(Transition("Start", "Game", None))
+    definition.getState("Level1").addTransition(Transition("Next", "Level2", None))
+    Playing.addTransition(Transition("Pause", "Paused", None))
+    definition.getState("Paused").addTransition(Transition("Resume", "Playing", None))
+    Game.addTransition(Transition("ShowOptions", "Options", None))
+    Options = definition.getState("Options")
+    Options.addTransition(Transition("BackToGame", "GameHistory", None))
+    Options.addTransition(Transition("Quit", "End", None))
+    return definition
+
+
+def buildApproval():
+    """
+    Build a definition with a guarded transition: Menu -Submit-> Approved if the amount is below 1000, Blocked if the
+    country is XX, Review otherwise. All of them go back to Menu with "Reset".
+
+    :return: the definition
+    :rtype: ablauf.Definition
+    """
+
+    definition = Definition("Approval")
+    Menu = State("Menu", definition)
+    Menu.addTransition(Transition("Submit", "Approved", None, "amount < 1000"))
+    Menu.addTransition(Transition("Submit", "Blocked", None, lambda context: context.country == "XX"))
+    Menu.addTransition(Transition("Submit", "Review", None))
+    for statename in ["Approved", "Blocked", "Review"]:
+        State(statename, definition).addTransition(Transition("Reset", "Menu", None))
+    return definition
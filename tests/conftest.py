@@ -0,0 +1,23 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Fixtures of the tests
+# ----------------------------------------------------------------------------------------------------------------------
+import pytest
+
+from ablauf import Automate
+
+
+@pytest.fixture
+def automate():
+    """
+    The Automate singleton without states, reset again after the test
+    """
+
+    def reset():
+        Automate.states = {}
+        Automate.actualstate = None
+        Automate.table = None
+        Automate.history = None
+
+    reset()
+    yield Automate
+    reset()
@@ -0,0 +1,80 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of the asyncio machines
+# ----------------------------------------------------------------------------------------------------------------------
+import asyncio
+
+import pytest
+
+from ablauf import AsyncMachine, Definition, State, Transition
+from tests.builders import buildFlat, buildGame
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def testCoroutinesAreAwaited():
+    definition = Definition("Async")
+    calls = []
+
+    async def leaveA(context, payload):
+        await asyncio.sleep(0)
+        calls.append(("leave A", payload))
+
+    A = State("A", definition)
+    A.setLeaveFunction(leaveA)
+    A.addTransition(Transition("go", "B", lambda: calls.append("go")))
+    B = State("B", definition)
+
+    async def enterB():
+        await asyncio.sleep(0)
+        calls.append("enter B")
+
+    B.setEnterFunction(enterB)
+
+    async def play():
+        machine = AsyncMachine(definition)
+        await machine.start("A")
+        await machine.transit("go", "payload")
+        return machine.getActualStateName()
+
+    assert run(play()) == "B"
+    assert calls == [("leave A", "payload"), "go", "enter B"]
+
+
+def testTransitsOfOneMachineAreOrdered():
+    definition = buildFlat()
+
+    async def play():
+        machine = AsyncMachine(definition)
+        await machine.start("A")
+        await asyncio.gather(machine.transit("go"), machine.transit("back"), machine.transit("go"))
+        return machine.getActualStateName()
+
+    assert run(play()) == "B"
+
+
+def testTransitBeforeStartRaises():
+    definition = buildFlat()
+
+    async def play():
+        machine = AsyncMachine(definition)
+        with pytest.raises(KeyError):
+            await machine.transit("back")
+        return machine.getActualStateId()
+
+    assert run(play()) == -1
+
+
+def testProcessAndHistory():
+    definition = buildGame("deep")
+
+    async def play():
+        machine = AsyncMachine(definition)
+        await machine.start("Menu")
+        for event in ["Start", "Next", "ShowOptions", "BackToGame"]:
+            machine.post(event)
+        assert await machine.process() == 4
+        return machine.getActualStateName()
+
+    assert run(play()) == "Level2"
@@ -0,0 +1,83 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of the transition matrix
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+
+import pytest
+
+from ablauf import journal
+from ablauf.analytics import TransitionMatrix
+from ablauf.journal import Journal
+from ablauf.trace import Simulation
+from tests.builders import buildFlat
+
+pytest.importorskip("numpy")
+
+
+def testCounts():
+    table = buildFlat().getTable()
+    A, B, End = table.getStateId("A"), table.getStateId("B"), table.getStateId("End")
+    go, back, finish = table.getEventId("go"), table.getEventId("back"), table.getEventId("finish")
+    matrix = TransitionMatrix(table)
+
+    matrix.add([A, B, A, B, A], [go, back, go, finish, go], [B, A, B, End, -1])
+    matrix.add([A], [go], [B])
+
+    sourceids, destinationids, counts = matrix.getCounts()
+    assert sorted(zip(sourceids.tolist(), destinationids.tolist(), counts.tolist())) == \
+        sorted([(A, B, 3), (B, A, 1), (B, End, 1)])
+    assert matrix.getHotTransitions(2) == [("A", "go", 3, 0.6), ("B", "back", 1, 0.2)]
+
+
+def testHotPath():
+    simulation = Simulation(buildFlat(), "A")
+    matrix = TransitionMatrix(simulation.table)
+    events = []
+    for index in range(10):
+        events.extend([(index, "go"), (index, "finish" if index % 3 else "back")])
+    matrix.addOutcomes(simulation.simulate(events))
+
+    assert [(event, statename) for event, statename, share in matrix.getHotPath("A")] == \
+        [("go", "B"), ("finish", "End")]
+
+
+def writeJournal(filename, definition):
+    transitions = Journal(filename, definition.getTable())
+    definition.setJournal(transitions)
+    for _ in range(5):
+        machine = definition.createMachine()
+        machine.start("A")
+        machine.transit("go")
+        machine.transit("back")
+    definition.setJournal(None)
+    transitions.close()
+
+
+def testJournal(tmp_path):
+    definition = buildFlat()
+    filename = str(tmp_path / "flat.journal")
+    writeJournal(filename, definition)
+
+    matrix = TransitionMatrix(definition.getTable())
+    matrix.addJournal(filename, chunksize=3)
+    assert sorted((statename, event, count) for statename, event, count, share in matrix.getHotTransitions()) == \
+        [("A", "go", 5), ("B", "back", 5)]
+
+
+def testTornLastRecordIsSkipped(tmp_path):
+    definition = buildFlat()
+    filename = str(tmp_path / "flat.journal")
+    writeJournal(filename, definition)
+    with open(filename, 'r+b') as journalfile:
+        journalfile.truncate(os.path.getsize(filename) - 10)
+
+    matrix = TransitionMatrix(definition.getTable())
+    matrix.addJournal(filename)
+    assert sorted((statename, event, count) for statename, event, count, share in matrix.getHotTransitions()) == \
+        [("A", "go", 5), ("B", "back", 4)]
+
+    with open(filename, 'r+b') as journalfile:
+        journalfile.truncate(journal.HEADER.size + 10)
+    matrix = TransitionMatrix(definition.getTable())
+    matrix.addJournal(filename)
+    assert matrix.getHotTransitions() == []
@@ -0,0 +1,76 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of the Automate singleton
+# ----------------------------------------------------------------------------------------------------------------------
+import pytest
+
+import ablauf.table
+from ablauf import State, Transition
+
+
+def buildStates(calls):
+    A = State("A")
+    A.setLeaveFunction(lambda: calls.append("leave A"))
+    A.addTransition(Transition("go", "B", lambda context, payload: calls.append(("go", payload))))
+    B = State("B")
+    B.setEnterFunction(lambda context: calls.append("enter B"))
+    B.addTransition(Transition("back", "A", None))
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def testTransit(automate, compiled):
+    calls = []
+    buildStates(calls)
+    automate.start("A", None)
+    if compiled:
+        automate.compile()
+
+    automate.transit("go", 7)
+    assert automate.getActualState().getName() == "B"
+    assert calls == ["leave A", ("go", 7), "enter B"]
+
+    automate.transit("back")
+    assert automate.getActualState().getName() == "A"
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def testCallbacksAreNotInspectedOnTransit(automate, monkeypatch, compiled):
+    calls = []
+    buildStates(calls)
+    automate.start("A", None)
+    if compiled:
+        automate.compile()
+
+    def fail(function):
+        raise AssertionError("signature inspected on transit")
+
+    monkeypatch.setattr(ablauf.table, "signature", fail)
+    for _ in range(3):
+        automate.transit("go")
+        automate.transit("back")
+    assert calls.count("enter B") == 3
+
+
+def testCompiledTransitBeforeStartRaises(automate):
+    State("A").addTransition(Transition("go", "B", None))
+    State("B")
+    automate.compile()
+
+    with pytest.raises(KeyError):
+        automate.transit("go")
+
+
+def testChangingAStateDropsTheCompiledTable(automate):
+    calls = []
+    buildStates(calls)
+    automate.start("A", None)
+    automate.compile()
+
+    automate.getState("B").addTransition(Transition("finish", "A", None))
+    automate.getState("A").setEnterFunction(lambda: calls.append("enter A"))
+    assert automate.getTable() is None
+    automate.compile()
+
+    automate.transit("go")
+    automate.transit("finish")
+    assert automate.getActualState().getName() == "A"
+    assert calls[-1] == "enter A"
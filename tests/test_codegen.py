@@ -0,0 +1,100 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of the code generation
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import stat
+
+import pytest
+
+from ablauf.codegen import generate, getCacheDir, getKey, specialize
+from tests.builders import buildFlat, buildGame
+
+posix = pytest.mark.skipif(not hasattr(os, "getuid"), reason="needs user ids")
+
+
+def testSpecializedTransitMatchesTheMachine(tmp_path):
+    calls = []
+    definition = buildGame("deep", calls)
+    transit = specialize(definition, str(tmp_path))
+    events = ["Start", "Next", "ShowOptions", "BackToGame", "Pause", "ShowOptions", "BackToGame", "Resume"]
+
+    expected = definition.createMachine()
+    expected.start("Menu")
+    for event in events:
+        expected.transit(event)
+    expectedcalls = list(calls)
+
+    del calls[:]
+    machine = definition.createMachine()
+    machine.start("Menu")
+    for event in events:
+        transit(machine, event)
+
+    assert machine.getActualStateName() == expected.getActualStateName()
+    assert calls == expectedcalls
+
+
+def testSpecializedTransitPassesContextAndPayload(tmp_path):
+    definition = buildFlat()
+    payloads = []
+    definition.getState("B").setEnterFunction(lambda context, payload: payloads.append((context, payload)))
+    transit = specialize(definition, str(tmp_path))
+
+    machine = definition.createMachine("session")
+    machine.start("A")
+    transit(machine, "go", 5)
+    assert payloads == [("session", 5)]
+
+
+def testSpecializedTransitRaises(tmp_path):
+    definition = buildFlat()
+    transit = specialize(definition, str(tmp_path))
+    machine = definition.createMachine()
+
+    with pytest.raises(KeyError):
+        transit(machine, "back")
+    assert machine.getActualStateId() == -1
+
+    machine.start("A")
+    with pytest.raises(KeyError):
+        transit(machine, "back")
+    assert machine.getActualStateName() == "A"
+
+
+def testKeyChangesWithTheFunctions():
+    first = buildFlat()
+    second = buildFlat()
+    second.getState("A").setEnterFunction(lambda: None)
+
+    assert getKey(first.getTable()) == getKey(buildFlat().getTable())
+    assert getKey(first.getTable()) != getKey(second.getTable())
+    compile(generate(second.getTable()), "generated", "exec")
+
+
+@posix
+def testDefaultCacheIsPrivate():
+    definition = buildFlat()
+    specialize(definition)
+
+    status = os.stat(getCacheDir())
+    assert status.st_uid == os.getuid()
+    assert stat.S_IMODE(status.st_mode) & 0o077 == 0
+
+
+@posix
+def testWritableCacheIsRefused(tmp_path):
+    os.chmod(str(tmp_path), 0o777)
+
+    with pytest.raises(PermissionError):
+        specialize(buildFlat(), str(tmp_path))
+
+
+@posix
+def testWritableModuleIsRefused(tmp_path):
+    definition = buildFlat()
+    specialize(definition, str(tmp_path))
+    filename = os.path.join(str(tmp_path), "ablauf_" + getKey(definition.getTable()) + ".py")
+    os.chmod(filename, 0o666)
+
+    with pytest.raises(PermissionError):
+        specialize(definition, str(tmp_path))
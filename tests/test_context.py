@@ -0,0 +1,106 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of contexts and event payloads
+# ----------------------------------------------------------------------------------------------------------------------
+import pickle
+
+import pytest
+
+from ablauf import Definition, State, Transition, defineContext
+from ablauf.table import ContextCallback, LegacyCallback, adaptCallback
+
+Session = defineContext("Session", ["user", "score", "items"], {"score": 0, "items": list})
+
+
+def legacy():
+    return "legacy"
+
+
+def contextOnly(context):
+    return context
+
+
+def both(context, payload):
+    return context, payload
+
+
+def testDefineContext():
+    session = Session(user="anna")
+
+    assert (session.user, session.score, session.items) == ("anna", 0, [])
+    assert not hasattr(session, "__dict__")
+    assert Session().items is not Session().items
+    assert repr(session) == "Session(user='anna', score=0, items=[])"
+    with pytest.raises(AttributeError):
+        session.other = 1
+
+
+def testDefineContextChecksFields():
+    with pytest.raises(ValueError):
+        defineContext("Bad", ["user"], {"other": 1})
+    with pytest.raises(TypeError):
+        Session(other=1)
+
+
+def testContextsCanBePickled():
+    session = pickle.loads(pickle.dumps(Session(user="anna", score=3)))
+
+    assert (session.user, session.score, session.items) == ("anna", 3, [])
+
+
+def testAdaptCallback():
+    assert adaptCallback(None) is None
+    assert adaptCallback(both) is both
+    assert isinstance(adaptCallback(legacy), LegacyCallback)
+    assert isinstance(adaptCallback(contextOnly), ContextCallback)
+    assert adaptCallback(legacy)("context", "payload") == "legacy"
+    assert adaptCallback(contextOnly)("context", "payload") == "context"
+    assert pickle.loads(pickle.dumps(adaptCallback(legacy)))(None, None) == "legacy"
+
+
+def testCallbacksGetContextAndPayload():
+    definition = Definition("Payload")
+    definition.setContextType(Session)
+    calls = []
+
+    def StartGame(context, payload):
+        context.score = payload["score"]
+        calls.append("start")
+
+    Menu = State("Menu", definition)
+    Menu.addTransition(Transition("StartGame", "Game", StartGame))
+    Menu.setLeaveFunction(lambda: calls.append("leave"))
+    Game = State("Game", definition)
+    Game.setEnterFunction(lambda context: calls.append(context.user))
+
+    machine = definition.createMachine()
+    assert isinstance(machine.getContext(), Session)
+    machine.getContext().user = "anna"
+    machine.start("Menu")
+
+    machine.transit("StartGame", {"score": 42})
+    assert machine.getContext().score == 42
+    assert calls == ["leave", "start", "anna"]
+
+
+def testPostedEventsKeepTheirPayload():
+    definition = Definition("Posted")
+    payloads = []
+    State("A", definition).addTransition(Transition("go", "B", lambda context, payload: payloads.append(payload)))
+    State("B", definition).addTransition(Transition("back", "A", lambda context, payload: payloads.append(payload)))
+
+    machine = definition.createMachine()
+    machine.start("A")
+    machine.post("go", 1)
+    machine.post("back")
+    machine.post("go", 3)
+    machine.process()
+
+    assert payloads == [1, None, 3]
+
+
+def testGivenContextIsKept():
+    definition = Definition("Given")
+    definition.setContextType(Session)
+    State("A", definition)
+
+    assert definition.createMachine("context").getContext() == "context"
@@ -0,0 +1,62 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of the sharded executor
+# ----------------------------------------------------------------------------------------------------------------------
+from ablauf.executor import ShardedExecutor, ShardWorker
+from ablauf.table import TransitionTable
+from tests.builders import buildFlat, buildGame
+
+
+def testResultsAreInTheOrderOfTheEvents():
+    definition = buildFlat()
+    table = definition.getTable()
+    executor = ShardedExecutor(definition, "A", shards=1, batchsize=1)
+    try:
+        events = [("session", "go" if index % 2 == 0 else "back") for index in range(40)]
+        results = list(executor.map(events))
+    finally:
+        executor.shutdown()
+
+    expected = [table.getStateId("B") if index % 2 == 0 else table.getStateId("A") for index in range(40)]
+    assert [stateid for key, stateid in results] == expected
+
+
+def testInstancesAreKeptPerShard():
+    definition = buildFlat()
+    table = definition.getTable()
+    executor = ShardedExecutor(definition, "A", shards=2, batchsize=3)
+    try:
+        events = [(key, event) for event in ["go", "back", "go"] for key in range(5)]
+        results = list(executor.map(events))
+        states = executor.getStates()
+    finally:
+        executor.shutdown()
+
+    for key in range(5):
+        assert [stateid for resultkey, stateid in results if resultkey == key] == \
+            [table.getStateId("B"), table.getStateId("A"), table.getStateId("B")]
+    assert states == dict((key, table.getStateId("B")) for key in range(5))
+
+
+def testWorkerReportsInvalidTransitions():
+    worker = ShardWorker(buildFlat(), "A")
+
+    assert worker.process([("session", "back", None)]) == [("session", TransitionTable.NONE)]
+
+
+def testWorkerReportsUnknownEventsAndContinues():
+    definition = buildFlat()
+    worker = ShardWorker(definition, "A")
+
+    assert worker.process([("session", "jump", None), ("session", "go", None)]) == \
+        [("session", TransitionTable.NONE), ("session", definition.getTable().getStateId("B"))]
+
+
+def testWorkerResumesHistory():
+    definition = buildGame("deep")
+    table = definition.getTable()
+    worker = ShardWorker(definition, "Menu")
+    worker.process([("first", "Start", None), ("first", "Next", None), ("second", "Start", None)])
+
+    results = worker.process([(key, event, None) for event in ["ShowOptions", "BackToGame"]
+                              for key in ("first", "second")])
+    assert results[2:] == [("first", table.getStateId("Level2")), ("second", table.getStateId("Level1"))]
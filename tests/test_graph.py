@@ -0,0 +1,97 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of the graph index
+# ----------------------------------------------------------------------------------------------------------------------
+from ablauf import Definition, State, Transition
+from ablauf.graph import GraphIndex
+from tests.builders import buildGame
+
+
+def buildComponents():
+    """
+    Build a definition with the cycles A-B-C and D-E, C leads to D and E ends, F is a dead end reached from A
+    """
+
+    definition = Definition("Components")
+    for source, event, destination in [("A", "ab", "B"), ("B", "bc", "C"), ("C", "ca", "A"), ("C", "cd", "D"),
+                                       ("D", "de", "E"), ("E", "ed", "D"), ("E", "finish", "End"), ("A", "af", "F")]:
+        state = definition.getState(source) if source in definition.getStates() else State(source, definition)
+        state.addTransition(Transition(event, destination, None))
+    State("F", definition)
+    State("End", definition)
+    return definition
+
+
+def testComponents():
+    definition = buildComponents()
+    index = GraphIndex(definition.getTable())
+    table = definition.getTable()
+    component = dict((statename, index.component[table.getStateId(statename)]) for statename in table.statenames)
+
+    assert component["A"] == component["B"] == component["C"]
+    assert component["D"] == component["E"]
+    assert len(set(component.values())) == 4
+
+
+def testLongChainIsNotRecursive():
+    definition = Definition("Chain")
+    for index in range(5000):
+        State("S%d" % index, definition).addTransition(Transition("next", "S%d" % ((index + 1) % 5000), None))
+
+    table = definition.getTable()
+    index = GraphIndex(table)
+    assert len(set(index.component[table.getStateId("S%d" % number)] for number in range(5000))) == 1
+    assert index.canReach("S4999", "S0")
+
+
+def testReachability():
+    index = GraphIndex(buildComponents().getTable())
+
+    assert index.canReach("A", "End")
+    assert index.canReach("A", "A")
+    assert not index.canReach("D", "A")
+    assert sorted(index.getReachable("D")) == ["D", "E", "End"]
+    assert sorted(index.getTerminalStates()) == ["End", "F"]
+    assert index.canFinish("D")
+    assert sorted(index.getFinishingStates()) == ["A", "B", "C", "D", "E", "End", "F"]
+
+
+def testShortestPath():
+    index = GraphIndex(buildComponents().getTable())
+
+    assert index.getShortestPath("A", "End") == ["ab", "bc", "cd", "de", "finish"]
+    assert index.getShortestPath("A", "A") == []
+    assert index.getShortestPath("D", "A") is None
+
+
+def testPathsOfFewTargetsAreKept():
+    definition = Definition("Ring")
+    for index in range(32):
+        State("S%d" % index, definition).addTransition(Transition("next", "S%d" % ((index + 1) % 32), None))
+    index = GraphIndex(definition.getTable(), maxpaths=8)
+
+    for target in range(32):
+        assert len(index.getShortestPath("S0", "S%d" % target)) == target
+    assert len(index.paths) == 8
+    assert index.getShortestPath("S5", "S2") == ["next"] * 29
+
+def testParentStatesAreReachedWithTheirChildStates():
+    definition = buildGame()
+    index = GraphIndex(definition.getTable())
+
+    assert index.canReach("Menu", "Game")
+    assert index.canReach("Menu", "Level2")
+    assert index.canReach("Game", "Options")
+    assert not index.canReach("Options", "Menu")
+    assert index.getShortestPath("Menu", "Game") == ["Start"]
+    assert index.getShortestPath("Menu", "Paused") == ["Start", "Pause"]
+    assert index.getShortestPath("Game", "Game") == []
+    assert index.getShortestPath("Options", "Menu") is None
+    assert "Game" in index.getReachable("Menu")
+    assert index.getTerminalStates() == ["End"]
+    assert index.canFinish("Game")
+
+    machine = definition.createMachine()
+    machine.start("Menu")
+    assert machine.transitTo("Game") == ["Start"]
+    assert machine.getActualStateName() == "Level1"
+    assert machine.transitTo("Playing") == []
@@ -0,0 +1,85 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of guarded transitions
+# ----------------------------------------------------------------------------------------------------------------------
+import pytest
+
+from ablauf import Definition, Guard, State, Transition
+from ablauf.guard import compileExpression
+from tests.builders import buildApproval
+
+
+class Order(object):
+
+    def __init__(self, amount, country="DE"):
+        self.amount = amount
+        self.customer = self
+        self.country = country
+
+
+@pytest.mark.parametrize("expression, amount, country, expected", [
+    ("amount < 1000", 999, "DE", True),
+    ("amount < 1000", 1000, "DE", False),
+    ("amount >= 1000", 1000, "DE", True),
+    ("amount == 5", 5, "DE", True),
+    ("amount != 5", 5, "DE", False),
+    ("customer.country in ('DE', 'AT')", 0, "AT", True),
+    ("customer.country not in ('DE', 'AT')", 0, "AT", False),
+    ("country is None", 0, None, True),
+    ("country is not None", 0, None, False),
+])
+def testCompileExpression(expression, amount, country, expected):
+    assert compileExpression(expression)(Order(amount, country)) is expected
+
+
+@pytest.mark.parametrize("expression", ["amount <", "amount < limit", "__import__('os') == 1", "amount + 1 < 2"])
+def testInvalidExpressionsAreRejected(expression):
+    with pytest.raises(ValueError):
+        compileExpression(expression)
+
+
+def testGuardCountsHitsAndMisses():
+    guard = Guard("amount < 1000")
+
+    assert guard.test(Order(10))
+    assert not guard.test(Order(5000))
+    assert (guard.getHits(), guard.getMisses()) == (1, 1)
+    guard.reset()
+    assert (guard.getHits(), guard.getMisses()) == (0, 0)
+
+
+@pytest.mark.parametrize("amount, country, statename", [
+    (10, "DE", "Approved"),
+    (5000, "XX", "Blocked"),
+    (5000, "DE", "Review"),
+])
+def testFirstHoldingCandidateIsTaken(amount, country, statename):
+    machine = buildApproval().createMachine(Order(amount, country))
+    machine.start("Menu")
+
+    machine.transit("Submit")
+    assert machine.getActualStateName() == statename
+
+
+def testNoHoldingGuardRaises():
+    definition = Definition("Strict")
+    State("Menu", definition).addTransition(Transition("Submit", "Approved", None, "amount < 1000"))
+    State("Approved", definition)
+
+    machine = definition.createMachine(Order(5000))
+    machine.start("Menu")
+    with pytest.raises(KeyError):
+        machine.transit("Submit")
+    assert machine.getActualStateName() == "Menu"
+
+
+def testShadowedCandidatesAreReported():
+    definition = Definition("Shadowed")
+    Menu = State("Menu", definition)
+    Menu.addTransition(Transition("Submit", "Review", None))
+    Menu.addTransition(Transition("Submit", "Approved", None, "amount < 1000"))
+    State("Review", definition)
+    State("Approved", definition)
+
+    validation = definition.validate()
+    assert validation.isValid()
+    assert validation.shadowed == [("Menu", "Submit", "Approved")]
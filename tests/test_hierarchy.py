@@ -0,0 +1,44 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of hierarchical states
+# ----------------------------------------------------------------------------------------------------------------------
+from ablauf import Definition, State, Transition
+from tests.builders import buildGame, transit
+
+
+def testParentsAreEnteredDownTheInitialStates():
+    calls = []
+    machine = buildGame(calls=calls).createMachine()
+    machine.start("Menu")
+
+    assert transit(machine, calls, "Start") == ["leave Menu", "enter Game", "enter Playing", "enter Level1"]
+    assert machine.getActualStateName() == "Level1"
+
+
+def testTransitionsLeaveUpToTheCommonAncestor():
+    calls = []
+    machine = buildGame(calls=calls).createMachine()
+    machine.start("Menu")
+    machine.transit("Start")
+
+    assert transit(machine, calls, "Next") == ["leave Level1", "enter Level2"]
+    assert transit(machine, calls, "Pause") == ["leave Level2", "leave Playing", "enter Paused"]
+    assert transit(machine, calls, "Resume") == ["leave Paused", "enter Playing", "enter Level1"]
+    assert transit(machine, calls, "ShowOptions") == ["leave Level1", "leave Playing", "leave Game", "enter Options"]
+
+
+def testChildStatesInheritTransitions():
+    machine = buildGame().createMachine()
+    machine.start("Menu")
+    machine.transit("Start")
+
+    machine.transit("ShowOptions")
+    assert machine.getActualStateName() == "Options"
+
+
+def testInitialStateMustBeAChild():
+    definition = Definition("Initial")
+    State("Parent", definition).setInitialState("Other")
+    State("Other", definition).addTransition(Transition("go", "Parent", None))
+    State("Child", definition).setParent("Parent")
+
+    assert not definition.validate().isValid()
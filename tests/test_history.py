@@ -0,0 +1,89 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of history states
+# ----------------------------------------------------------------------------------------------------------------------
+import pytest
+
+from ablauf import Definition, DefinitionError, State, Transition
+from tests.builders import buildGame, transit
+
+
+def testShallowHistoryEntersTheInitialStateOfTheRememberedChild():
+    calls = []
+    machine = buildGame("shallow", calls).createMachine()
+    machine.start("Menu")
+    machine.transit("Start")
+    machine.transit("Next")
+    machine.transit("ShowOptions")
+
+    assert transit(machine, calls, "BackToGame") == ["leave Options", "enter Game", "enter Playing", "enter Level1"]
+    assert machine.getActualStateName() == "Level1"
+
+    machine.transit("Pause")
+    machine.transit("ShowOptions")
+    assert transit(machine, calls, "BackToGame") == ["leave Options", "enter Game", "enter Paused"]
+
+
+def testDeepHistoryEntersTheRememberedState():
+    machine = buildGame("deep").createMachine()
+    machine.start("Menu")
+    for event in ["Start", "Next", "ShowOptions", "BackToGame"]:
+        machine.transit(event)
+
+    assert machine.getActualStateName() == "Level2"
+
+
+def testHistoryWithoutMemoryEntersTheInitialState():
+    machine = buildGame("deep").createMachine()
+    machine.start("Options")
+    machine.transit("BackToGame")
+
+    assert machine.getActualStateName() == "Level1"
+
+
+def testHistoryIsPerMachine():
+    definition = buildGame("deep")
+    first = definition.createMachine()
+    second = definition.createMachine()
+    for machine in (first, second):
+        machine.start("Menu")
+        machine.transit("Start")
+    first.transit("Next")
+    for machine in (first, second):
+        machine.transit("ShowOptions")
+        machine.transit("BackToGame")
+
+    assert first.getActualStateName() == "Level2"
+    assert second.getActualStateName() == "Level1"
+    assert len(first.history) == definition.getTable().historycount == 1
+
+
+def testHistoryNeedsAParent():
+    definition = Definition("Orphan")
+    State("History", definition).setHistory("deep")
+
+    assert not definition.validate().isValid()
+    with pytest.raises(DefinitionError):
+        definition.freeze()
+
+
+def testHistoryKindIsChecked():
+    with pytest.raises(ValueError):
+        State("History", Definition("Kind")).setHistory("sideways")
+
+
+def testHistoryResumesInCompiledAutomate(automate):
+    for statename in ["Menu", "Game", "Level1", "Level2", "Options", "GameHistory"]:
+        State(statename)
+    automate.getState("Game").setInitialState("Level1")
+    for statename in ["Level1", "Level2", "GameHistory"]:
+        automate.getState(statename).setParent("Game")
+    automate.getState("GameHistory").setHistory("shallow")
+    automate.getState("Menu").addTransition(Transition("Start", "Game", None))
+    automate.getState("Level1").addTransition(Transition("Next", "Level2", None))
+    automate.getState("Game").addTransition(Transition("ShowOptions", "Options", None))
+    automate.getState("Options").addTransition(Transition("BackToGame", "GameHistory", None))
+
+    automate.start("Menu", None)
+    for event in ["Start", "Next", "ShowOptions", "BackToGame"]:
+        automate.transit(event)
+    assert automate.getActualState().getName() == "Level2"
@@ -0,0 +1,126 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of the instrumentation
+# ----------------------------------------------------------------------------------------------------------------------
+import pytest
+
+from ablauf import InstanceStore
+from ablauf.instrument import Histogram, Instrumentation
+from ablauf.journal import MACHINES
+from tests.builders import buildFlat
+
+
+class Clock(object):
+    """
+    A clock that advances by one millisecond on every call
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 0.001
+        return self.now
+
+
+@pytest.mark.parametrize("seconds, bound", [
+    (0.0, 1e-06),
+    (0.5e-06, 1e-06),
+    (1e-06, 1e-06),
+    (1.5e-06, 2e-06),
+    (2e-06, 2e-06),
+    (3e-06, 4e-06),
+    (4e-06, 4e-06),
+    (1024e-06, 1024e-06),
+    (1025e-06, 2048e-06),
+])
+def testDurationsAreCountedUnderTheirInclusiveBound(seconds, bound):
+    histogram = Histogram()
+    histogram.add(seconds)
+
+    assert histogram.getSnapshot()["buckets"] == {str(bound): 1}
+
+
+def testLongDurationsAreCountedInTheLastBucket():
+    histogram = Histogram()
+    histogram.add(1e9)
+
+    assert histogram.getSnapshot()["buckets"] == {"inf": 1}
+
+
+def testTransitsAndDwellTimesAreRecorded():
+    definition = buildFlat()
+    definition.getState("B").setEnterFunction(lambda: None)
+    instrumentation = Instrumentation(definition.getTable(), clock=Clock())
+    definition.setInstrumentation(instrumentation)
+
+    machine = definition.createMachine()
+    machine.start("A")
+    machine.transit("go")
+    machine.transit("back")
+    definition.setInstrumentation(None)
+
+    snapshot = instrumentation.getSnapshot()
+    assert snapshot["transitions"]["A.go"]["count"] == 1
+    assert snapshot["transitions"]["B.back"]["count"] == 1
+    assert snapshot["states"]["B"]["enter"]["count"] == 1
+    assert snapshot["states"]["A"]["dwell"]["count"] == 1
+    assert snapshot["states"]["B"]["dwell"]["count"] == 1
+    assert 'ablauf_transitions_total{state="A",event="go"} 1' in instrumentation.toPrometheus()
+
+
+def testEntryTimesOfFinishedInstancesAreDropped():
+    definition = buildFlat()
+    instrumentation = Instrumentation(definition.getTable(), clock=Clock())
+    definition.setInstrumentation(instrumentation)
+
+    for _ in range(100):
+        machine = definition.createMachine()
+        machine.start("A")
+        machine.transit("go")
+        machine.transit("finish")
+    store = InstanceStore(definition, 10)
+    store.start(range(10), "A")
+    store.step(range(10), ["go"] * 10)
+    store.step(range(10), ["finish"] * 10)
+
+    assert instrumentation.entered == {}
+    assert instrumentation.getSnapshot()["states"]["B"]["dwell"]["count"] == 110
+
+
+def testForget():
+    definition = buildFlat()
+    instrumentation = Instrumentation(definition.getTable(), clock=Clock())
+    definition.setInstrumentation(instrumentation)
+    machine = definition.createMachine()
+    machine.start("A")
+
+    store = InstanceStore(definition, 1, "A")
+    store.transit([0], "go")
+
+    assert (MACHINES, machine.getId()) in instrumentation.entered
+    instrumentation.forget(machine.getId())
+    assert list(instrumentation.entered) == [(store.getRecorderId(), 0)]
+    instrumentation.forget(0, store.getRecorderId())
+    assert instrumentation.entered == {}
+
+
+def testMachinesAndStoresOfTheSameIdAreTimedApart():
+    definition = buildFlat()
+    clock = Clock()
+    instrumentation = Instrumentation(definition.getTable(), clock=clock)
+    definition.setInstrumentation(instrumentation)
+    machine = definition.createMachine()
+    machine.start("A")
+    store = InstanceStore(definition, 1, "A")
+    store.transit([0], "go")
+    for _ in range(100):
+        clock()
+
+    machine.transit("go")
+    store.transit([0], "back")
+
+    assert machine.getId() == 0
+    dwell = instrumentation.getSnapshot()["states"]["B"]["dwell"]
+    assert dwell["count"] == 1
+    assert dwell["sum"] > 0.1
+    assert instrumentation.getSnapshot()["states"]["A"]["dwell"]["count"] == 1
@@ -0,0 +1,107 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of the journal
+# ----------------------------------------------------------------------------------------------------------------------
+import pytest
+
+from ablauf import InstanceStore
+from ablauf.journal import MACHINES, Journal, readRecords, replay
+from tests.builders import buildApproval, buildFlat, buildGame
+
+
+class Order(object):
+
+    def __init__(self, amount):
+        self.amount = amount
+        self.country = "DE"
+
+
+def record(definition, filename, runs, context=None):
+    journal = Journal(filename, definition.getTable(), groupsize=3)
+    definition.setJournal(journal)
+    machines = []
+    for firststatename, events in runs:
+        machine = definition.createMachine(context)
+        machine.start(firststatename)
+        for event in events:
+            machine.transit(event)
+        machines.append(machine)
+    definition.setJournal(None)
+    journal.close()
+    return machines
+
+
+def testRecordsAreWritten(tmp_path):
+    definition = buildFlat()
+    filename = str(tmp_path / "flat.journal")
+    machines = record(definition, filename, [("A", ["go", "back"])])
+    table = definition.getTable()
+
+    records = [entry[1:] for entry in readRecords(filename, table)]
+    assert records == [
+        (MACHINES, machines[0].getId(), table.getEventId("go"), table.getStateId("A"), table.getStateId("B")),
+        (MACHINES, machines[0].getId(), table.getEventId("back"), table.getStateId("B"), table.getStateId("A")),
+    ]
+
+
+def testReplayRebuildsTheStates(tmp_path):
+    definition = buildGame("deep")
+    filename = str(tmp_path / "game.journal")
+    machines = record(definition, filename, [("Menu", ["Start", "Next", "ShowOptions", "BackToGame"]),
+                                             ("Menu", ["Start", "Pause"]),
+                                             ("Menu", ["Start", "ShowOptions", "Quit"])])
+
+    states = replay(filename, definition)
+    assert states == dict((machine.getId(), machine.getActualStateId()) for machine in machines)
+
+
+def testReplayFollowsGuardedTransitions(tmp_path):
+    definition = buildApproval()
+    filename = str(tmp_path / "approval.journal")
+    machines = record(definition, filename, [("Menu", ["Submit"])], Order(5000))
+
+    assert replay(filename, definition) == {machines[0].getId(): definition.getTable().getStateId("Review")}
+
+
+def testReplayIntoStore(tmp_path):
+    definition = buildFlat()
+    filename = str(tmp_path / "flat.journal")
+    machines = record(definition, filename, [("A", ["go"]), ("A", ["go", "back"])])
+
+    store = InstanceStore(definition, max(machine.getId() for machine in machines) + 1)
+    replay(filename, definition, store, MACHINES)
+    assert [store.getStateName(machine.getId()) for machine in machines] == ["B", "A"]
+
+
+def testMachinesAndStoresAreReplayedApart(tmp_path):
+    definition = buildFlat()
+    filename = str(tmp_path / "flat.journal")
+    journal = Journal(filename, definition.getTable())
+    definition.setJournal(journal)
+    machine = definition.createMachine()
+    machine.start("A")
+    first = InstanceStore(definition, 2, "A")
+    second = InstanceStore(definition, 1, "A")
+    machine.transit("go")
+    first.transit([0, 1], "go")
+    first.transit([0], "back")
+    second.transit([0], "go")
+    second.transit([0], "finish")
+    definition.setJournal(None)
+    journal.close()
+
+    assert machine.getId() == 0
+    assert len(set([MACHINES, first.getRecorderId(), second.getRecorderId()])) == 3
+    table = definition.getTable()
+    assert replay(filename, definition) == {0: table.getStateId("B")}
+
+    restored = replay(filename, definition, InstanceStore(definition, 2, recorderid=first.getRecorderId()))
+    assert [restored.getStateName(instanceid) for instanceid in range(2)] == ["A", "B"]
+    assert replay(filename, definition, recorderid=second.getRecorderId()) == {0: table.getStateId("End")}
+
+
+def testOtherDefinitionIsRefused(tmp_path):
+    filename = str(tmp_path / "flat.journal")
+    record(buildFlat(), filename, [("A", ["go"])])
+
+    with pytest.raises(ValueError):
+        Journal(filename, buildGame().getTable())
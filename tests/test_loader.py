@@ -0,0 +1,120 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of the loader
+# ----------------------------------------------------------------------------------------------------------------------
+import json
+import os
+import stat
+
+import pytest
+
+from ablauf.context import defineContext
+from ablauf.loader import build, load
+
+posix = pytest.mark.skipif(not hasattr(os, "getuid"), reason="needs user ids")
+
+calls = []
+
+Order = defineContext("Order", ["amount"], {"amount": 0})
+
+
+def enterGame():
+    calls.append("enter Game")
+
+
+def startGame(context, payload):
+    calls.append(("start", payload))
+
+
+SPECIFICATION = {
+    "name": "Loaded",
+    "states": {
+        "Menu": {
+            "transitions": {
+                "Start": {"destination": "Game", "function": "tests.test_loader.startGame"},
+                "Submit": [
+                    {"destination": "Approved", "guard": "amount < 1000"},
+                    {"destination": "Review"}
+                ]
+            }
+        },
+        "Game": {"initial": "Level1", "enter": "tests.test_loader.enterGame", "transitions": {"Options": "Options"}},
+        "Level1": {"parent": "Game", "transitions": {"Next": "Level2"}},
+        "Level2": {"parent": "Game"},
+        "GameHistory": {"parent": "Game", "history": "shallow"},
+        "Options": {"transitions": {"Back": "GameHistory"}},
+        "Approved": {},
+        "Review": {}
+    },
+    "groups": {
+        "Level*": {"Menu": "Menu"}
+    },
+    "global": {
+        "Quit": "End"
+    }
+}
+
+
+def play(definition):
+    del calls[:]
+    machine = definition.createMachine()
+    machine.start("Menu")
+    names = []
+    for event, payload in [("Start", 3), ("Next", None), ("Options", None), ("Back", None), ("Menu", None)]:
+        machine.transit(event, payload)
+        names.append(machine.getActualStateName())
+    machine.transit("Quit")
+    names.append(machine.getActualStateName())
+    return names, list(calls)
+
+
+def approve(definition, amount):
+    machine = definition.createMachine(Order(amount=amount))
+    machine.start("Menu")
+    machine.transit("Submit")
+    return machine.getActualStateName()
+
+
+def testBuild():
+    definition = build(SPECIFICATION)
+
+    assert definition.getName() == "Loaded"
+    assert play(definition) == (["Level1", "Level2", "Options", "Level2", "Menu", "End"],
+                                [("start", 3), "enter Game", "enter Game"])
+    assert approve(definition, 10) == "Approved"
+    assert approve(definition, 5000) == "Review"
+
+
+def testWarmStartFromCache(tmp_path):
+    cachedir = str(tmp_path)
+    cold = load(SPECIFICATION, cachedir)
+    assert len(os.listdir(cachedir)) == 1
+    warm = load(SPECIFICATION, cachedir)
+
+    assert warm.getTable().statenames == cold.getTable().statenames
+    assert play(warm) == play(cold)
+    assert approve(warm, 10) == "Approved"
+    assert approve(warm, 5000) == "Review"
+
+
+@posix
+def testWritableCacheIsRefused(tmp_path):
+    cachedir = str(tmp_path)
+    load(SPECIFICATION, cachedir)
+    cachename = os.path.join(cachedir, os.listdir(cachedir)[0])
+    assert stat.S_IMODE(os.stat(cachename).st_mode) & 0o077 == 0
+
+    os.chmod(cachename, 0o666)
+    with pytest.raises(PermissionError):
+        load(SPECIFICATION, cachedir)
+    os.chmod(cachename, 0o600)
+    os.chmod(cachedir, 0o777)
+    with pytest.raises(PermissionError):
+        load(SPECIFICATION, cachedir)
+
+
+def testLoadFromFile(tmp_path):
+    filename = str(tmp_path / "loaded.json")
+    with open(filename, 'w') as specificationfile:
+        json.dump(SPECIFICATION, specificationfile)
+
+    assert play(load(filename)) == play(build(SPECIFICATION))
@@ -0,0 +1,63 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of the machines and definitions
+# ----------------------------------------------------------------------------------------------------------------------
+import pytest
+
+from ablauf import Machine
+from tests.builders import buildFlat
+
+
+def testTransitByNameAndId():
+    definition = buildFlat()
+    machine = definition.createMachine()
+    machine.start("A")
+
+    machine.transit("go")
+    assert machine.getActualStateName() == "B"
+    machine.transit(definition.getTable().getEventId("back"))
+    assert machine.getActualStateName() == "A"
+
+
+def testUnknownTransitionRaises():
+    machine = buildFlat().createMachine()
+    machine.start("A")
+
+    with pytest.raises(KeyError):
+        machine.transit("back")
+    assert machine.getActualStateName() == "A"
+
+
+def testTransitBeforeStartRaises():
+    machine = buildFlat().createMachine()
+
+    with pytest.raises(KeyError):
+        machine.transit("back")
+    assert machine.getActualStateId() == -1
+
+
+def testMachinesShareTheDefinition():
+    definition = buildFlat()
+    first = definition.createMachine()
+    second = definition.createMachine()
+    first.start("A")
+    second.start("A")
+
+    first.transit("go")
+    assert first.getActualStateName() == "B"
+    assert second.getActualStateName() == "A"
+    assert first.getId() != second.getId()
+
+
+def testTransitTo():
+    machine = buildFlat().createMachine()
+    machine.start("A")
+
+    assert machine.transitTo("End") == ["go", "finish"]
+    assert machine.getActualStateName() == "End"
+
+
+def testUnstartedMachine():
+    machine = Machine(buildFlat(), context="session")
+
+    assert machine.getContext() == "session"
+    assert machine.getActualStateName() is None
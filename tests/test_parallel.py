@@ -0,0 +1,61 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of the machines with parallel regions
+# ----------------------------------------------------------------------------------------------------------------------
+import pytest
+
+from ablauf import Definition, State, Transition
+from ablauf.parallel import ParallelDefinition
+from tests.builders import buildGame
+
+
+def buildConnection():
+    definition = Definition("Connection")
+    State("Offline", definition).addTransition(Transition("Connect", "Online", None))
+    Online = State("Online", definition)
+    Online.addTransition(Transition("Disconnect", "Offline", None))
+    Online.addTransition(Transition("Start", "Online", None))
+    return definition
+
+
+def testEventsAreDispatchedToTheRegionsThatKnowThem():
+    session = ParallelDefinition("Session", [buildGame(), buildConnection()]).createMachine()
+    session.start(["Menu", "Offline"])
+
+    assert session.transit("Connect") == 1
+    assert session.getActualStateNames() == ("Menu", "Online")
+    assert session.transit("Start") == 2
+    assert session.getActualStateNames() == ("Level1", "Online")
+    assert session.isIn("Game")
+    assert session.isIn("Online")
+
+
+def testEventNoRegionTakesRaises():
+    session = ParallelDefinition("Session", [buildGame(), buildConnection()]).createMachine()
+    session.start(["Menu", "Offline"])
+
+    with pytest.raises(KeyError):
+        session.transit("Disconnect")
+    assert session.getActualStateNames() == ("Menu", "Offline")
+
+
+def testTransitBeforeStartRaises():
+    session = ParallelDefinition("Session", [buildGame(), buildConnection()]).createMachine()
+
+    with pytest.raises(KeyError):
+        session.transit("Connect")
+
+
+def testFirstStatesMustMatchTheRegions():
+    session = ParallelDefinition("Session", [buildGame(), buildConnection()]).createMachine()
+
+    with pytest.raises(ValueError):
+        session.start(["Menu"])
+
+
+def testHistoryIsResumedInRegions():
+    session = ParallelDefinition("Session", [buildGame("deep"), buildConnection()]).createMachine()
+    session.start(["Menu", "Offline"])
+
+    for event in ["Start", "Next", "ShowOptions", "BackToGame"]:
+        session.transit(event)
+    assert session.getActualStateNames() == ("Level2", "Offline")
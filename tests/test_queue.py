@@ -0,0 +1,46 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of the run-to-completion event queue
+# ----------------------------------------------------------------------------------------------------------------------
+from ablauf import Definition, State, Transition
+from tests.builders import buildFlat
+
+
+def testPostAndProcessRunToCompletion():
+    definition = Definition("Queue")
+    calls = []
+    machines = []
+
+    A = State("A", definition)
+    A.addTransition(Transition("go", "B", None))
+    B = State("B", definition)
+    B.addTransition(Transition("back", "A", None))
+
+    def enterB():
+        calls.append("enter B")
+        machines[0].post("back")
+        machines[0].process()
+        calls.append("entered B")
+
+    B.setEnterFunction(enterB)
+    A.setEnterFunction(lambda: calls.append("enter A"))
+
+    machine = definition.createMachine()
+    machines.append(machine)
+    machine.start("A")
+    machine.post("go")
+    assert machine.getPendingCount() == 1
+
+    assert machine.process() == 2
+    assert calls == ["enter A", "enter B", "entered B", "enter A"]
+    assert machine.getActualStateName() == "A"
+
+
+def testProcessStopsAtMaxEvents():
+    machine = buildFlat().createMachine()
+    machine.start("A")
+    machine.post("go")
+    machine.post("back")
+
+    assert machine.process(maxevents=1) == 1
+    assert machine.getActualStateName() == "B"
+    assert machine.getPendingCount() == 1
\ No newline at end of file
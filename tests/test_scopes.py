@@ -0,0 +1,61 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of group and global transitions
+# ----------------------------------------------------------------------------------------------------------------------
+from ablauf import Definition, State, Transition
+
+
+def buildScoped():
+    definition = Definition("Scoped")
+    for statename in ["Menu", "Level1", "Level2", "Paused"]:
+        State(statename, definition)
+    definition.getState("Menu").addTransition(Transition("Start", "Level1", None))
+    definition.getState("Level1").addTransition(Transition("Next", "Level2", None))
+    definition.getState("Level2").addTransition(Transition("Pause", "Menu", None))
+    definition.getState("Paused").addTransition(Transition("Resume", "Level1", None))
+    definition.addGroupTransition("Level*", Transition("Pause", "Paused", None))
+    definition.addGlobalTransition(Transition("Quit", "End", None))
+    definition.addGlobalTransition(Transition("Pause", "Menu", None))
+    return definition
+
+
+def testGroupTransitionsApplyToMatchingStates():
+    machine = buildScoped().createMachine()
+    machine.start("Level1")
+
+    machine.transit("Pause")
+    assert machine.getActualStateName() == "Paused"
+
+
+def testOwnTransitionsComeFirst():
+    machine = buildScoped().createMachine()
+    machine.start("Level2")
+
+    machine.transit("Pause")
+    assert machine.getActualStateName() == "Menu"
+
+
+def testGlobalTransitionsApplyToAllStates():
+    definition = buildScoped()
+    for statename in ["Menu", "Level1", "Level2", "Paused"]:
+        machine = definition.createMachine()
+        machine.start(statename)
+        machine.transit("Quit")
+        assert machine.getActualStateName() == "End"
+
+
+def testGroupsComeBeforeGlobalTransitions():
+    table = buildScoped().getTable()
+
+    assert table.lookup(table.getStateId("Level1"), "Pause") == table.getStateId("Paused")
+    assert table.lookup(table.getStateId("Paused"), "Pause") == table.getStateId("Menu")
+    assert table.lookup(table.getStateId("End"), "Quit") == table.NONE
+
+
+def testDanglingScopeTransitionsAreInvalid():
+    definition = Definition("Dangling")
+    State("Menu", definition)
+    definition.addGlobalTransition(Transition("Quit", "Nowhere", None))
+
+    validation = definition.validate()
+    assert not validation.isValid()
+    assert validation.dangling == [("*", "Quit", "Nowhere")]
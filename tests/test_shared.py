@@ -0,0 +1,92 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of the shared-memory instance store
+# ----------------------------------------------------------------------------------------------------------------------
+import multiprocessing
+import os
+import subprocess
+import sys
+
+import pytest
+
+from tests.builders import buildFlat, buildGame
+
+shared = pytest.importorskip("ablauf.shared")
+
+
+def work(name, locks, instanceids):
+    sessions = shared.SharedInstanceStore(buildFlat(), 0, locks, name=name, create=False)
+    for _ in range(50):
+        sessions.transit(instanceids, "go")
+        sessions.transit(instanceids, "back")
+    sessions.transit(instanceids, "go")
+    sessions.close()
+
+
+@pytest.fixture
+def store():
+    sessions = shared.SharedInstanceStore(buildFlat(), 8, shared.createLocks(4), statename="A")
+    yield sessions
+    sessions.close()
+    sessions.unlink()
+
+
+def testAttachedStoresShareTheStates(store):
+    other = shared.SharedInstanceStore(buildFlat(), 0, store.getLocks(), name=store.getName(), create=False)
+    try:
+        assert other.getSize() == 8
+        other.transit([3], "go")
+        assert store.getStateName(3) == "B"
+    finally:
+        other.close()
+
+
+def testWorkersTransitTheSameStore(store):
+    context = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn")
+    workers = [context.Process(target=work, args=(store.getName(), store.getLocks(), [index, index + 4]))
+               for index in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert [worker.exitcode for worker in workers] == [0, 0, 0, 0]
+    assert [store.getStateName(instanceid) for instanceid in range(8)] == ["B"] * 8
+
+
+ATTACH = """
+import multiprocessing
+import sys
+
+from ablauf.shared import SharedInstanceStore
+from tests.builders import buildFlat
+
+sessions = SharedInstanceStore(buildFlat(), 0, [multiprocessing.Lock()], name=sys.argv[1], create=False)
+sessions.transit([int(sys.argv[2])], "go")
+sessions.close()
+"""
+
+
+def testIndependentProcessesLeaveTheMemory(store):
+    # processes that are not started by the creating process have resource trackers of their own, which must not
+    # unlink the memory when they exit
+    for instanceid in range(2):
+        subprocess.run([sys.executable, "-c", ATTACH, store.getName(), str(instanceid)], check=True,
+                       cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    assert [store.getStateName(instanceid) for instanceid in range(3)] == ["B", "B", "A"]
+
+
+def testOtherDefinitionIsRefused(store):
+    with pytest.raises(ValueError):
+        shared.SharedInstanceStore(buildGame(), 0, store.getLocks(), name=store.getName(), create=False)
+
+
+def testHistoryStatesFail():
+    sessions = shared.SharedInstanceStore(buildGame("deep"), 2, shared.createLocks(2), statename="Menu")
+    try:
+        sessions.transit([0], "Start")
+        sessions.transit([0], "ShowOptions")
+        assert sessions.transit([0], "BackToGame") == [0]
+    finally:
+        sessions.close()
+        sessions.unlink()
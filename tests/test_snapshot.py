@@ -0,0 +1,103 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of snapshots
+# ----------------------------------------------------------------------------------------------------------------------
+import pytest
+
+from ablauf import InstanceStore
+from ablauf.snapshot import HEADER, MAGIC, restoreMachines, restoreStore, snapshotMachines, snapshotStore
+from tests.builders import buildFlat, buildGame
+
+
+def testMachinesRoundTrip(tmp_path):
+    definition = buildFlat()
+    filename = str(tmp_path / "machines.snapshot")
+    machines = [definition.createMachine() for _ in range(3)]
+    machines[0].start("A")
+    machines[1].start("A")
+    machines[1].transit("go")
+    snapshotMachines(filename, machines)
+
+    restored = restoreMachines(filename, definition, ["a", "b", "c"])
+    assert [machine.getActualStateName() for machine in restored] == ["A", "B", None]
+    assert [machine.getContext() for machine in restored] == ["a", "b", "c"]
+
+
+def testSnapshotWithoutMachinesReplacesTheOldOne(tmp_path):
+    definition = buildGame("deep")
+    filename = str(tmp_path / "machines.snapshot")
+    machine = definition.createMachine()
+    machine.start("Menu")
+    snapshotMachines(filename, [machine])
+
+    snapshotMachines(filename, [], definition)
+    assert restoreMachines(filename, definition) == []
+    with pytest.raises(ValueError):
+        snapshotMachines(filename, [])
+
+
+@pytest.mark.parametrize("mapped", [True, False])
+def testStoreRoundTrip(tmp_path, mapped):
+    definition = buildFlat()
+    filename = str(tmp_path / "store.snapshot")
+    store = InstanceStore(definition, 4, "A")
+    store.transit([1, 2], "go")
+    snapshotStore(filename, store)
+
+    restored = restoreStore(filename, definition, mapped)
+    assert [restored.getStateName(instanceid) for instanceid in range(4)] == ["A", "B", "B", "A"]
+    restored.transit([0], "go")
+    assert restored.getStateName(0) == "B"
+
+
+def testHistoryOfMachinesIsRestored(tmp_path):
+    definition = buildGame("deep")
+    filename = str(tmp_path / "machines.snapshot")
+    machine = definition.createMachine()
+    machine.start("Menu")
+    for event in ["Start", "Next", "ShowOptions"]:
+        machine.transit(event)
+    snapshotMachines(filename, [machine])
+
+    restored = restoreMachines(filename, definition)[0]
+    restored.transit("BackToGame")
+    assert restored.getActualStateName() == "Level2"
+
+
+@pytest.mark.parametrize("mapped", [True, False])
+def testHistoryOfStoresIsRestored(tmp_path, mapped):
+    definition = buildGame("deep")
+    filename = str(tmp_path / "store.snapshot")
+    store = InstanceStore(definition, 2, "Menu")
+    store.transit([0, 1], "Start")
+    store.transit([0], "Next")
+    store.transit([0, 1], "ShowOptions")
+    snapshotStore(filename, store)
+
+    restored = restoreStore(filename, definition, mapped)
+    assert restored.transit([0, 1], "BackToGame") == []
+    assert [restored.getStateName(instanceid) for instanceid in range(2)] == ["Level2", "Level1"]
+
+
+def testOtherDefinitionIsRefused(tmp_path):
+    filename = str(tmp_path / "machines.snapshot")
+    machine = buildFlat().createMachine()
+    machine.start("A")
+    snapshotMachines(filename, [machine])
+
+    with pytest.raises(ValueError):
+        restoreMachines(filename, buildGame())
+
+
+def testFirstVersionWithoutHistoryIsRead(tmp_path):
+    definition = buildFlat()
+    filename = str(tmp_path / "machines.snapshot")
+    machine = definition.createMachine()
+    machine.start("A")
+    snapshotMachines(filename, [machine])
+
+    with open(filename, 'r+b') as snapshotfile:
+        magic, version, itemsize, fingerprint, count = HEADER.unpack(snapshotfile.read(HEADER.size))
+        snapshotfile.seek(0)
+        snapshotfile.write(HEADER.pack(MAGIC, 1, itemsize, fingerprint, count))
+
+    assert restoreMachines(filename, definition)[0].getActualStateName() == "A"
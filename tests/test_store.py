@@ -0,0 +1,72 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of the instance store
+# ----------------------------------------------------------------------------------------------------------------------
+import pytest
+
+from ablauf import InstanceStore
+from tests.builders import buildApproval, buildFlat, buildGame
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def testTransitAndFailed():
+    definition = buildFlat()
+    store = InstanceStore(definition, 4)
+    store.start([0, 1, 2], "A")
+
+    assert store.transit([0, 1], "go") == []
+    assert store.transit([0, 2, 3], "back") == [2, 3]
+    assert [store.getStateName(instanceid) for instanceid in range(4)] == ["A", "B", "A", None]
+
+
+def testStep():
+    store = InstanceStore(buildFlat(), 3, "A")
+
+    assert store.step([0, 1, 2], ["go", "go", "back"]) == [2]
+    assert store.step([0, 1], ["back", "finish"]) == []
+    assert [store.getStateName(instanceid) for instanceid in range(3)] == ["A", "End", "A"]
+
+
+def testCallbacksGetTheInstanceIdAndPayload():
+    definition = buildFlat()
+    calls = []
+    definition.getState("B").setEnterFunction(lambda context, payload: calls.append((context, payload)))
+    store = InstanceStore(definition, 3, "A")
+
+    store.transit([2, 0], "go", "payload")
+    assert calls == [(2, "payload"), (0, "payload")]
+
+
+@pytest.mark.skipif(numpy is None, reason="needs numpy")
+def testVectorizedTransitMatchesTransit():
+    definition = buildFlat()
+    calls = []
+    definition.getState("A").setLeaveFunction(lambda context: calls.append(context))
+    vectorized = InstanceStore(definition, 6, "A")
+    plain = InstanceStore(definition, 6, "A")
+
+    for instanceids, event in [([0, 1, 2], "go"), ([1, 3], "back"), ([0, 1, 4], "finish")]:
+        failed = vectorized.transit(numpy.array(instanceids), event)
+        assert sorted(int(instanceid) for instanceid in failed) == sorted(plain.transit(instanceids, event))
+
+    assert list(vectorized.states) == list(plain.states)
+    assert sorted(calls) == [0, 0, 1, 1, 2, 2]
+
+
+def testHistoryIsKeptPerInstance():
+    store = InstanceStore(buildGame("deep"), 3, "Menu")
+    store.transit([0, 1], "Start")
+    store.transit([0], "Next")
+    store.transit([0, 1], "ShowOptions")
+
+    assert store.transit([0, 1, 2], "BackToGame") == [2]
+    assert [store.getStateName(instanceid) for instanceid in range(3)] == ["Level2", "Level1", "Menu"]
+
+
+def testGuardedTransitionsFail():
+    store = InstanceStore(buildApproval(), 2, "Menu")
+
+    assert store.transit([0, 1], "Submit") == [0, 1]
@@ -0,0 +1,26 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of the transition table
+# ----------------------------------------------------------------------------------------------------------------------
+import pytest
+
+from ablauf import Definition, State, Transition
+
+
+def testEventNamesMustBeStrings():
+    definition = Definition("Numbers")
+    State("A", definition).addTransition(Transition(1, "End", None))
+
+    with pytest.raises(TypeError):
+        definition.freeze()
+
+
+def testEventsAreNumberedInOrder():
+    definition = Definition("Many")
+    for index in range(100):
+        State("S%d" % index, definition).addTransition(Transition("e%d" % index, "S%d" % ((index + 1) % 100), None))
+        definition.getState("S%d" % index).addTransition(Transition("e0", "S0", None))
+
+    table = definition.getTable()
+    assert table.eventnames == ["e%d" % index for index in range(100)]
+    assert all(table.eventids["e%d" % index] == index for index in range(100))
+    assert all(table.eventids[index] == index for index in range(100))
\ No newline at end of file
@@ -0,0 +1,233 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of the timer wheel
+# ----------------------------------------------------------------------------------------------------------------------
+import asyncio
+
+from ablauf import Definition, InstanceStore, State, Transition
+from ablauf.timers import TimerWheel, runAsync
+
+
+class Clock(object):
+    """
+    A clock that is set by the test
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def createWheel(slots=8):
+    clock = Clock()
+    fired = []
+    wheel = TimerWheel(fired.extend, resolution=0.1, slots=slots, clock=clock)
+    return wheel, clock, fired
+
+
+def testTimerFiresOnceWhenDue():
+    wheel, clock, fired = createWheel()
+    wheel.arm("a", 0.3, 1)
+
+    assert wheel.poll(0.25) == 0
+    assert wheel.poll(0.35) == 1
+    assert fired == [("a", 1)]
+    assert wheel.poll(1.0) == 0
+    assert wheel.getCount() == 0
+
+
+def testCancel():
+    wheel, clock, fired = createWheel()
+    wheel.arm("a", 0.3, 1)
+    wheel.arm("b", 0.3, 2)
+    wheel.cancel("a")
+    wheel.cancel("unknown")
+
+    assert wheel.getCount() == 1
+    wheel.poll(1.0)
+    assert fired == [("b", 2)]
+
+
+def testRearmReplacesTheTimer():
+    wheel, clock, fired = createWheel()
+    wheel.arm("a", 0.2, 1)
+    clock.now = 0.1
+    wheel.arm("a", 0.5, 2)
+
+    assert wheel.getCount() == 1
+    assert wheel.poll(0.3) == 0
+    assert wheel.poll(0.65) == 1
+    assert fired == [("a", 2)]
+
+
+def testTimersBeyondOneTurnWaitForTheirTick():
+    wheel, clock, fired = createWheel(slots=8)
+    wheel.arm("near", 0.1, 1)
+    wheel.arm("far", 1.7, 2)
+
+    assert wheel.poll(0.5) == 1
+    assert wheel.poll(1.0) == 0
+    assert wheel.poll(1.6) == 0
+    assert wheel.poll(1.75) == 1
+    assert fired == [("near", 1), ("far", 2)]
+
+
+def testPollAfterALongPauseFiresAllTimers():
+    wheel, clock, fired = createWheel(slots=8)
+    for index in range(20):
+        wheel.arm(index, 0.1 * (index + 1), index)
+
+    assert wheel.poll(100.0) == 20
+    assert sorted(value for key, value in fired) == list(range(20))
+
+
+def testStateTimeoutTransitsTheMachine():
+    definition = Definition("Timed")
+    Waiting = State("Waiting", definition)
+    Waiting.addTransition(Transition("Timeout", "Expired", None))
+    Waiting.addTransition(Transition("Answer", "Done", None))
+    Waiting.setTimeout(1.0, "Timeout")
+    State("Expired", definition)
+    State("Done", definition)
+
+    clock = Clock()
+    wheel = TimerWheel(resolution=0.1, slots=16, clock=clock)
+    definition.setTimers(wheel)
+
+    expiring = definition.createMachine()
+    expiring.start("Waiting")
+    answered = definition.createMachine()
+    answered.start("Waiting")
+    answered.transit("Answer")
+
+    assert wheel.getCount() == 1
+    assert wheel.poll(0.5) == 0
+    assert wheel.poll(1.05) == 1
+    assert expiring.getActualStateName() == "Expired"
+    assert answered.getActualStateName() == "Done"
+    assert wheel.getCount() == 0
+
+
+def buildNested():
+    """
+    Build a definition where Game has a timeout of 30 seconds and its children Level1 and Level2 inherit it, Bonus has
+    a timeout of its own
+    """
+
+    definition = Definition("Nested")
+    State("Menu", definition).addTransition(Transition("Start", "Game", None))
+    Game = State("Game", definition)
+    Game.setInitialState("Level1")
+    Game.addTransition(Transition("Timeout", "Menu", None))
+    Game.addTransition(Transition("Restart", "Game", None))
+    Game.setTimeout(30.0, "Timeout")
+    for statename in ["Level1", "Level2", "Bonus"]:
+        State(statename, definition).setParent("Game")
+    definition.getState("Level1").addTransition(Transition("Next", "Level2", None))
+    definition.getState("Level2").addTransition(Transition("Back", "Level1", None))
+    definition.getState("Level2").addTransition(Transition("Bonus", "Bonus", None))
+    Bonus = definition.getState("Bonus")
+    Bonus.addTransition(Transition("Back", "Level1", None))
+    Bonus.setTimeout(5.0, "Back")
+    return definition
+
+
+def testMovingInsideAParentKeepsItsTimeout():
+    clock = Clock()
+    definition = buildNested()
+    wheel = TimerWheel(resolution=1.0, slots=16, clock=clock)
+    definition.setTimers(wheel)
+    machine = definition.createMachine()
+    machine.start("Menu")
+    machine.transit("Start")
+
+    for second in range(1, 100):
+        clock.now = second
+        wheel.poll()
+        if machine.getActualStateName() == "Menu":
+            break
+        machine.transit("Next" if machine.getActualStateName() == "Level1" else "Back")
+
+    assert machine.getActualStateName() == "Menu"
+    assert second == 30
+
+
+def testLeavingAndEnteringTheParentRearmsItsTimeout():
+    clock = Clock()
+    definition = buildNested()
+    wheel = TimerWheel(resolution=1.0, slots=16, clock=clock)
+    definition.setTimers(wheel)
+    machine = definition.createMachine()
+    machine.start("Menu")
+    machine.transit("Start")
+
+    clock.now = 20.0
+    machine.transit("Restart")
+    clock.now = 40.0
+    assert wheel.poll() == 0
+    clock.now = 50.0
+    assert wheel.poll() == 1
+    assert machine.getActualStateName() == "Menu"
+
+
+def testChildTimeoutReplacesTheInheritedOne():
+    clock = Clock()
+    definition = buildNested()
+    wheel = TimerWheel(resolution=1.0, slots=16, clock=clock)
+    definition.setTimers(wheel)
+    machine = definition.createMachine()
+    machine.start("Menu")
+    machine.transit("Start")
+    machine.transit("Next")
+    machine.transit("Bonus")
+
+    clock.now = 5.0
+    assert wheel.poll() == 1
+    assert machine.getActualStateName() == "Level1"
+    clock.now = 34.0
+    assert wheel.poll() == 0
+    clock.now = 35.0
+    assert wheel.poll() == 1
+    assert machine.getActualStateName() == "Menu"
+
+
+def testStoreKeepsTheTimeoutOfTheParent():
+    clock = Clock()
+    definition = buildNested()
+    store = InstanceStore(definition, 2, "Menu")
+    store.setTimers(TimerWheel(resolution=1.0, slots=16, clock=clock))
+    store.transit([0, 1], "Start")
+
+    for second in range(1, 30):
+        clock.now = second
+        store.getTimers().poll()
+        store.transit([0], "Next" if store.getStateName(0) == "Level1" else "Back")
+    clock.now = 30.0
+    store.getTimers().poll()
+
+    assert [store.getStateName(instanceid) for instanceid in range(2)] == ["Menu", "Menu"]
+
+
+def testAsyncDriverIgnoresResultsThatAreNoAwaitables():
+    clock = Clock()
+    fired = []
+
+    def fire(due):
+        fired.extend(key for key, value in due)
+        return [len(fired)]
+
+    async def drive():
+        wheel = TimerWheel(fire, resolution=0.1, slots=8, clock=clock)
+        driver = asyncio.ensure_future(runAsync(wheel, interval=0.001))
+        wheel.arm("a", 0.1, None)
+        wheel.arm("b", 0.3, None)
+        for now in [0.15, 0.35]:
+            clock.now = now
+            await asyncio.sleep(0.01)
+        done = driver.done()
+        driver.cancel()
+        return done
+
+    assert not asyncio.run(drive())
+    assert fired == ["a", "b"]
@@ -0,0 +1,66 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of the trace readers and the simulation
+# ----------------------------------------------------------------------------------------------------------------------
+import gzip
+import io
+
+from ablauf.table import TransitionTable
+from ablauf.trace import Simulation, readCSV, readJSONL
+from tests.builders import buildFlat
+
+EVENTS = [("s1", "go"), ("s2", "go"), ("s1", "back"), ("s2", "fly"), ("s2", "go"), ("s2", "finish"), ("s1", "go")]
+
+
+def testReadJSONL(tmp_path):
+    lines = '{"instance": "s1", "event": "go"}\n\n{"instance": "s2", "event": "back"}\n'
+    filename = str(tmp_path / "events.jsonl.gz")
+    with gzip.open(filename, 'wt') as tracefile:
+        tracefile.write(lines)
+
+    assert list(readJSONL(io.StringIO(lines))) == [("s1", "go"), ("s2", "back")]
+    assert list(readJSONL(filename)) == [("s1", "go"), ("s2", "back")]
+
+
+def testReadCSV():
+    lines = "time;event;instance\n1;go;s1\n2;back;s2\n"
+
+    assert list(readCSV(io.StringIO(lines), delimiter=";")) == [("s1", "go"), ("s2", "back")]
+    assert list(readCSV(io.StringIO(""))) == []
+
+
+def testOutcomes():
+    simulation = Simulation(buildFlat(), "A")
+    table = simulation.table
+    outcomes = list(simulation.simulate(EVENTS))
+
+    assert [(instance, table.statenames[sourceid]) for instance, event, sourceid, destinationid in outcomes] == \
+        [("s1", "A"), ("s2", "A"), ("s1", "B"), ("s2", "B"), ("s2", "B"), ("s2", "B"), ("s1", "A")]
+    assert [destinationid for instance, event, sourceid, destinationid in outcomes[3:5]] == \
+        [TransitionTable.NONE, TransitionTable.NONE]
+    assert simulation.getStateName("s1") == "B"
+    assert simulation.getStateName("s2") is None
+
+
+def testReport():
+    report = Simulation(buildFlat(), "A").replay(EVENTS)
+
+    assert report == {
+        "events": 7,
+        "transits": 5,
+        "started": 2,
+        "finished": 1,
+        "running": 1,
+        "invalid": {"B.go": 1},
+        "unknown": {"fly": 1},
+    }
+
+
+def testCallbacksAreOnlyCalledWhenEnabled():
+    calls = []
+    definition = buildFlat()
+    definition.getState("B").setEnterFunction(lambda: calls.append("enter B"))
+
+    Simulation(definition, "A").replay(EVENTS)
+    assert calls == []
+    Simulation(definition, "A", callbacks=True).replay(EVENTS)
+    assert calls == ["enter B"] * 3
@@ -0,0 +1,61 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# Tests of the validation and freezing of definitions
+# ----------------------------------------------------------------------------------------------------------------------
+import pytest
+
+from ablauf import Definition, DefinitionError, State, Transition
+from tests.builders import buildFlat
+
+
+def testFrozenDefinitionRejectsChanges():
+    definition = buildFlat()
+    definition.freeze()
+
+    with pytest.raises(DefinitionError):
+        State("C", definition)
+    with pytest.raises(DefinitionError):
+        definition.getState("A").addTransition(Transition("again", "A", None))
+
+
+def testValidation():
+    definition = buildFlat()
+    definition.getState("A").addTransition(Transition("lost", "Nowhere", None))
+    State("Island", definition)
+
+    validation = definition.validate("A")
+    assert not validation.isValid()
+    assert validation.dangling == [("A", "lost", "Nowhere")]
+    assert validation.unreachable == ["Island"]
+    assert validation.deadends == ["Island"]
+    assert len(validation.getProblems()) == 3
+
+
+def testValidDefinition():
+    validation = buildFlat().validate("A")
+
+    assert validation.isValid()
+    assert validation.getProblems() == []
+
+
+def testTimeoutsMayFireInheritedTransitions():
+    definition = Definition("Timed")
+    Game = State("Game", definition)
+    Game.setInitialState("Playing")
+    Game.addTransition(Transition("Timeout", "End", None))
+    Playing = State("Playing", definition)
+    Playing.setParent("Game")
+    Playing.setTimeout(10, "Timeout")
+
+    assert definition.validate("Game").timeouts == []
+    definition.freeze()
+    assert definition.getTable().timeouts[definition.getTable().getStateId("Playing")][1] == \
+        definition.getTable().getEventId("Timeout")
+
+
+def testTimeoutsOfUnknownTransitionsAreRejected():
+    definition = buildFlat()
+    definition.getState("A").setTimeout(10, "Timeout")
+
+    assert definition.validate("A").timeouts == [("A", "Timeout")]
+    with pytest.raises(DefinitionError):
+        definition.freeze()